@@ -1,11 +1,19 @@
-import json
 from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+import asyncio
 import random
 import discord
 from discord import app_commands
 from typing import Optional
 import time
-from shared_utils import calculate_level, calculate_gang_level, load_data, save_data
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from shared_utils import calculate_level, calculate_gang_level
+from business_store import load_data, save_data, save_data_async, read_data, freeze, compare_and_swap, CommitConflict, lock_entities, transaction, default_record, record_or_default, archive_wars_async
+from business_store import memberships, war_index, ranking, ranking_page, gang_id_by_name, search_gang_names, claim_gang_name, release_gang_name, reset_gang_names, GangNameTaken
 # Battle system imports moved to function level to avoid circular dependencies
 
 class WarBattleActionView(discord.ui.View):
@@ -47,11 +55,7 @@ class WarBattleActionView(discord.ui.View):
         
         if user_id != current_player_id:
             # Get current player name for better error message
-            try:
-                current_user = interaction.client.get_user(int(current_player_id))
-                current_name = current_user.display_name if current_user else f"Player {current_player_id[:8]}"
-            except:
-                current_name = f"Player {current_player_id[:8]}"
+            current_name = display_names.lookup(interaction.client, current_player_id) or f"Player {current_player_id[:8]}"
             
             turn_info = f"Turn {self.battle.turn_count + 1}: {current_name}"
             await interaction.response.send_message(f"❌ It's not your turn!\n🎯 **Current Turn:** {turn_info}", ephemeral=True)
@@ -62,7 +66,7 @@ class WarBattleActionView(discord.ui.View):
 
         if result.get("battle_end"):
             # Battle is over - award war-specific rewards
-            await self.award_war_battle_rewards(interaction, result)
+            reward_error = await self.award_war_battle_rewards(interaction, result)
 
             # Remove from active battles
             from battle_system import active_battles
@@ -86,6 +90,8 @@ class WarBattleActionView(discord.ui.View):
                     description=result["message"],
                     color=0x00FF00
                 )
+            if reward_error:
+                embed.add_field(name="⚠️ **Rewards**", value=reward_error, inline=False)
 
             await interaction.response.edit_message(embed=embed, view=None)
         else:
@@ -121,76 +127,81 @@ class WarBattleActionView(discord.ui.View):
             await interaction.edit_original_response(embed=battle_embed, view=new_view)
 
     async def award_war_battle_rewards(self, interaction: discord.Interaction, result: dict):
-        """Award XP, money and track user battles in war system"""
-        gambling_data = self.data.get("gambling", {})
-
-        # Track battle usage for both players
-        for player in [self.battle.player1, self.battle.player2]:
-            uid = player.user_id
-            if uid not in gambling_data:
-                gambling_data[uid] = {"dollars": 100, "xp": 0}
-
-            # Determine if player is attacker or defender
-            if hasattr(self.battle, 'active_war') and self.battle.active_war:
-                user_business_data = get_user_business_data(uid, self.data)
-                user_gang_id = user_business_data.get("gang_id")
-                is_player_attacker = self.battle.active_war["attacker"] == user_gang_id
-
-                # Update battle count
-                if is_player_attacker:
-                    if "attacker_members" not in self.battle.active_war:
-                        self.battle.active_war["attacker_members"] = {}
-                    current_battles = self.battle.active_war["attacker_members"].get(uid, self.battle.active_war.get("max_battles_per_user", 2))
-                    self.battle.active_war["attacker_members"][uid] = max(0, current_battles - 1)
+        """Award XP, money and track user battles in war system; returns an error message or None"""
+        war_id = getattr(self.battle, "war_id", None)
+
+        def apply_rewards(data):
+            # The battle may have lasted minutes; work on the records as they are now
+            gambling_data = data.setdefault("gambling", {})
+            war = data.get("wars", {}).get(war_id) if war_id else None
+
+            # Track battle usage for both players
+            for player in [self.battle.player1, self.battle.player2]:
+                uid = player.user_id
+                if uid not in gambling_data:
+                    gambling_data[uid] = {"dollars": 100, "xp": 0}
+
+                # Determine if player is attacker or defender
+                if war:
+                    user_business_data = get_user_business_data(uid, data)
+                    user_gang_id = user_business_data.get("gang_id")
+                    is_player_attacker = war["attacker"] == user_gang_id
+
+                    # Update battle count
+                    side = "attacker" if is_player_attacker else "defender"
+                    side_members = war.setdefault(f"{side}_members", {})
+                    current_battles = side_members.get(uid, war.get("max_battles_per_user", 2))
+                    side_members[uid] = max(0, current_battles - 1)
+
+                # Award rewards
+                if result["winner"] == player.username:
+                    # Winner rewards
+                    xp_gain = 200 + (player.level * 20)
+                    money_gain = 100000 + (player.level * 10000)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
+                    gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
+                elif result["winner"] != "Draw":
+                    # Loser consolation
+                    xp_gain = 100 + (player.level * 5)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
                 else:
-                    if "defender_members" not in self.battle.active_war:
-                        self.battle.active_war["defender_members"] = {}
-                    current_battles = self.battle.active_war["defender_members"].get(uid, self.battle.active_war.get("max_battles_per_user", 2))
-                    self.battle.active_war["defender_members"][uid] = max(0, current_battles - 1)
-
-            # Award rewards
-            if result["winner"] == player.username:
-                # Winner rewards
-                xp_gain = 200 + (player.level * 20)
-                money_gain = 100000 + (player.level * 10000)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-                gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
-            elif result["winner"] != "Draw":
-                # Loser consolation
-                xp_gain = 100 + (player.level * 5)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-            else:
-                # Draw rewards
-                xp_gain = 150 + (player.level * 10)
-                money_gain = 50000 + (player.level * 5000)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-                gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
-
-        # Check if war is over based on elimination system
-        if hasattr(self.battle, 'active_war') and self.battle.active_war:
-            gangs_data = self.data.get("gangs", {})
-            attacker_gang = gangs_data.get(self.battle.active_war["attacker"], {})
-            defender_gang = gangs_data.get(self.battle.active_war["defender"], {})
-
-            total_attacker_members = len(attacker_gang.get("members", {}))
-            total_defender_members = len(defender_gang.get("members", {}))
-
-            # Count exhausted members
-            attacker_exhausted = sum(1 for battles in self.battle.active_war.get("attacker_members", {}).values() if battles == 0)
-            defender_exhausted = sum(1 for battles in self.battle.active_war.get("defender_members", {}).values() if battles == 0)
-
-            # Check for war end conditions
-            if attacker_exhausted >= total_attacker_members and defender_exhausted >= total_defender_members:
-                self.battle.active_war["status"] = "completed"
-                self.battle.active_war["winner"] = "draw"
-            elif attacker_exhausted >= total_attacker_members:
-                self.battle.active_war["status"] = "completed"
-                self.battle.active_war["winner"] = self.battle.active_war["defender"]
-            elif defender_exhausted >= total_defender_members:
-                self.battle.active_war["status"] = "completed"
-                self.battle.active_war["winner"] = self.battle.active_war["attacker"]
-
-        save_business_data(self.data)
+                    # Draw rewards
+                    xp_gain = 150 + (player.level * 10)
+                    money_gain = 50000 + (player.level * 5000)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
+                    gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
+
+            # Check if war is over based on elimination system
+            if war:
+                # A side is out once none of its current members has battles left
+                attacker_out = side_eliminated(war_id, war, "attacker", data)
+                defender_out = side_eliminated(war_id, war, "defender", data)
+
+                # Check for war end conditions
+                if attacker_out and defender_out:
+                    war["status"] = "completed"
+                    war["winner"] = "draw"
+                elif attacker_out:
+                    war["status"] = "completed"
+                    war["winner"] = war["defender"]
+                elif defender_out:
+                    war["status"] = "completed"
+                    war["winner"] = war["attacker"]
+
+        war = self.battle.active_war or {}
+        players = [self.battle.player1.user_id, self.battle.player2.user_id]
+        try:
+            async with lock_business_entities(gangs=[war.get("attacker"), war.get("defender")], users=players, wars=[war_id]):
+                await commit_business_data(apply_rewards)
+        except CommitConflict:
+            return "❌ The war records kept changing, so rewards weren't saved. Please try again in a moment!"
+        if war_id:
+            # Records are written back in place, but a replaced war record needs re-pointing
+            self.battle.active_war = load_business_data().get("wars", {}).get(war_id, self.battle.active_war)
+            if self.battle.active_war.get("status") == "completed":
+                # Finished wars leave the hot document; war_history() still serves them
+                await archive_wars_async([war_id])
+        return None
 
 # Business Types and their properties
 BUSINESS_TYPES = {
@@ -559,67 +570,250 @@ def missing_gang_war_error():
         "error": "Gang war system not fully implemented"
     }
 
-# load_data and save_data are now imported from shared_utils
+# load_data and save_data come from business_store, which keeps the document resident
 load_business_data = load_data
 save_business_data = save_data
+# Awaitable variant for callers that need the write to be durable before continuing
+save_business_data_async = save_data_async
+# Immutable snapshot for display commands that never modify state
+read_business_data = read_data
+# Re-run a mutation against fresh records until no concurrent commit overlaps it
+commit_business_data = compare_and_swap
+# Per-gang, per-user and per-war locks, acquired in a fixed order
+lock_business_entities = lock_entities
+# Groups the mutations of one interaction into a single commit, rolled back on error
+business_transaction = transaction
+
+def new_business_record():
+    """Default business data for a user who has none yet"""
+    return default_record("business")
 
 def get_user_business_data(uid, data):
-    """Get or initialize user's business data"""
-    if "business" not in data:
-        data["business"] = {}
-
-    if uid not in data["business"]:
-        data["business"][uid] = {
-            "businesses": {},
-            "total_income": 0,
-            "gang_id": None,
-            "gang_role": None,
-            "current_location": "amsterdam",
-            "visited_locations": ["amsterdam"],
-            "achievements": [],
-            "research_projects": {}
-        }
+    """Get user's business data; defaults are only stored once they are changed
 
-    return data["business"][uid]
+    gang_id and gang_role are copies of the gangs' member lists, which are
+    the source of truth for membership; memberships() keeps them in line.
+    """
+    return record_or_default(data, "business", uid)
+
+def view_user_business_data(uid, snapshot):
+    """Read-only user business data from a snapshot; defaults are not stored"""
+    record = snapshot.get("business", {}).get(uid)
+    if record is None:
+        record = freeze(new_business_record())
+    return memberships().view(uid, record, snapshot)
 
 # calculate_gang_level and calculate_level are now imported from shared_utils
 
 def load_equipment_data():
-    """Load equipment data from battle_system"""
-    try:
-        from battle_system import load_equipment_data as battle_load_equipment
-        return battle_load_equipment()
-    except ImportError:
-        # Fallback to local loading
-        try:
-            with open("contributions.json", "r") as f:
-                data = json.load(f)
-                if "equipment" not in data:
-                    data["equipment"] = {}
-                return data
-        except FileNotFoundError:
-            return {"equipment": {}}
+    """Load equipment data (the same resident document as load_business_data)"""
+    return load_business_data()
 
 def get_user_equipment(uid: str, data: dict) -> dict:
-    """Get user's equipment loadout"""
-    if "equipment" not in data:
-        data["equipment"] = {}
-
-    if uid not in data["equipment"]:
-        data["equipment"][uid] = {
-            "weapons": ["fists"],
-            "clothing": ["street_clothes"],
-            "current_weapon": "fists",
-            "current_clothing": "street_clothes",
-            "inventory": {}
+    """Get user's equipment loadout; defaults are only stored once they are changed"""
+    return record_or_default(data, "equipment", uid)
+
+def save_equipment_data(data):
+    """Save equipment changes made to the document load_equipment_data() returned"""
+    if data is not load_business_data():
+        raise ValueError("Equipment changes must be made to the document from load_equipment_data()")
+    save_business_data(data)
+
+async def save_equipment_data_async(data):
+    """Save equipment changes and wait until they are on disk"""
+    if data is not load_business_data():
+        raise ValueError("Equipment changes must be made to the document from load_equipment_data()")
+    await save_business_data_async(data)
+
+# Display-name cache: entries kept, seconds a name stays fresh, seconds a failed lookup is remembered
+NAME_CACHE_SIZE = 10000
+NAME_CACHE_TTL = 600
+NAME_MISS_TTL = 60
+# Misses fetched one by one over HTTP per resolve, and seconds a resolve may wait on Discord
+NAME_FETCH_LIMIT = 5
+NAME_FETCH_TIMEOUT = 1.5
+
+class DisplayNameResolver:
+    """uid -> display name, cached with LRU eviction and a TTL
+
+    Names come from, in order: the cache, the client's user cache, the
+    "username" stored in gambling/players records, and finally one batched
+    fetch for what is still missing: a guild member query, then at most
+    NAME_FETCH_LIMIT user fetches, all within NAME_FETCH_TIMEOUT so the
+    interaction can still be answered in time. Member join/update events keep the
+    cache warm once attach() has hooked them up, which resolve() does on
+    first use. Failed lookups are remembered briefly so a member Discord
+    cannot resolve is not refetched on every render.
+    """
+
+    def __init__(self, capacity=NAME_CACHE_SIZE, ttl=NAME_CACHE_TTL, miss_ttl=NAME_MISS_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        # uid -> (name or None, expiry), least recently used first
+        self._names = OrderedDict()
+        self._attached = set()
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+
+    def remember(self, uid, name, ttl=None):
+        self._names[str(uid)] = (name, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._names.move_to_end(str(uid))
+        while len(self._names) > self.capacity:
+            self._names.popitem(last=False)
+
+    def forget(self, uid):
+        self._names.pop(str(uid), None)
+
+    def _cached(self, uid):
+        entry = self._names.get(uid)
+        if entry is None:
+            return False, None
+        if entry[1] < time.monotonic():
+            del self._names[uid]
+            return False, None
+        self._names.move_to_end(uid)
+        return True, entry[0]
+
+    @staticmethod
+    def _stored(uid, data):
+        # One record is looked up; sections are never tested for truth, which would scan them
+        sections = [data.get("gambling")]
+        if isinstance(data, dict):
+            # "players" is not a store section, so a snapshot could only hand it over whole
+            sections.append(data.get("players"))
+        for section in sections:
+            record = section.get(uid) if section is not None else None
+            if record is not None and record.get("username"):
+                return record["username"]
+        return None
+
+    def attach(self, client):
+        """Keep the cache current from member and user gateway events"""
+        if id(client) in self._attached or not hasattr(client, "add_listener"):
+            return
+        self._attached.add(id(client))
+
+        async def on_member_join(member):
+            self.remember(member.id, member.display_name)
+
+        async def on_member_update(before, after):
+            self.remember(after.id, after.display_name)
+
+        async def on_user_update(before, after):
+            self.remember(after.id, after.display_name)
+
+        for listener in (on_member_join, on_member_update, on_user_update):
+            client.add_listener(listener, listener.__name__)
+
+    def lookup(self, client, uid, data=None):
+        """Display name without any network round trip, or None"""
+        uid = str(uid)
+        found, name = self._cached(uid)
+        if found:
+            self.hits += 1
+            return name
+        self.misses += 1
+        try:
+            user = client.get_user(int(uid))
+        except (TypeError, ValueError):
+            user = None
+        if user is not None:
+            name = user.display_name
+        elif data is not None:
+            name = self._stored(uid, data)
+        if name is not None:
+            self.remember(uid, name)
+        return name
+
+    async def resolve(self, client, uids, data=None, guild=None):
+        """{uid: display name or None} for uids, fetching all misses in one batch"""
+        self.attach(client)
+        names = {}
+        missing = []
+        for uid in dict.fromkeys(str(uid) for uid in uids):
+            found, name = self._cached(uid)
+            if not found:
+                name = self.lookup(client, uid, data)
+                if name is None:
+                    missing.append(uid)
+                    continue
+            else:
+                self.hits += 1
+            names[uid] = name
+        if missing:
+            names.update(await self._fetch(client, missing, guild))
+        return names
+
+    async def _fetch(self, client, uids, guild):
+        names = dict.fromkeys(uids)
+        try:
+            await asyncio.wait_for(self._fetch_into(names, client, guild), NAME_FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        return names
+
+    async def _fetch_into(self, names, client, guild):
+        # Fills names in place, so whatever arrived before a timeout is kept
+        uids = list(names)
+        if guild is not None:
+            # One gateway request per 100 members instead of an HTTP call each
+            for start in range(0, len(uids), 100):
+                try:
+                    members = await guild.query_members(user_ids=[int(uid) for uid in uids[start:start + 100]], limit=100)
+                except Exception:
+                    break
+                for member in members:
+                    names[str(member.id)] = member.display_name
+                    self.remember(member.id, member.display_name)
+        unresolved = [uid for uid, name in names.items() if name is None][:NAME_FETCH_LIMIT]
+        self.fetched += len(unresolved)
+
+        async def fetch(uid):
+            try:
+                name = (await client.fetch_user(int(uid))).display_name
+            except Exception:
+                name = None
+            names[uid] = name
+            self.remember(uid, name, ttl=None if name is not None else self.miss_ttl)
+
+        await asyncio.gather(*(fetch(uid) for uid in unresolved))
+
+    def stats(self):
+        """Hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetched": self.fetched,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
         }
 
-    return data["equipment"][uid]
+display_names = DisplayNameResolver()
 
-def save_equipment_data(data):
-    """Save equipment data"""
-    with open("contributions.json", "w") as f:
-        json.dump(data, f, indent=2)
+def find_war_id(war_data, data):
+    """Find the id of a war record through its attacker's war list"""
+    attacker_gang = data.get("gangs", {}).get(war_data.get("attacker"), {})
+    return attacker_gang.get("wars", {}).get(war_data.get("defender"))
+
+def active_wars(gang_id, data):
+    """{enemy_gang_id: war_id} of a gang's active wars
+
+    Answered from the store's in-memory war index, which follows committed
+    wars, so finding a gang's war does not depend on how many wars it has
+    fought and nothing is kept in the gang record.
+    """
+    return war_index().active(gang_id, data)
+
+def war_roster(war_id, war_data, side, data):
+    """uids of one side's members who still have battles left in an elimination war"""
+    return war_index().roster(war_id, war_data, side, data)
+
+def side_eliminated(war_id, war_data, side, data):
+    """Whether none of one side's members has battles left"""
+    return not war_index().has_fighters(war_id, war_data, side, data)
 
 def add_gang_xp(gang_id, xp_amount, data):
     """Add XP to a gang and handle level ups"""
@@ -653,6 +847,29 @@ def get_territory_unlock_requirements():
         "corporate_tower": {"gang_level": 90, "cost": 250000000}
     }
 
+def territory_summary(gang_data):
+    """Owned territory types, total daily income and defense of a gang
+
+    Computed from the territories on every call: a gang owns at most one
+    territory of each type, so there is nothing worth caching, and reading
+    it never writes to the gang record.
+    """
+    summary = {"types": {}, "income": 0, "defense": 0, "count": 0}
+    for territory_id, territory_data in (gang_data.get("territories") or {}).items():
+        territory_type = territory_data.get("type", "street_corner")
+        territory_info = TERRITORY_TYPES.get(territory_type, {})
+        summary["types"][territory_type] = territory_id
+        summary["income"] += territory_info.get("income", 0)
+        summary["defense"] += territory_info.get("defense", 0)
+        summary["count"] += 1
+    return summary
+
+def add_territory(gang_data, territory_id, territory_data):
+    """Give a gang a territory"""
+    gang_data.setdefault("territories", {})[territory_id] = territory_data
+    # Drop the summary copy earlier versions stored in the gang record
+    gang_data.pop("territory_summary", None)
+
 def distribute_territory_income(gang_id, data):
     """Distribute territory income to all gang members"""
     gangs_data = data.get("gangs", {})
@@ -660,18 +877,7 @@ def distribute_territory_income(gang_id, data):
         return 0
 
     gang_data = gangs_data[gang_id]
-    territories = gang_data.get("territories", {})
-
-    if not territories:
-        return 0
-
-    # Calculate total daily income
-    total_income = 0
-
-    for territory_id, territory_data in territories.items():
-        territory_type = territory_data.get("type", "street_corner")
-        if territory_type in TERRITORY_TYPES:
-            total_income += TERRITORY_TYPES[territory_type]["income"]
+    total_income = territory_summary(gang_data)["income"]
 
     if total_income <= 0:
         return 0
@@ -696,6 +902,7 @@ def distribute_territory_income(gang_id, data):
 
 async def show_enemy_member_selection(interaction, uid, user_level, war_data, target_gang_id, enemy_members, data):
     """Show selection menu for enemy gang members"""
+    names = await display_names.resolve(interaction.client, enemy_members[:25], data, interaction.guild)
 
     class EnemyMemberSelect(discord.ui.Select):
         def __init__(self):
@@ -703,14 +910,7 @@ async def show_enemy_member_selection(interaction, uid, user_level, war_data, ta
             gambling_data = data.get("gambling", {})
 
             for member_uid in enemy_members[:25]:  # Discord limit of 25 options
-                try:
-                    user = interaction.client.get_user(int(member_uid))
-                    if user:
-                        username = user.display_name
-                    else:
-                        username = f"User {member_uid[:8]}"
-                except Exception:
-                    username = f"User {member_uid[:8]}"
+                username = names.get(member_uid) or f"User {member_uid[:8]}"
 
                 # Get member's level
                 member_gambling = gambling_data.get(member_uid, {"xp": 0})
@@ -808,19 +1008,11 @@ async def start_war_battle_with_notification(interaction, uid, user_level, war_d
 
     # Filter out eliminated members if using elimination war type
     if war_data.get("war_type") == "elimination":
-        max_battles = war_data.get("max_battles_per_user", 2)
         user_gang_id = get_user_business_data(uid, data).get("gang_id")
         is_attacker = war_data["attacker"] == user_gang_id
 
-        available_enemies = []
-        for member_uid in enemy_members:
-            if is_attacker:
-                member_battles = war_data.get("defender_members", {}).get(member_uid, max_battles)
-            else:
-                member_battles = war_data.get("attacker_members", {}).get(member_uid, max_battles)
-            
-            if member_battles > 0:
-                available_enemies.append(member_uid)
+        war_id = find_war_id(war_data, data)
+        available_enemies = war_roster(war_id, war_data, "defender" if is_attacker else "attacker", data)
 
         if not available_enemies:
             await interaction.response.send_message("❌ All enemy members have been eliminated!", ephemeral=True)
@@ -836,48 +1028,16 @@ async def start_battle_with_selected_enemy(interaction, uid, user_level, war_dat
     try:
         from battle_system import BattlePlayer, StreetBattle, create_battle_embed, active_battles
 
-        # Get user equipment using local functions
-        equipment_data = load_equipment_data()
-        user_equipment = get_user_equipment(uid, equipment_data)
-        target_equipment = get_user_equipment(target_member_uid, equipment_data)
+        # Equipment lives in the same resident document as the war data
+        user_equipment = get_user_equipment(uid, data)
+        target_equipment = get_user_equipment(target_member_uid, data)
 
-        # Enhanced username retrieval with multiple fallback methods
-        target_user = interaction.client.get_user(int(target_member_uid))
-        if target_user:
-            target_username = target_user.display_name
-        else:
-            # Multiple fallback attempts for getting username
-            gambling_data = data.get("gambling", {})
-            target_gambling = gambling_data.get(target_member_uid, {})
-
-            if "username" in target_gambling:
-                target_username = target_gambling["username"]
-            else:
-                # Try players data
-                players_data = data.get("players", {})
-                if target_member_uid in players_data and "username" in players_data[target_member_uid]:
-                    target_username = players_data[target_member_uid]["username"]
-                else:
-                    # Try to get user from Discord client with member list
-                    try:
-                        # Search through all guilds the bot is in
-                        for guild in interaction.client.guilds:
-                            member = guild.get_member(int(target_member_uid))
-                            if member:
-                                target_username = member.display_name
-                                break
-                        else:
-                            # Final fallback with gang context
-                            gangs_data = data.get("gangs", {})
-                            enemy_gang_data = gangs_data.get(target_gang_id, {})
-                            gang_name = enemy_gang_data.get('name', 'Enemy Gang')
-                            target_username = f"{gang_name} Member"
-                    except Exception:
-                        # Ultimate fallback
-                        gangs_data = data.get("gangs", {})
-                        enemy_gang_data = gangs_data.get(target_gang_id, {})
-                        gang_name = enemy_gang_data.get('name', 'Enemy Gang')
-                        target_username = f"{gang_name} Fighter"
+        # Cached, client, stored and fetched names in that order; the gang name as a last resort
+        names = await display_names.resolve(interaction.client, [target_member_uid], data, interaction.guild)
+        target_username = names.get(target_member_uid)
+        if not target_username:
+            enemy_gang_data = data.get("gangs", {}).get(target_gang_id, {})
+            target_username = f"{enemy_gang_data.get('name', 'Enemy Gang')} Member"
 
         # Get target user level
         gambling_data = data.get("gambling", {})
@@ -905,6 +1065,7 @@ async def start_battle_with_selected_enemy(interaction, uid, user_level, war_dat
         # Create battle with proper war context
         battle = StreetBattle(player1, player2, "gang_war")
         battle.active_war = war_data
+        battle.war_id = find_war_id(war_data, data)
         user_gang_id = get_user_business_data(uid, data).get("gang_id")
         battle.is_attacker = war_data["attacker"] == user_gang_id
         battle.war_gang_id = user_gang_id
@@ -963,24 +1124,137 @@ async def start_battle_with_selected_enemy(interaction, uid, user_level, war_dat
 def calculate_business_income(business_data, location_multiplier=1.0):
     """Calculate total income from all businesses"""
     total_income = 0
+    # Apply research bonuses
+    research_bonus = research_bonus_of(business_data)
     for business_id, business in business_data.get("businesses", {}).items():
         business_type = BUSINESS_TYPES[business["type"]]
         level_multiplier = 1 + (business["level"] - 1) * 0.3
         base_income = business_type["base_income"]
 
-        # Apply research bonuses
-        research_bonus = 1.0
-        for project_id, project in business_data.get("research_projects", {}).items():
-            if project.get("completed"):
-                project_info = RESEARCH_PROJECTS[project_id]
-                if "business_efficiency" in project_info["benefits"]:
-                    research_bonus += project_info["benefits"]["business_efficiency"]
-
         business_income = int(base_income * level_multiplier * location_multiplier * research_bonus)
         total_income += business_income
 
     return total_income
 
+def location_multiplier_of(business_data):
+    """Business income multiplier of the location a user is currently in"""
+    return WORLD_LOCATIONS[business_data.get("current_location", "amsterdam")]["business_multiplier"]
+
+def research_bonus_of(business_data):
+    """Business efficiency multiplier from a user's completed research"""
+    research_bonus = 1.0
+    for project_id, project in business_data.get("research_projects", {}).items():
+        if project.get("completed"):
+            project_info = RESEARCH_PROJECTS[project_id]
+            if "business_efficiency" in project_info["benefits"]:
+                research_bonus += project_info["benefits"]["business_efficiency"]
+    return research_bonus
+
+def pack_businesses(business_section):
+    """Pack every user's businesses into NumPy arrays for price_businesses()
+
+    One entry per business: its type's base income and its level, plus the
+    owner's location and research multipliers repeated over the owner's
+    businesses. Packing walks the records in Python; pricing a pack is one
+    vectorized pass, so a pack can be priced again for as long as the records
+    it came from are unchanged.
+    """
+    type_index = {business_type: index for index, business_type in enumerate(BUSINESS_TYPES)}
+    uids, owners, counts, types, levels, location_multipliers, research_bonuses = [], [], [], [], [], [], []
+    for uid, business_data in business_section.items():
+        uids.append(uid)
+        businesses = business_data.get("businesses", {})
+        if not businesses:
+            continue
+        owners.append(uid)
+        counts.append(len(businesses))
+        location_multipliers.append(location_multiplier_of(business_data))
+        research_bonuses.append(research_bonus_of(business_data))
+        types.extend([type_index[business["type"]] for business in businesses.values()])
+        levels.extend([business["level"] for business in businesses.values()])
+
+    counts = np.array(counts, dtype=np.int64)
+    base_incomes = np.array([info["base_income"] for info in BUSINESS_TYPES.values()], dtype=np.float64)
+    return {
+        "uids": uids,
+        "owners": owners,
+        "starts": np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64),
+        "base_income": base_incomes[np.array(types, dtype=np.int64)],
+        "level": np.array(levels, dtype=np.float64),
+        "location_multiplier": np.repeat(np.array(location_multipliers, dtype=np.float64), counts),
+        "research_bonus": np.repeat(np.array(research_bonuses, dtype=np.float64), counts),
+    }
+
+def price_businesses(packed):
+    """Hourly income of every user in a pack, {uid: income}
+
+    The float operations run in the same order as calculate_business_income(),
+    and each business is truncated before the per-user sum, so the results
+    are identical to it.
+    """
+    incomes = dict.fromkeys(packed["uids"], 0)
+    if not packed["owners"]:
+        return incomes
+    level_multiplier = 1 + (packed["level"] - 1) * 0.3
+    income = packed["base_income"] * level_multiplier * packed["location_multiplier"] * packed["research_bonus"]
+    totals = np.add.reduceat(income.astype(np.int64), packed["starts"])
+    incomes.update(zip(packed["owners"], totals.tolist()))
+    return incomes
+
+def calculate_all_business_income(business_section, vectorized=None):
+    """Hourly business income of every user, {uid: income}, at their current location
+
+    Uses pack_businesses()/price_businesses() when NumPy is available, and
+    calculate_business_income() per user otherwise or with vectorized=False;
+    both give the same numbers.
+    """
+    if vectorized is None:
+        vectorized = np is not None
+    if vectorized:
+        return price_businesses(pack_businesses(business_section))
+    return {uid: calculate_business_income(business_data, location_multiplier_of(business_data))
+            for uid, business_data in business_section.items()}
+
+# Seconds between business income payouts
+BUSINESS_PAYOUT_INTERVAL = 3600
+
+def collect_business_income(now=None):
+    """Pay every business owner the income of the whole hours since the last payout
+
+    Run at the start of the business commands: the first one after an hour
+    boundary prices every user's businesses in one calculate_all_business_income()
+    pass and credits the income to their dollars and total_income. Returns
+    {uid: amount paid}, empty when no payout was due.
+    """
+    now = time.time() if now is None else now
+    data = load_business_data()
+    last_payout = data.get("business_payout_at")
+    if last_payout is None:
+        data["business_payout_at"] = now
+        save_business_data(data)
+        return {}
+    hours = int((now - last_payout) // BUSINESS_PAYOUT_INTERVAL)
+    if hours < 1:
+        return {}
+
+    # Priced from the latest snapshot so the walk over every record marks none of them modified
+    incomes = calculate_all_business_income(read_business_data().get("business", {}))
+    paid = {}
+    with business_transaction() as doc:
+        gambling_data = doc.setdefault("gambling", {})
+        business_data = doc.setdefault("business", {})
+        for uid, income in incomes.items():
+            if income <= 0 or uid not in business_data:
+                continue
+            amount = income * hours
+            if uid not in gambling_data:
+                gambling_data[uid] = {"dollars": 100, "xp": 0}
+            gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + amount
+            business_data[uid]["total_income"] = business_data[uid].get("total_income", 0) + amount
+            paid[uid] = amount
+        doc["business_payout_at"] = last_payout + hours * BUSINESS_PAYOUT_INTERVAL
+    return paid
+
 def check_achievement(uid, achievement_id, user_data, business_data):
     """Check if user has earned an achievement"""
     if achievement_id in user_data.get("achievements", []):
@@ -1031,9 +1305,10 @@ business_group = app_commands.Group(name="business", description="Business manag
 
 @business_group.command(name="status", description="View your business empire status")
 async def business_status(interaction: discord.Interaction):
-    data = load_business_data()
+    collect_business_income()
+    data = read_business_data()
     uid = str(interaction.user.id)
-    user_business_data = get_user_business_data(uid, data)
+    user_business_data = view_user_business_data(uid, data)
 
     # Get current location
     current_location = user_business_data.get("current_location", "amsterdam")
@@ -1057,10 +1332,12 @@ async def business_status(interaction: discord.Interaction):
     if businesses:
         business_list = []
         total_income = 0
+        # Priced like calculate_business_income(), so the total is what each payout credits
+        research_bonus = research_bonus_of(user_business_data)
         for business_id, business in businesses.items():
             business_type = BUSINESS_TYPES[business["type"]]
             level_multiplier = 1 + (business["level"] - 1) * 0.3
-            income = int(business_type["base_income"] * level_multiplier * location_info["business_multiplier"])
+            income = int(business_type["base_income"] * level_multiplier * location_info["business_multiplier"] * research_bonus)
             total_income += income
             business_list.append(f"{business_type['emoji']} **{business_type['name']}** (Lv.{business['level']}) - ${income:,}/hr")
 
@@ -1099,6 +1376,7 @@ async def business_status(interaction: discord.Interaction):
 
 @business_group.command(name="buy", description="Purchase a new business")
 async def business_buy(interaction: discord.Interaction):
+    collect_business_income()
     data = load_business_data()
     uid = str(interaction.user.id)
     user_business_data = get_user_business_data(uid, data)
@@ -1162,6 +1440,11 @@ async def business_buy(interaction: discord.Interaction):
             business_type = self.values[0]
             business_info = BUSINESS_TYPES[business_type]
 
+            # The menu may be minutes old; check against the current records
+            data = load_business_data()
+            user_business_data = get_user_business_data(uid, data)
+            current_balance = data.get("gambling", {}).get(uid, {}).get("dollars", 100)
+
             # Check if user already owns this business type
             existing_businesses = user_business_data.get("businesses", {})
             for existing_business in existing_businesses.values():
@@ -1179,28 +1462,28 @@ async def business_buy(interaction: discord.Interaction):
                     ephemeral=True)
                 return
 
-            # Purchase business
-            user_gambling["dollars"] -= cost
+            # Purchase and achievement rewards are committed together
+            with business_transaction() as data:
+                user_business_data = get_user_business_data(uid, data)
+                user_gambling = data["gambling"].setdefault(uid, {"dollars": 100, "xp": 0})
+                user_gambling["dollars"] = user_gambling.get("dollars", 100) - cost
 
-            # Generate business ID
+                # Generate business ID
 
-            business_id = f"business_{int(time.time() * 1000)}"
+                business_id = f"business_{int(time.time() * 1000)}"
 
-            user_business_data["businesses"][business_id] = {
-                "type": business_type,
-                "level": 1,
-                "location": current_location,
-                "purchased_at": datetime.now(timezone.utc).isoformat()
-            }
+                user_business_data.setdefault("businesses", {})[business_id] = {
+                    "type": business_type,
+                    "level": 1,
+                    "location": current_location,
+                    "purchased_at": datetime.now(timezone.utc).isoformat()
+                }
 
-            save_business_data(data)
-
-            # Check for achievements
-            achievement_text = ""
-            if check_achievement(uid, "first_business", user_business_data, user_business_data):
-                apply_achievement_rewards(uid, "first_business", data)
-                save_business_data(data)
-                achievement_text = "\n🏆 **Achievement Unlocked: Entrepreneur!**"
+                # Check for achievements
+                achievement_text = ""
+                if check_achievement(uid, "first_business", user_business_data, user_business_data):
+                    apply_achievement_rewards(uid, "first_business", data)
+                    achievement_text = "\n🏆 **Achievement Unlocked: Entrepreneur!**"
 
             embed = discord.Embed(
                 title="🏢 **Business Purchased!** 🏢",
@@ -1246,11 +1529,9 @@ async def gang_create(interaction: discord.Interaction, name: str, description:
         return
 
     # Check if gang name already exists
-    gangs_data = data.get("gangs", {})
-    for gang_id, gang_data in gangs_data.items():
-        if gang_data.get("name", "").lower() == name.lower():
-            await interaction.response.send_message("❌ A gang with that name already exists!", ephemeral=True)
-            return
+    if gang_id_by_name(name):
+        await interaction.response.send_message("❌ A gang with that name already exists!", ephemeral=True)
+        return
 
     # Check cost
     gang_cost = 1000000
@@ -1265,26 +1546,40 @@ async def gang_create(interaction: discord.Interaction, name: str, description:
 
     gang_id = f"gang_{int(time.time() * 1000)}"
 
-    gangs_data[gang_id] = {
-        "name": name,
-        "description": description,
-        "leader": uid,
-        "members": {uid: "leader"},
-        "territories": {},
-        "wars": {},
-        "founded_at": datetime.now(timezone.utc).isoformat(),
-        "base_level": 1,
-        "treasury": 0,
-        "gang_xp": 0,
-        "gang_level": 1
-    }
+    # The gang, the fee and the founder achievement are committed together
+    try:
+        with business_transaction() as data:
+            gangs_data = data["gangs"]
+            gangs_data[gang_id] = {
+                "name": name,
+                "description": description,
+                "leader": uid,
+                "members": {},
+                "territories": {},
+                "wars": {},
+                "founded_at": datetime.now(timezone.utc).isoformat(),
+                "base_level": 1,
+                "treasury": 0,
+                "gang_xp": 0,
+                "gang_level": 1
+            }
+            # Uniqueness is enforced here, atomically with the gang being stored
+            claim_gang_name(name, gang_id)
 
-    # Update user data
-    user_gambling["dollars"] -= gang_cost
-    user_business_data["gang_id"] = gang_id
-    user_business_data["gang_role"] = "leader"
+            # Update user data
+            user_gambling = data["gambling"].setdefault(uid, {"dollars": 100})
+            user_gambling["dollars"] = user_gambling.get("dollars", 100) - gang_cost
+            memberships().join(data, gang_id, uid, "leader")
+            user_business_data = get_user_business_data(uid, data)
 
-    save_business_data(data)
+            # Check achievement
+            achievement_text = ""
+            if check_achievement(uid, "gang_founder", user_business_data, user_business_data):
+                apply_achievement_rewards(uid, "gang_founder", data)
+                achievement_text = "\n🏆 **Achievement Unlocked: Gang Founder!**"
+    except GangNameTaken:
+        await interaction.response.send_message("❌ A gang with that name already exists!", ephemeral=True)
+        return
 
     # Sync to cross-server network
     try:
@@ -1294,13 +1589,6 @@ async def gang_create(interaction: discord.Interaction, name: str, description:
     except Exception as e:
         print(f"Cross-server gang sync error: {e}")
 
-    # Check achievement
-    achievement_text = ""
-    if check_achievement(uid, "gang_founder", user_business_data, user_business_data):
-        apply_achievement_rewards(uid, "gang_founder", data)
-        save_business_data(data)
-        achievement_text = "\n🏆 **Achievement Unlocked: Gang Founder!**"
-
     embed = discord.Embed(
         title="👑 **Gang Created!** 👑",
         description=f"*{interaction.user.mention} founded the {name} gang!*",
@@ -1316,9 +1604,9 @@ async def gang_create(interaction: discord.Interaction, name: str, description:
 
 @gang_group.command(name="info", description="View gang information and members")
 async def gang_info(interaction: discord.Interaction):
-    data = load_business_data()
+    data = read_business_data()
     uid = str(interaction.user.id)
-    user_business_data = get_user_business_data(uid, data)
+    user_business_data = view_user_business_data(uid, data)
 
     gang_id = user_business_data.get("gang_id")
     if not gang_id:
@@ -1335,18 +1623,15 @@ async def gang_info(interaction: discord.Interaction):
     # Get member count and roles
     members = gang_data.get("members", {})
     member_list = []
+    # Only the first ten members are shown, so only their names are resolved
+    shown = list(members)[:10]
+    names = await display_names.resolve(interaction.client, shown, data, interaction.guild)
 
-    for member_uid, role in members.items():
-        try:
-            user = interaction.client.get_user(int(member_uid))
-            if user:
-                username = getattr(user, 'display_name', user.name)
-            else:
-                username = f"User {member_uid}"
-            role_info = GANG_ROLES.get(role, {"name": role})
-            member_list.append(f"• {username} ({role_info['name']})")
-        except Exception:
-            member_list.append(f"• User {member_uid} ({role})")
+    for member_uid in shown:
+        username = names.get(member_uid) or f"User {member_uid}"
+        role = members[member_uid]
+        role_info = GANG_ROLES.get(role, {"name": role})
+        member_list.append(f"• {username} ({role_info['name']})")
 
     embed = discord.Embed(
         title=f"👥 **{gang_data['name']}** 👥",
@@ -1369,7 +1654,7 @@ async def gang_info(interaction: discord.Interaction):
 
     if member_list:
         embed.add_field(name="👥 **Member List**", 
-                        value="\n".join(member_list[:10]) + (f"\n*+{len(member_list)-10} more...*" if len(member_list) > 10 else ""), 
+                        value="\n".join(member_list) + (f"\n*+{len(members)-10} more...*" if len(members) > 10 else ""), 
                         inline=False)
 
     await interaction.response.send_message(embed=embed)
@@ -1413,12 +1698,25 @@ async def gang_invite(interaction: discord.Interaction, user: discord.Member):
                 await button_interaction.response.send_message("❌ This invitation isn't for you!", ephemeral=True)
                 return
 
-            # Add to gang
-            gang_data["members"][target_uid] = "member"
-            target_business_data["gang_id"] = gang_id
-            target_business_data["gang_role"] = "member"
+            def join_gang(data):
+                # Re-check against the current records; the invite may be minutes old
+                current_gang = data.get("gangs", {}).get(gang_id)
+                if not current_gang:
+                    return "❌ That gang no longer exists!"
+                target_record = get_user_business_data(target_uid, data)
+                if target_record.get("gang_id"):
+                    return "❌ You're already in a gang!"
+                memberships().join(data, gang_id, target_uid)
+                return None
 
-            save_business_data(data)
+            try:
+                async with lock_business_entities(gangs=[gang_id], users=[target_uid]):
+                    error = await commit_business_data(join_gang)
+            except CommitConflict:
+                error = "❌ The gang changed while joining, please try again!"
+            if error:
+                await button_interaction.response.send_message(error, ephemeral=True)
+                return
 
             embed = discord.Embed(
                 title="✅ **Gang Invitation Accepted!** ✅",
@@ -1481,7 +1779,7 @@ async def gang_leave(interaction: discord.Interaction):
                 new_leader = other_members[0]
 
             gang_data["leader"] = new_leader
-            gang_data["members"][new_leader] = "leader"
+            memberships().set_role(data, new_leader, "leader")
 
             embed = discord.Embed(
                 title="👑 **Leadership Transferred** 👑",
@@ -1490,7 +1788,8 @@ async def gang_leave(interaction: discord.Interaction):
             )
         else:
             # Disband gang
-            del gangs_data[gang_id]
+            memberships().disband(data, gang_id)
+            release_gang_name(gang_data.get("name"), gang_id)
             embed = discord.Embed(
                 title="💥 **Gang Disbanded** 💥",
                 description=f"*{gang_data['name']} has been disbanded as the last member left*",
@@ -1504,11 +1803,7 @@ async def gang_leave(interaction: discord.Interaction):
         )
 
     # Remove user from gang
-    if gang_id in gangs_data and uid in gangs_data[gang_id].get("members", {}):
-        del gangs_data[gang_id]["members"][uid]
-
-    user_business_data["gang_id"] = None
-    user_business_data["gang_role"] = None
+    memberships().leave(data, uid)
 
     save_business_data(data)
     await interaction.response.send_message(embed=embed)
@@ -1547,11 +1842,7 @@ async def gang_kick(interaction: discord.Interaction, user: discord.Member):
         return
 
     # Remove from gang
-    if target_uid in gang_data.get("members", {}):
-        del gang_data["members"][target_uid]
-
-    target_business_data["gang_id"] = None
-    target_business_data["gang_role"] = None
+    memberships().leave(data, target_uid)
 
     save_business_data(data)
 
@@ -1602,8 +1893,7 @@ async def gang_promote(interaction: discord.Interaction, user: discord.Member, r
     old_role = target_business_data.get("gang_role", "member")
 
     # Update role
-    gang_data["members"][target_uid] = role
-    target_business_data["gang_role"] = role
+    memberships().set_role(data, target_uid, role)
 
     save_business_data(data)
 
@@ -1618,8 +1908,14 @@ async def gang_promote(interaction: discord.Interaction, user: discord.Member, r
 
     await interaction.response.send_message(embed=embed)
 
+async def gang_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest up to 25 gang names starting with or containing what has been typed"""
+    # Discord caps choices at 100 characters; a cut name would not resolve, so longer ones are left out
+    return [app_commands.Choice(name=name, value=name) for gang_id, name in search_gang_names(current) if len(name) <= 100]
+
 @gang_group.command(name="war", description="Declare war on another gang")
 @app_commands.describe(gang_name="Name of the gang to declare war on")
+@app_commands.autocomplete(gang_name=gang_name_autocomplete)
 async def gang_war(interaction: discord.Interaction, gang_name: str):
     data = load_business_data()
     uid = str(interaction.user.id)
@@ -1639,14 +1935,8 @@ async def gang_war(interaction: discord.Interaction, gang_name: str):
         return
 
     # Find target gang
-    target_gang_id = None
-    target_gang_data = None
-
-    for gid, gdata in gangs_data.items():
-        if gdata.get("name", "").lower() == gang_name.lower():
-            target_gang_id = gid
-            target_gang_data = gdata
-            break
+    target_gang_id = gang_id_by_name(gang_name)
+    target_gang_data = gangs_data.get(target_gang_id) if target_gang_id else None
 
     if not target_gang_data:
         await interaction.response.send_message("❌ Gang not found!", ephemeral=True)
@@ -1730,21 +2020,22 @@ async def gang_war(interaction: discord.Interaction, gang_name: str):
 
 @gang_group.command(name="territory", description="View and purchase gang territories")
 async def gang_territory(interaction: discord.Interaction):
-    data = load_business_data()
+    snapshot = read_business_data()
     uid = str(interaction.user.id)
-    user_business_data = get_user_business_data(uid, data)
+    user_business_data = view_user_business_data(uid, snapshot)
 
     gang_id = user_business_data.get("gang_id")
     if not gang_id:
         await interaction.response.send_message("❌ You're not in a gang!", ephemeral=True)
         return
 
-    gangs_data = data.get("gangs", {})
+    gangs_data = snapshot.get("gangs", {})
     gang_data = gangs_data.get(gang_id)
     gang_level = gang_data.get("gang_level", 1)
     is_leader = user_business_data.get("gang_role") == "leader"
 
     territories = gang_data.get("territories", {})
+    summary = territory_summary(gang_data)
 
     class TerritoryView(discord.ui.View):
         def __init__(self):
@@ -1760,7 +2051,7 @@ async def gang_territory(interaction: discord.Interaction):
                 await button_interaction.response.send_message("❌ Only the gang leader can purchase territories!", ephemeral=True)
                 return
 
-            await show_territory_shop(button_interaction, gang_id, gang_level, data)
+            await show_territory_shop(button_interaction, gang_id, gang_level, load_business_data())
 
         @discord.ui.button(label="💰 Collect Income", style=discord.ButtonStyle.primary)
         async def collect_income(self, button_interaction: discord.Interaction, button: discord.ui.Button):
@@ -1768,9 +2059,14 @@ async def gang_territory(interaction: discord.Interaction):
                 await button_interaction.response.send_message("❌ This isn't your gang menu!", ephemeral=True)
                 return
 
-            income_per_member = distribute_territory_income(gang_id, data)
+            members = read_business_data().get("gangs", {}).get(gang_id, {}).get("members", {})
+            try:
+                async with lock_business_entities(gangs=[gang_id], users=members):
+                    income_per_member = await commit_business_data(lambda data: distribute_territory_income(gang_id, data))
+            except CommitConflict:
+                await button_interaction.response.send_message("❌ Your gang changed while collecting income, please try again!", ephemeral=True)
+                return
             if income_per_member > 0:
-                save_business_data(data)
                 embed = discord.Embed(
                     title="💰 **Territory Income Distributed!** 💰",
                     description=f"*Each gang member received ${income_per_member:,}!*",
@@ -1793,16 +2089,13 @@ async def gang_territory(interaction: discord.Interaction):
         embed.add_field(name="🏜️ **No Territories**", 
                         value="Your gang doesn't control any territories yet.", 
                         inline=False)
-        total_income = 0
     else:
-        total_income = 0
         territory_list = []
         for territory_id, territory_data in territories.items():
             territory_type = territory_data.get("type", "unknown")
             territory_info = TERRITORY_TYPES.get(territory_type, {})
 
             income = territory_info.get("income", 0)
-            total_income += income
 
             territory_list.append(f"{territory_info.get('emoji', '🏢')} **{territory_info.get('name', territory_type)}**\n└ ${income:,}/day • {territory_info.get('defense', 0)} defense")
 
@@ -1812,6 +2105,8 @@ async def gang_territory(interaction: discord.Interaction):
             inline=False
         )
 
+    total_income = summary["income"]
+    embed.add_field(name="🛡️ **Total Defense**", value=f"`{summary['defense']}`", inline=True)
     embed.add_field(name="💰 **Total Daily Income**", 
                     value=f"`${total_income:,}` (${total_income // len(gang_data.get('members', [uid])):,} per member)", 
                     inline=False)
@@ -1829,6 +2124,7 @@ async def show_territory_shop(interaction, gang_id, gang_level, data):
     gangs_data = data.get("gangs", {})
     gang_data = gangs_data[gang_id]
     owned_territories = gang_data.get("territories", {})
+    owned_types = territory_summary(gang_data)["types"]
     gambling_data = data.get("gambling", {})
     leader_uid = gang_data["leader"]
     leader_balance = gambling_data.get(leader_uid, {}).get("dollars", 100)
@@ -1841,7 +2137,7 @@ async def show_territory_shop(interaction, gang_id, gang_level, data):
             for territory_type, territory_info in TERRITORY_TYPES.items():
 
                 # Check if already owned
-                already_owned = any(t.get("type") == territory_type for t in owned_territories.values())
+                already_owned = territory_type in owned_types
 
                 if already_owned:
                     status = "👑 OWNED"
@@ -1884,52 +2180,54 @@ async def show_territory_shop(interaction, gang_id, gang_level, data):
 
 async def purchase_territory(interaction, gang_id, territory_type, data):
     """Handle territory purchase"""
-    gangs_data = data.get("gangs", {})
-    gang_data = gangs_data[gang_id]
-    gang_level = gang_data.get("gang_level", 1)
-    gambling_data = data.get("gambling", {})
-    leader_uid = gang_data["leader"]
-
     territory_info = TERRITORY_TYPES[territory_type]
     requirements = get_territory_unlock_requirements()
 
-    # Check if already owned
-    owned_territories = gang_data.get("territories", {})
-    already_owned = any(t.get("type") == territory_type for t in owned_territories.values())
+    def buy_territory(data):
+        # The shop menu may be minutes old; check against the records as they are now
+        gangs_data = data.get("gangs", {})
+        gang_data = gangs_data.get(gang_id)
+        if not gang_data:
+            return "❌ Your gang no longer exists!", None
+        gang_level = gang_data.get("gang_level", 1)
+        gambling_data = data.get("gambling", {})
+        leader_uid = gang_data["leader"]
 
-    if already_owned:
-        await interaction.response.send_message(f"❌ Your gang already owns a {territory_info['name']}!", ephemeral=True)
-        return
+        # Check if already owned
+        already_owned = territory_type in territory_summary(gang_data)["types"]
 
-    # Check gang level requirement
-    if gang_level < requirements[territory_type]["gang_level"]:
-        await interaction.response.send_message(
-            f"❌ Your gang needs to be level {requirements[territory_type]['gang_level']} to purchase {territory_info['name']}! (Currently level {gang_level})", 
-            ephemeral=True
-        )
-        return
+        if already_owned:
+            return f"❌ Your gang already owns a {territory_info['name']}!", None
 
-    # Check if leader can afford it
-    leader_balance = gambling_data.get(leader_uid, {}).get("dollars", 100)
-    if leader_balance < requirements[territory_type]["cost"]:
-        await interaction.response.send_message(
-            f"❌ Gang leader needs ${requirements[territory_type]['cost']:,} but only has ${leader_balance:,}!", 
-            ephemeral=True
-        )
-        return
+        # Check gang level requirement
+        if gang_level < requirements[territory_type]["gang_level"]:
+            return f"❌ Your gang needs to be level {requirements[territory_type]['gang_level']} to purchase {territory_info['name']}! (Currently level {gang_level})", None
 
-    # Purchase territory
-    gambling_data[leader_uid]["dollars"] -= requirements[territory_type]["cost"]
+        # Check if leader can afford it
+        leader_balance = gambling_data.get(leader_uid, {}).get("dollars", 100)
+        if leader_balance < requirements[territory_type]["cost"]:
+            return f"❌ Gang leader needs ${requirements[territory_type]['cost']:,} but only has ${leader_balance:,}!", None
 
-    territory_id = f"territory_{int(datetime.now().timestamp())}"
-    gang_data.setdefault("territories", {})[territory_id] = {
-        "type": territory_type,
-        "name": territory_info["name"],
-        "purchased_at": datetime.now(timezone.utc).isoformat(),
-        "purchased_by": leader_uid
-    }
+        # Purchase territory
+        gambling_data[leader_uid]["dollars"] -= requirements[territory_type]["cost"]
 
-    save_business_data(data)
+        territory_id = f"territory_{int(datetime.now().timestamp())}"
+        add_territory(gang_data, territory_id, {
+            "type": territory_type,
+            "name": territory_info["name"],
+            "purchased_at": datetime.now(timezone.utc).isoformat(),
+            "purchased_by": leader_uid
+        })
+        return None, gambling_data[leader_uid]["dollars"]
+
+    try:
+        async with lock_business_entities(gangs=[gang_id], users=[str(interaction.user.id)]):
+            error, leader_balance = await commit_business_data(buy_territory)
+    except CommitConflict:
+        error = "❌ Your gang changed during the purchase, please try again!"
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
+        return
 
     embed = discord.Embed(
         title="🏢 **Territory Purchased!** 🏢",
@@ -1940,13 +2238,14 @@ async def purchase_territory(interaction, gang_id, territory_type, data):
     embed.add_field(name="💰 **Cost**", value=f"`${requirements[territory_type]['cost']:,}`", inline=True)
     embed.add_field(name="📈 **Daily Income**", value=f"`${territory_info['income']:,}`", inline=True)
     embed.add_field(name="🛡️ **Defense**", value=f"`{territory_info['defense']}`", inline=True)
-    embed.add_field(name="💵 **Leader Balance**", value=f"`${gambling_data[leader_uid]['dollars']:,}`", inline=True)
+    embed.add_field(name="💵 **Leader Balance**", value=f"`${leader_balance:,}`", inline=True)
     embed.set_footer(text="Territory income will be distributed to all gang members!")
 
     await interaction.response.edit_message(embed=embed, view=None)
 
 @gang_group.command(name="join", description="Request to join a gang")
 @app_commands.describe(gang_name="Name of the gang you want to join")
+@app_commands.autocomplete(gang_name=gang_name_autocomplete)
 async def gang_join(interaction: discord.Interaction, gang_name: str):
     data = load_business_data()
     uid = str(interaction.user.id)
@@ -1964,24 +2263,16 @@ async def gang_join(interaction: discord.Interaction, gang_name: str):
 
     # Find the target gang
     gangs_data = data.get("gangs", {})
-    target_gang_id = None
-    target_gang_data = None
-
-    for gangid, gangdata in gangs_data.items():
-        if gangdata.get("name", "").lower() == gang_name.lower():
-            target_gang_id = gangid
-            target_gang_data = gangdata
-            break
+    target_gang_id = gang_id_by_name(gang_name)
+    target_gang_data = gangs_data.get(target_gang_id) if target_gang_id else None
 
     if not target_gang_data:
-        # Show available gangs
-        available_gangs = [gangdata.get("name", "Unknown") for gangdata in gangs_data.values()]
-        if available_gangs:
-            gang_list = ", ".join(available_gangs[:5])
-            if len(available_gangs) > 5:
-                gang_list += f" and {len(available_gangs) - 5} more"
+        # Suggest gangs with similar names, or the first few when nothing matches
+        suggestions = search_gang_names(gang_name, 5) or search_gang_names("", 5)
+        if suggestions:
+            gang_list = ", ".join(name for gang_id, name in suggestions)
             await interaction.response.send_message(
-                f"❌ Gang **{gang_name}** not found!\n\n**Available gangs:** {gang_list}\n\n*Use exact gang name to join.*", 
+                f"❌ Gang **{gang_name}** not found!\n\n**Did you mean:** {gang_list}\n\n*Pick a gang from the suggestions while typing to join.*", 
                 ephemeral=True)
         else:
             await interaction.response.send_message("❌ No gangs exist yet! Create one with `/gang create`.", ephemeral=True)
@@ -1995,9 +2286,7 @@ async def gang_join(interaction: discord.Interaction, gang_name: str):
 
     # Auto-join the gang (simplified version - you could make this require approval)
     # Add user to gang
-    target_gang_data["members"][uid] = "member"
-    user_business_data["gang_id"] = target_gang_id
-    user_business_data["gang_role"] = "member"
+    memberships().join(data, target_gang_id, uid)
 
     save_business_data(data)
 
@@ -2025,6 +2314,7 @@ async def gang_join(interaction: discord.Interaction, gang_name: str):
 
 @gang_group.command(name="ganglv", description="[ADMIN ONLY] Set a gang's level on this server")
 @app_commands.describe(gang_name="Name of the gang to modify", level="New gang level (1-100)")
+@app_commands.autocomplete(gang_name=gang_name_autocomplete)
 async def gang_ganglv(interaction: discord.Interaction, gang_name: str, level: int):
     # Import is_admin from main.py
     from main import is_admin
@@ -2041,14 +2331,8 @@ async def gang_ganglv(interaction: discord.Interaction, gang_name: str, level: i
     gangs_data = data.get("gangs", {})
 
     # Find gang by name (case insensitive)
-    target_gang_id = None
-    target_gang_data = None
-
-    for gang_id, gang_data in gangs_data.items():
-        if gang_data.get("name", "").lower() == gang_name.lower():
-            target_gang_id = gang_id
-            target_gang_data = gang_data
-            break
+    target_gang_id = gang_id_by_name(gang_name)
+    target_gang_data = gangs_data.get(target_gang_id) if target_gang_id else None
 
     if not target_gang_data:
         await interaction.response.send_message(f"❌ Gang '{gang_name}' not found on this server.", ephemeral=True)
@@ -2114,17 +2398,11 @@ async def gang_ganglvr(interaction: discord.Interaction):
             gang_count = len(gangs_data)
             total_territories = sum(len(gang.get("territories", {})) for gang in gangs_data.values())
 
-            # Reset all gang data
-            data["gangs"] = {}
+            users_reset = sum(len(gang.get("members", {})) for gang in gangs_data.values())
 
-            # Remove gang memberships from all users
-            business_data = data.get("business", {})
-            users_reset = 0
-            for uid, user_data in business_data.items():
-                if user_data.get("gang_id"):
-                    user_data["gang_id"] = None
-                    user_data["gang_role"] = None
-                    users_reset += 1
+            # Reset all gang data; every member's gang fields are cleared with it
+            memberships().reset(data)
+            reset_gang_names()
 
             save_business_data(data)
 
@@ -2235,28 +2513,49 @@ async def gang_register(interaction: discord.Interaction):
         print(f"Gang registration error: {e}")
         await interaction.response.send_message("❌ An error occurred during registration. Please try again.", ephemeral=True)
 
-@gang_group.command(name="list", description="View all gangs on the server")
-async def gang_list(interaction: discord.Interaction):
-    data = load_business_data()
-    gangs_data = data.get("gangs", {})
+# Orders /gang list can rank gangs by: label and score of a gang record
+GANG_RANKINGS = {
+    "xp": ("Gang XP", lambda gang_data: gang_data.get("gang_xp", 0)),
+    "members": ("Members", lambda gang_data: len(gang_data.get("members", {}))),
+    "income": ("Territory Income", lambda gang_data: territory_summary(gang_data)["income"]),
+}
+GANG_LIST_PAGE_SIZE = 10
 
-    if not gangs_data:
-        await interaction.response.send_message("❌ No gangs exist yet! Create one with `/gang create`.", ephemeral=True)
-        return
+def _register_gang_rankings():
+    """The store keeps each ranking ordered as gangs change, so a page never sorts every gang"""
+    for sort_by, (_, score) in GANG_RANKINGS.items():
+        ranking(f"gangs_{sort_by}", "gangs", score)
+
+_register_gang_rankings()
+
+def gang_list_embed(sort_by, page):
+    """Build one leaderboard page; returns (embed, page, page count, gang count) with page clamped"""
+    rows, total = ranking_page(f"gangs_{sort_by}", page, GANG_LIST_PAGE_SIZE)
+    pages = max(1, -(-total // GANG_LIST_PAGE_SIZE))
+    if page >= pages:
+        # Gangs were disbanded since the previous page was shown
+        page = pages - 1
+        rows, total = ranking_page(f"gangs_{sort_by}", page, GANG_LIST_PAGE_SIZE)
+
+    label = GANG_RANKINGS[sort_by][0]
+    gangs_data = read_business_data().get("gangs", {})
 
     embed = discord.Embed(
         title="👥 **All Gangs** 👥",
-        description="*List of all gangs on this server*",
+        description=f"*Gangs on this server ranked by {label}*",
         color=0xFF0000
     )
 
-    for gang_id, gang_data in gangs_data.items():
+    for rank, gang_id, score in rows:
+        gang_data = gangs_data.get(gang_id)
+        if gang_data is None:
+            continue
         member_count = len(gang_data.get("members", {}))
         leader_id = gang_data.get("leader")
 
         embed.add_field(
-            name=f"👑 **{gang_data['name']}**",
-            value=f"Leader: <@{leader_id}>\nMembers: {member_count}\nLevel: {gang_data.get('base_level', 1)}",
+            name=f"#{rank} 👑 **{gang_data['name']}**",
+            value=f"Leader: <@{leader_id}>\nMembers: {member_count}\nLevel: {gang_data.get('base_level', 1)}\n{label}: {score:,}",
             inline=True
         )
 
@@ -2272,7 +2571,56 @@ async def gang_list(interaction: discord.Interaction):
         inline=False
     )
 
-    await interaction.response.send_message(embed=embed)
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {total} gangs")
+    return embed, page, pages, total
+
+class GangListView(discord.ui.View):
+    """Previous/next buttons for the /gang list leaderboard"""
+
+    def __init__(self, uid, sort_by, page, pages):
+        super().__init__(timeout=300)
+        self.uid = uid
+        self.sort_by = sort_by
+        self.page = page
+        self.pages = pages
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        if str(interaction.user.id) != self.uid:
+            await interaction.response.send_message("❌ This isn't your gang list!", ephemeral=True)
+            return
+
+        embed, self.page, self.pages, _ = gang_list_embed(self.sort_by, page)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next ▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+@gang_group.command(name="list", description="View all gangs on the server")
+@app_commands.describe(sort_by="What to rank gangs by")
+@app_commands.choices(sort_by=[
+    app_commands.Choice(name="Gang XP", value="xp"),
+    app_commands.Choice(name="Members", value="members"),
+    app_commands.Choice(name="Territory Income", value="income")
+])
+async def gang_list(interaction: discord.Interaction, sort_by: str = "xp"):
+    embed, page, pages, total = gang_list_embed(sort_by, 0)
+    if not total:
+        await interaction.response.send_message("❌ No gangs exist yet! Create one with `/gang create`.", ephemeral=True)
+        return
+
+    view = GangListView(str(interaction.user.id), sort_by, page, pages)
+    await interaction.response.send_message(embed=embed, view=view)
 
 # Battle system with different styles and level effects
 BATTLE_STYLES = {
@@ -2387,7 +2735,7 @@ async def gang_battle(interaction: discord.Interaction, target_user: Optional[di
     active_war = None
     enemy_gang_id = None
 
-    for enemy_id, war_id_ref in gang_data.get("wars", {}).items():
+    for enemy_id, war_id_ref in active_wars(gang_id, data).items():
         if war_id_ref in wars_data and wars_data[war_id_ref]["status"] == "active":
             active_war = wars_data[war_id_ref]
             enemy_gang_id = enemy_id
@@ -2413,8 +2761,8 @@ async def send_battle_invitation(interaction, uid, target_uid, user_level, targe
                 await button_interaction.response.send_message("❌ This invitation isn't for you!", ephemeral=True)
                 return
 
-            # Start the battle
-            await start_friendly_battle_simple(button_interaction, uid, target_uid, user_level, target_level, data, is_gang_training)
+            # Start the battle from the records as they are now, not when the invite was sent
+            await start_friendly_battle_simple(button_interaction, uid, target_uid, user_level, target_level, load_business_data(), is_gang_training)
 
         @discord.ui.button(label="❌ Decline", style=discord.ButtonStyle.danger)
         async def decline_battle(self, button_interaction: discord.Interaction, button: discord.ui.Button):
@@ -2446,20 +2794,13 @@ async def start_friendly_battle_simple(interaction, uid, target_uid, user_level,
     """Interactive friendly battle implementation"""
     from battle_system import BattlePlayer, StreetBattle, create_battle_embed, active_battles
 
-    # Get user equipment using local functions
-    equipment_data = load_equipment_data()
-    user_equipment = get_user_equipment(uid, equipment_data)
-    target_equipment = get_user_equipment(target_uid, equipment_data)
+    # Equipment lives in the same resident document as the battle data
+    user_equipment = get_user_equipment(uid, data)
+    target_equipment = get_user_equipment(target_uid, data)
 
     # Get target user and ensure proper username handling
-    target_user = interaction.client.get_user(int(target_uid))
-    if target_user:
-        target_username = target_user.display_name
-    else:
-        # Try to get username from gambling data
-        gambling_data = data.get("gambling", {})
-        target_gambling = gambling_data.get(target_uid, {})
-        target_username = target_gambling.get("username", f"Player {target_uid[:8]}")
+    names = await display_names.resolve(interaction.client, [target_uid], data, interaction.guild)
+    target_username = names.get(target_uid) or f"Player {target_uid[:8]}"
 
     # Create battle players with proper names
     player1 = BattlePlayer(
@@ -2541,11 +2882,7 @@ class FriendlyBattleActionView(discord.ui.View):
         
         if user_id != current_player_id:
             # Get current player name for better error message
-            try:
-                current_user = interaction.client.get_user(int(current_player_id))
-                current_name = current_user.display_name if current_user else f"Player {current_player_id[:8]}"
-            except:
-                current_name = f"Player {current_player_id[:8]}"
+            current_name = display_names.lookup(interaction.client, current_player_id) or f"Player {current_player_id[:8]}"
             
             await interaction.response.send_message(f"❌ It's not your turn! Current turn: {current_name}", ephemeral=True)
             return
@@ -2555,7 +2892,7 @@ class FriendlyBattleActionView(discord.ui.View):
 
         if result.get("battle_end"):
             # Battle is over
-            await self.award_friendly_battle_rewards(interaction, result)
+            reward_error = await self.award_friendly_battle_rewards(interaction, result)
 
             # Remove from active battles
             from battle_system import active_battles
@@ -2579,6 +2916,8 @@ class FriendlyBattleActionView(discord.ui.View):
                     description=result["message"],
                     color=0x00FF00
                 )
+            if reward_error:
+                embed.add_field(name="⚠️ **Rewards**", value=reward_error, inline=False)
 
             await interaction.response.edit_message(embed=embed, view=None)
         else:
@@ -2605,34 +2944,40 @@ class FriendlyBattleActionView(discord.ui.View):
             await interaction.edit_original_response(embed=battle_embed, view=new_view)
 
     async def award_friendly_battle_rewards(self, interaction: discord.Interaction, result: dict):
-        """Award XP and money for friendly battles"""
-        gambling_data = self.data.get("gambling", {})
-
-        # Award rewards to both players
-        for player in [self.battle.player1, self.battle.player2]:
-            uid = player.user_id
-            if uid not in gambling_data:
-                gambling_data[uid] = {"dollars": 100, "xp": 0}
-
-            # Award rewards based on outcome
-            if result["winner"] == player.username:
-                # Winner rewards
-                xp_gain = 100 + (player.level * 10)
-                money_gain = 50000 + (player.level * 5000)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-                gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
-            elif result["winner"] != "Draw":
-                # Loser consolation
-                xp_gain = 50 + (player.level * 5)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-            else:
-                # Draw rewards
-                xp_gain = 75 + (player.level * 7)
-                money_gain = 25000 + (player.level * 2500)
-                gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
-                gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
+        """Award XP and money for friendly battles; returns an error message or None"""
+        def apply_rewards(data):
+            gambling_data = data.setdefault("gambling", {})
+
+            # Award rewards to both players
+            for player in [self.battle.player1, self.battle.player2]:
+                uid = player.user_id
+                if uid not in gambling_data:
+                    gambling_data[uid] = {"dollars": 100, "xp": 0}
+
+                # Award rewards based on outcome
+                if result["winner"] == player.username:
+                    # Winner rewards
+                    xp_gain = 100 + (player.level * 10)
+                    money_gain = 50000 + (player.level * 5000)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
+                    gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
+                elif result["winner"] != "Draw":
+                    # Loser consolation
+                    xp_gain = 50 + (player.level * 5)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
+                else:
+                    # Draw rewards
+                    xp_gain = 75 + (player.level * 7)
+                    money_gain = 25000 + (player.level * 2500)
+                    gambling_data[uid]["xp"] = gambling_data[uid].get("xp", 0) + xp_gain
+                    gambling_data[uid]["dollars"] = gambling_data[uid].get("dollars", 100) + money_gain
 
-        save_business_data(self.data)
+        try:
+            async with lock_business_entities(users=[self.battle.player1.user_id, self.battle.player2.user_id]):
+                await commit_business_data(apply_rewards)
+        except CommitConflict:
+            return "❌ Your records kept changing, so rewards weren't saved. Please try again in a moment!"
+        return None
 
 # Add equipment shop and loadout commands
 equipment_group = app_commands.Group(name="equipment", description="Buy weapons, armor and gear")
@@ -2640,7 +2985,6 @@ equipment_group = app_commands.Group(name="equipment", description="Buy weapons,
 @equipment_group.command(name="shop", description="Browse and purchase weapons and armor")
 async def equipment_shop(interaction: discord.Interaction):
     data = load_business_data()
-    equipment_data = load_equipment_data()
     uid = str(interaction.user.id)
 
     # Get user balance and level
@@ -2651,7 +2995,7 @@ async def equipment_shop(interaction: discord.Interaction):
     from smoke_features import calculate_level
     user_level = calculate_level(user_gambling.get("xp", 0))
 
-    user_equipment = get_user_equipment(uid, equipment_data)
+    user_equipment = get_user_equipment(uid, data)
 
     class ShopCategorySelect(discord.ui.Select):
         def __init__(self):
@@ -2732,9 +3076,9 @@ async def show_weapon_shop(interaction, current_balance, user_equipment):
             level_req = weapon_info.get("level_req", 1)
 
             # Reload user equipment data in callback
-            equipment_data = load_equipment_data()
+            data = load_business_data()
             uid = str(interaction.user.id)
-            user_equipment = get_user_equipment(uid, equipment_data)
+            user_equipment = get_user_equipment(uid, data)
             owned_weapons = user_equipment.get("weapons", ["fists"])
 
             if weapon_id in owned_weapons:
@@ -2749,18 +3093,11 @@ async def show_weapon_shop(interaction, current_balance, user_equipment):
                 await interaction.response.send_message(f"❌ You need ${cost:,} but only have ${current_balance:,}!", ephemeral=True)
                 return
 
-            # Purchase weapon
-            data = load_business_data()
-            gambling_data = data.get("gambling", {})
-            uid = str(interaction.user.id)
-            gambling_data[uid]["dollars"] -= cost
-
-            equipment_data = load_equipment_data()
-            user_equipment = get_user_equipment(uid, equipment_data)
-            user_equipment["weapons"].append(weapon_id)
-
-            save_business_data(data)
-            save_equipment_data(equipment_data)
+            # Purchase weapon: balance and equipment are committed together
+            with business_transaction() as data:
+                gambling_data = data["gambling"]
+                gambling_data[uid]["dollars"] -= cost
+                get_user_equipment(uid, data)["weapons"].append(weapon_id)
 
             embed = discord.Embed(
                 title="🔫 **Weapon Purchased!** 🔫",
@@ -2837,9 +3174,9 @@ async def show_clothing_shop(interaction, current_balance, user_equipment):
             level_req = clothing_info.get("level_req", 1)
 
             # Reload user equipment data in callback
-            equipment_data = load_equipment_data()
+            data = load_business_data()
             uid = str(interaction.user.id)
-            user_equipment = get_user_equipment(uid, equipment_data)
+            user_equipment = get_user_equipment(uid, data)
             owned_clothing = user_equipment.get("clothing", ["street_clothes"])
 
             if clothing_id in owned_clothing:
@@ -2854,18 +3191,11 @@ async def show_clothing_shop(interaction, current_balance, user_equipment):
                 await interaction.response.send_message(f"❌ You need ${cost:,} but only have ${current_balance:,}!", ephemeral=True)
                 return
 
-            # Purchase clothing
-            data = load_business_data()
-            gambling_data = data.get("gambling", {})
-            uid = str(interaction.user.id)
-            gambling_data[uid]["dollars"] -= cost
-
-            equipment_data = load_equipment_data()
-            user_equipment = get_user_equipment(uid, equipment_data)
-            user_equipment["clothing"].append(clothing_id)
-
-            save_business_data(data)
-            save_equipment_data(equipment_data)
+            # Purchase clothing: balance and equipment are committed together
+            with business_transaction() as data:
+                gambling_data = data["gambling"]
+                gambling_data[uid]["dollars"] -= cost
+                get_user_equipment(uid, data)["clothing"].append(clothing_id)
 
             embed = discord.Embed(
                 title="🧥 **Clothing Purchased!** 🧥",
@@ -0,0 +1,4029 @@
+import asyncio
+import atexit
+import bisect
+import concurrent.futures
+import contextlib
+import contextvars
+import heapq
+import inspect
+import itertools
+import json
+import logging
+import marshal
+import os
+import random
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections.abc import Mapping
+from types import MappingProxyType
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Persistence settings (overridable from the environment)
+DATA_FILE = os.environ.get("BUSINESS_DATA_FILE", "contributions.json")
+SQLITE_FILE = os.environ.get("BUSINESS_SQLITE_FILE", "economy.db")
+STORAGE_BACKEND = os.environ.get("BUSINESS_STORAGE", "json")
+FLUSH_INTERVAL = float(os.environ.get("BUSINESS_FLUSH_INTERVAL", "30"))
+FLUSH_EVERY = int(os.environ.get("BUSINESS_FLUSH_EVERY", "50"))
+JOURNAL_FILE = os.environ.get("BUSINESS_JOURNAL_FILE")
+COMPACT_INTERVAL = float(os.environ.get("BUSINESS_COMPACT_INTERVAL", "300"))
+COMPACT_BYTES = int(os.environ.get("BUSINESS_COMPACT_BYTES", str(8 * 1024 * 1024)))
+COMMIT_WINDOW = float(os.environ.get("BUSINESS_COMMIT_WINDOW_MS", "25")) / 1000
+CAS_RETRIES = int(os.environ.get("BUSINESS_CAS_RETRIES", "5"))
+SHARD_DIR = os.environ.get("BUSINESS_SHARD_DIR", "economy_shards")
+SHARD_BUCKETS = int(os.environ.get("BUSINESS_SHARD_BUCKETS", "256"))
+SNAPSHOT_FILE = os.environ.get("BUSINESS_SNAPSHOT_FILE", "contributions.snap")
+SERIALIZER = os.environ.get("BUSINESS_SERIALIZER")
+WAR_ARCHIVE_FILE = os.environ.get("BUSINESS_WAR_ARCHIVE", "wars.archive")
+# battle_system, smoke_features, cross_server_features and main still read
+# contributions.json through shared_utils, so by default every save is on disk
+# before it returns; set to 0 for write-behind once they all use the store
+WRITE_THROUGH = os.environ.get("BUSINESS_WRITE_THROUGH", "1") != "0"
+
+# Top-level sections that hold one record per user/gang/war
+SECTIONS = ("business", "gangs", "wars", "gambling", "equipment")
+
+# Record fields that only ever change by adding to them, so concurrent changes by
+# this store and another writer of the file can both be kept
+COUNTER_FIELDS = frozenset({"dollars", "xp", "treasury"})
+
+# Records users have before anything about them is stored; records equal to these are not kept
+DEFAULT_RECORDS = {
+    "business": {
+        "businesses": {},
+        "total_income": 0,
+        "gang_id": None,
+        "gang_role": None,
+        "current_location": "amsterdam",
+        "visited_locations": ["amsterdam"],
+        "achievements": [],
+        "research_projects": {}
+    },
+    "equipment": {
+        "weapons": ["fists"],
+        "clothing": ["street_clothes"],
+        "current_weapon": "fists",
+        "current_clothing": "street_clothes",
+        "inventory": {}
+    },
+}
+
+
+def encode_record(value):
+    """Compact JSON encoding used for individual records"""
+    return json.dumps(value, separators=(",", ":"))
+
+
+def fingerprint(value):
+    """Bytes that change whenever a record's contents change
+
+    marshal is several times faster than json; version 2 leaves out the
+    reference flags that would depend on refcounts. Materialized default
+    records (dict subclasses) fall back to json.
+    """
+    try:
+        return marshal.dumps(value, 2)
+    except ValueError:
+        return encode_record(value).encode()
+
+
+def write_atomic(path, text, mode="w"):
+    """Replace a file with new contents without ever exposing a partial file
+
+    The contents go to a temp file in the same directory, are fsynced, and are
+    renamed over the target; the directory is fsynced so the rename survives
+    a crash as well. Returns the os.stat_result of the new file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return stat
+
+
+# Marker for "every key of this section changed"
+ALL = object()
+
+
+class RecordSource:
+    """Storage-side supplier of a section's records that are not resident yet
+
+    Backends that can read single records (or decode single sections) return
+    one of these in place of a section from load(); the section then faults
+    records in as they are used. A source must never hand out the same record
+    twice, or a record deleted in memory would come back.
+    """
+
+    def fetch(self, key):
+        """Records stored together with key (at least key itself, if it exists)"""
+        raise NotImplementedError
+
+    def fetch_all(self):
+        """Every record not handed out by an earlier fetch"""
+        raise NotImplementedError
+
+
+class TrackedSection(dict):
+    """Top-level section that records which entity keys were handed out or changed
+
+    Entities are recorded when they are read as well as when they are written,
+    because handlers mutate the nested records in place. Persistence then only
+    re-encodes the recorded keys and compares them with the last encoding.
+
+    With a RecordSource the section starts out partial: looking up a key loads
+    the records stored with it, and anything that needs the whole section
+    (iteration, len, items, ...) loads the rest first.
+    """
+
+    __slots__ = ("_doc", "_name", "_source")
+
+    def __init__(self, doc, name, records=(), source=None):
+        super().__init__(records)
+        self._doc = doc
+        self._name = name
+        self._source = source
+
+    def _touch(self, key=ALL):
+        self._doc.touch(self._name, key)
+
+    def _merge(self, records):
+        if not dict.__len__(self):
+            dict.update(self, records)
+            return
+        for key, record in records.items():
+            # Records already resident are newer than what storage has
+            dict.setdefault(self, key, record)
+
+    def _fault(self, key):
+        if self._source is not None and not dict.__contains__(self, key):
+            self._merge(self._source.fetch(key))
+
+    def load_all(self):
+        """Make every record of the section resident"""
+        if self._source is not None:
+            source, self._source = self._source, None
+            self._merge(source.fetch_all())
+
+    @property
+    def is_complete(self):
+        return self._source is None
+
+    def __getitem__(self, key):
+        self._fault(key)
+        value = dict.__getitem__(self, key)
+        self._touch(key)
+        return value
+
+    def get(self, key, default=None):
+        self._fault(key)
+        if dict.__contains__(self, key):
+            self._touch(key)
+            return dict.__getitem__(self, key)
+        return default
+
+    def __contains__(self, key):
+        self._fault(key)
+        return dict.__contains__(self, key)
+
+    def setdefault(self, key, default=None):
+        self._fault(key)
+        self._touch(key)
+        return dict.setdefault(self, key, default)
+
+    def __setitem__(self, key, value):
+        self._fault(key)
+        self._touch(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._fault(key)
+        if not dict.__contains__(self, key):
+            raise KeyError(key)
+        self._touch(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        self._fault(key)
+        self._touch(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self.load_all()
+        if not dict.__len__(self):
+            raise KeyError("popitem(): dictionary is empty")
+        self._touch(next(reversed(dict.keys(self))))
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        for key in other:
+            self._fault(key)
+            self._touch(key)
+        dict.update(self, other)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        # Storage is replaced wholesale, so nothing needs to be loaded first
+        self._source = None
+        self._touch()
+        dict.clear(self)
+
+    def __iter__(self):
+        self.load_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.load_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.load_all()
+        return dict.keys(self)
+
+    def items(self):
+        self.load_all()
+        self._touch()
+        return dict.items(self)
+
+    def values(self):
+        self.load_all()
+        self._touch()
+        return dict.values(self)
+
+    def copy(self):
+        self.load_all()
+        self._touch()
+        return dict(dict.items(self))
+
+    def __eq__(self, other):
+        self.load_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.load_all()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.load_all()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        # Copies and pickles of a section are plain dicts
+        self.load_all()
+        return dict, (dict(dict.items(self)),)
+
+
+class TrackedDocument(dict):
+    """Economy document whose dict sections record their modified keys
+
+    Touching an entry marks it modified, but handlers also keep records
+    (in Views, across awaits) and change them after the save that followed
+    the touch. Every entry ever handed out is therefore watched as well, and
+    rescan() touches the watched entries whose contents changed since the
+    previous rescan.
+    """
+
+    def __init__(self, data=()):
+        super().__init__()
+        self._changes = {}
+        # Entries handed out since load: name -> set of keys, or ALL for all of them
+        self._handed = {}
+        # (name, key or ALL) -> fingerprint() of a handed-out entry as of the last rescan()
+        self._seen = {}
+        # Called with (name, key) the first time an entry is touched after take_changes()
+        self.on_first_touch = None
+        for name, value in dict(data).items():
+            dict.__setitem__(self, name, self._adopt(name, value))
+        for name in SECTIONS:
+            if not dict.__contains__(self, name):
+                dict.__setitem__(self, name, TrackedSection(self, name))
+                self.touch(name)
+
+    def _adopt(self, name, value):
+        if isinstance(value, TrackedSection) and value._doc is self and value._name == name:
+            return value
+        if isinstance(value, TrackedSection):
+            value.load_all()
+            return TrackedSection(self, name, dict.items(value))
+        if isinstance(value, RecordSource):
+            return TrackedSection(self, name, source=value)
+        if isinstance(value, dict):
+            return TrackedSection(self, name, dict(value))
+        return value
+
+    def touch(self, name, key=ALL):
+        """Record that key (or the whole value) of a top-level entry is about to change
+
+        Callers touch before mutating, so on_first_touch sees the old value.
+        """
+        handed = self._handed.get(name)
+        if key is ALL:
+            self._handed[name] = ALL
+        elif handed is None:
+            self._handed[name] = {key}
+        elif handed is not ALL:
+            handed.add(key)
+        keys = self._changes.get(name)
+        if key is ALL:
+            if keys is not ALL:
+                if self.on_first_touch is not None:
+                    self.on_first_touch(name, ALL)
+                self._changes[name] = ALL
+            return
+        if keys is None:
+            keys = self._changes[name] = set()
+        elif keys is ALL:
+            # Keys added after the whole section was touched still need their old state kept
+            if self.on_first_touch is not None:
+                self.on_first_touch(name, key)
+            return
+        elif key in keys:
+            return
+        if self.on_first_touch is not None:
+            self.on_first_touch(name, key)
+        keys.add(key)
+
+    def take_changes(self):
+        """Return {name: set of keys or ALL} recorded since the previous call"""
+        changes, self._changes = self._changes, {}
+        return changes
+
+    def rescan(self):
+        """Touch every handed-out entry whose contents changed since the previous rescan
+
+        An entry without an earlier fingerprint counts as changed. Costs one
+        fingerprint per handed-out record, so it runs once per commit.
+        """
+        seen = self._seen
+        for name, keys in self._handed.items():
+            if not dict.__contains__(self, name):
+                seen.pop((name, ALL), None)
+                continue
+            value = dict.__getitem__(self, name)
+            if not isinstance(value, TrackedSection):
+                text = fingerprint(value)
+                if seen.get((name, ALL)) != text:
+                    seen[(name, ALL)] = text
+                    self.touch(name)
+                continue
+            touched = self._changes.get(name)
+            for key in (dict.keys(value) if keys is ALL else keys):
+                record = dict.get(value, key, MISSING)
+                if record is MISSING:
+                    seen.pop((name, key), None)
+                    continue
+                text = fingerprint(record)
+                if seen.get((name, key)) != text:
+                    seen[(name, key)] = text
+                    if touched is not ALL and (touched is None or key not in touched):
+                        self.touch(name, key)
+                        touched = self._changes.get(name)
+
+    @property
+    def has_changes(self):
+        return bool(self._changes)
+
+    @staticmethod
+    def merge_changes(into, changes):
+        """Fold one take_changes() result into another"""
+        for name, keys in changes.items():
+            current = into.get(name)
+            if keys is ALL or current is ALL:
+                into[name] = ALL
+            elif current is None:
+                into[name] = set(keys)
+            else:
+                current.update(keys)
+        return into
+
+    def __getitem__(self, name):
+        value = dict.__getitem__(self, name)
+        if not isinstance(value, TrackedSection):
+            self.touch(name)
+        return value
+
+    def get(self, name, default=None):
+        if dict.__contains__(self, name):
+            return self[name]
+        return default
+
+    def setdefault(self, name, default=None):
+        if not dict.__contains__(self, name):
+            self[name] = default
+        return self[name]
+
+    def __setitem__(self, name, value):
+        self.touch(name)
+        dict.__setitem__(self, name, self._adopt(name, value))
+
+    def __delitem__(self, name):
+        if not dict.__contains__(self, name):
+            raise KeyError(name)
+        self.touch(name)
+        dict.__delitem__(self, name)
+
+    def pop(self, name, *default):
+        self.touch(name)
+        return dict.pop(self, name, *default)
+
+    def popitem(self):
+        if not dict.__len__(self):
+            raise KeyError("popitem(): dictionary is empty")
+        self.touch(next(reversed(dict.keys(self))))
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        for name in dict.keys(self):
+            self.touch(name)
+        dict.clear(self)
+
+    def items(self):
+        for name, value in dict.items(self):
+            if not isinstance(value, TrackedSection):
+                self.touch(name)
+        return dict.items(self)
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def plain(value):
+    """Top-level value without its tracking wrapper (nested records are shared)"""
+    if isinstance(value, TrackedSection):
+        value.load_all()
+        return dict(dict.items(value))
+    return value
+
+
+# Marker for a record deleted since the last flush
+MISSING = object()
+
+
+def clone(value):
+    """Deep copy of JSON-like data (much faster than copy.deepcopy)"""
+    if isinstance(value, dict):
+        return {key: clone(item) for key, item in dict.items(value)}
+    if isinstance(value, list):
+        return [clone(item) for item in value]
+    return value
+
+
+def default_record(name):
+    """Fresh copy of the record a user has in section name before anything is stored"""
+    return clone(DEFAULT_RECORDS[name])
+
+
+def is_default_record(name, record):
+    """Whether a stored record carries nothing beyond its section's defaults"""
+    return name in DEFAULT_RECORDS and record == DEFAULT_RECORDS[name]
+
+
+class VirtualList(list):
+    """List inside a VirtualRecord; changing it stores the record"""
+
+    __slots__ = ("_record",)
+
+    def __init__(self, items, record):
+        super().__init__(items)
+        self._record = record
+
+    def _changing(self):
+        self._record.materialize()
+
+    def __setitem__(self, index, value):
+        self._changing()
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self._changing()
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        self._changing()
+        return list.__iadd__(self, other)
+
+    def __imul__(self, count):
+        self._changing()
+        return list.__imul__(self, count)
+
+    def append(self, value):
+        self._changing()
+        list.append(self, value)
+
+    def extend(self, values):
+        self._changing()
+        list.extend(self, values)
+
+    def insert(self, index, value):
+        self._changing()
+        list.insert(self, index, value)
+
+    def remove(self, value):
+        self._changing()
+        list.remove(self, value)
+
+    def pop(self, *index):
+        self._changing()
+        return list.pop(self, *index)
+
+    def clear(self):
+        self._changing()
+        list.clear(self)
+
+    def sort(self, *args, **kwargs):
+        self._changing()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self._changing()
+        list.reverse(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class VirtualDict(dict):
+    """Dict inside a VirtualRecord (or the record itself); changing it stores the record"""
+
+    __slots__ = ("_record",)
+
+    def __init__(self, items, record):
+        super().__init__(items)
+        self._record = record
+
+    def _changing(self):
+        self._record.materialize()
+
+    def __setitem__(self, key, value):
+        self._changing()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._changing()
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self._changing()
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key, *default):
+        self._changing()
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._changing()
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        self._changing()
+        dict.update(self, *args, **kwargs)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        self._changing()
+        dict.clear(self)
+
+    def __reduce__(self):
+        # Copies and pickles are plain dicts
+        return dict, (dict(self),)
+
+
+def _virtual(value, record):
+    if isinstance(value, dict):
+        return VirtualDict({key: _virtual(item, record) for key, item in value.items()}, record)
+    if isinstance(value, list):
+        return VirtualList([_virtual(item, record) for item in value], record)
+    return value
+
+
+class VirtualRecord(VirtualDict):
+    """Default record for a key its section does not store
+
+    It reads like the defaults; the first change anywhere inside it stores
+    the record itself in its section, so the handler's reference stays the
+    stored record from then on. Unchanged defaults are never written.
+    """
+
+    __slots__ = ("_data", "_name", "_key", "__weakref__")
+
+    # (id of the document, section, key) -> record not stored yet, so every caller shares it
+    _unstored = weakref.WeakValueDictionary()
+
+    def __init__(self, data, name, key):
+        super().__init__((), self)
+        for field, value in DEFAULT_RECORDS[name].items():
+            dict.__setitem__(self, field, _virtual(value, self))
+        self._data = data
+        self._name = name
+        self._key = key
+
+    @property
+    def is_stored(self):
+        return self._data is None
+
+    def materialize(self):
+        """Store the record in its section (once)"""
+        data, self._data = self._data, None
+        if data is None:
+            return
+        VirtualRecord._unstored.pop((id(data), self._name, self._key), None)
+        section = data.setdefault(self._name, {})
+        if self._key in section:
+            # Another default for the same key was stored first; keep what it holds
+            dict.update(self, section[self._key])
+        section[self._key] = self
+
+
+def record_or_default(data, name, key):
+    """The record stored under key in section name, or a VirtualRecord of its defaults"""
+    section = data.get(name)
+    if section is not None and key in section:
+        return section[key]
+    record = VirtualRecord._unstored.get((id(data), name, key))
+    if record is None:
+        record = VirtualRecord._unstored[(id(data), name, key)] = VirtualRecord(data, name, key)
+    return record
+
+
+class ChangeSet:
+    """Detached copy of everything one flush has to persist
+
+    It is captured on the thread that owns the document, so backends running
+    on the writer thread never read the live document.
+    """
+
+    def __init__(self, names):
+        # Top-level names in document order
+        self.names = names
+        # name -> full copy of the value
+        self.values = {}
+        # section -> (key order, {key: record copy or MISSING})
+        self.records = {}
+
+    @classmethod
+    def capture(cls, doc, changes=None):
+        """Copy the recorded changes of doc (everything when changes is None)"""
+        changeset = cls(list(dict.keys(doc)))
+        for name in (changeset.names if changes is None else changes):
+            if not dict.__contains__(doc, name):
+                continue
+            value = dict.__getitem__(doc, name)
+            keys = ALL if changes is None else changes[name]
+            if keys is ALL and isinstance(value, TrackedSection):
+                value.load_all()
+            if name in SECTIONS and isinstance(value, dict) and keys is not ALL:
+                records = {}
+                for key in keys:
+                    if dict.__contains__(value, key):
+                        records[key] = clone(dict.__getitem__(value, key))
+                    else:
+                        records[key] = MISSING
+                changeset.records[name] = (list(dict.keys(value)), records)
+            else:
+                changeset.values[name] = clone(value)
+        return changeset
+
+    def merge(self, later):
+        """Fold a newer change set into this one"""
+        for name, (order, records) in later.records.items():
+            whole = self.values.get(name)
+            if isinstance(whole, dict):
+                for key, record in records.items():
+                    if record is MISSING:
+                        whole.pop(key, None)
+                    else:
+                        whole[key] = record
+                self.values[name] = {key: whole[key] for key in order if key in whole}
+            elif name in self.records:
+                merged = self.records[name][1]
+                merged.update(records)
+                self.records[name] = (order, merged)
+            else:
+                self.records[name] = (order, records)
+        for name, value in later.values.items():
+            self.values[name] = value
+            self.records.pop(name, None)
+
+        self.names = later.names
+        current = set(self.names)
+        for name in [name for name in self.values if name not in current]:
+            del self.values[name]
+        for name in [name for name in self.records if name not in current]:
+            del self.records[name]
+
+
+def freeze(value):
+    """Read-only deep copy: dicts become mapping proxies and lists become tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in dict.items(value)})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class PersistentMap:
+    """Immutable hash map whose updated copies share untouched buckets"""
+
+    __slots__ = ("_buckets",)
+
+    BUCKETS = 64
+
+    def __init__(self, buckets=None):
+        self._buckets = buckets or ({},) * self.BUCKETS
+
+    def get(self, key, default=None):
+        return self._buckets[hash(key) % self.BUCKETS].get(key, default)
+
+    def __contains__(self, key):
+        return key in self._buckets[hash(key) % self.BUCKETS]
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def evolve(self, updates):
+        """Copy with updates applied; only the buckets they land in are copied"""
+        buckets = list(self._buckets)
+        copied = set()
+        for key, value in updates.items():
+            index = hash(key) % self.BUCKETS
+            if index not in copied:
+                buckets[index] = dict(buckets[index])
+                copied.add(index)
+            buckets[index][key] = value
+        return PersistentMap(tuple(buckets))
+
+
+class SnapshotPublisher:
+    """Publishes an immutable ReadSnapshot of the resident document after each commit
+
+    A snapshot only stores frozen copies of records touched since the document
+    was loaded; everything else has not changed since load and is read from
+    the live document. Successive snapshots share their unchanged buckets.
+    The value a record had before its first touch is kept as its origin, so
+    snapshots published before that touch keep seeing it.
+    """
+
+    def __init__(self, doc, version=0):
+        self.doc = doc
+        # name -> {key: (last version before the touch, frozen old value)}; None holds top-level names
+        self._origins = {}
+        self._alive = weakref.WeakSet()
+        # Version stamps: name -> {key: commits that changed the entry}, and per whole section
+        self.versions = {}
+        self.section_versions = {}
+        # Called as listener(changes, snapshot) after every publish
+        self.listeners = []
+        self.current = self._make(version, {})
+        doc.on_first_touch = self.remember
+
+    def _make(self, version, overrides):
+        snapshot = ReadSnapshot(self.doc, version, overrides, self._origins)
+        self._alive.add(snapshot)
+        return snapshot
+
+    def _section(self, name):
+        value = dict.get(self.doc, name)
+        return value if isinstance(value, TrackedSection) else None
+
+    def _keep(self, name, key, value):
+        published = self.current.overrides.get(name)
+        origins = self._origins.setdefault(name, {})
+        if key not in origins and (published is None or key not in published):
+            origins[key] = (self.current.version, MISSING if value is MISSING else freeze(plain(value)))
+
+    def remember(self, name, key):
+        """Keep the committed value of an entry that is about to be modified"""
+        if name not in SECTIONS:
+            self._keep(None, name, dict.get(self.doc, name, MISSING))
+            return
+        section = self._section(name)
+        if section is None:
+            return
+        if key is ALL:
+            section.load_all()
+            for key, record in dict.items(section):
+                self._keep(name, key, record)
+        else:
+            self._keep(name, key, dict.get(section, key, MISSING))
+
+    def publish(self, changes, version):
+        """Publish a snapshot with the entries touched since the last one refrozen"""
+        overrides = dict(self.current.overrides)
+        top = {}
+        for name, keys in changes.items():
+            if name not in SECTIONS:
+                value = dict.get(self.doc, name, MISSING)
+                top[name] = MISSING if value is MISSING else freeze(plain(value))
+                continue
+            section = self._section(name)
+            if section is None:
+                section = {}
+                keys = ALL
+            if keys is ALL:
+                if isinstance(section, TrackedSection):
+                    section.load_all()
+                updates = {key: freeze(record) for key, record in dict.items(section)}
+                # Keys that existed before stay visible as deleted, not as their old origin
+                for key in [*overrides.get(name, ()), *self._origins.get(name, {})]:
+                    if key not in updates:
+                        updates[key] = MISSING
+                overrides[name] = PersistentMap().evolve(updates)
+            else:
+                updates = {}
+                for key in keys:
+                    value = dict.get(section, key, MISSING)
+                    updates[key] = MISSING if value is MISSING else freeze(value)
+                overrides[name] = overrides.get(name, PersistentMap()).evolve(updates)
+            self._bump(name, updates)
+        if top:
+            overrides[None] = overrides.get(None, PersistentMap()).evolve(top)
+            self._bump(None, top)
+
+        self.current = self._make(version, overrides)
+        self._prune()
+        for listener in self.listeners:
+            listener(changes, self.current)
+        return self.current
+
+    def _bump(self, name, updates):
+        """Advance the version of every entry whose committed value really changed"""
+        versions = self.versions.setdefault(name, {})
+        changed = False
+        for key, value in updates.items():
+            if self.current.resolve(name, key) != value:
+                versions[key] = versions.get(key, 0) + 1
+                changed = True
+        if changed:
+            self.section_versions[name] = self.section_versions.get(name, 0) + 1
+
+    def version_of(self, name, key=ALL):
+        """Version stamp of one entry, or of a whole section when key is ALL"""
+        if key is ALL:
+            return self.section_versions.get(name, 0)
+        return self.versions.get(name, {}).get(key, 0)
+
+    def _prune(self):
+        """Drop origins that no live snapshot can still need"""
+        oldest = min(snapshot.version for snapshot in self._alive)
+        for origins in self._origins.values():
+            for key in [key for key, (touched, _) in origins.items() if touched < oldest]:
+                del origins[key]
+
+
+class ReadSnapshot:
+    """Immutable view of the economy document as of one commit
+
+    Supports the read side of the dict API (get, [], in, iteration, len).
+    Sections come back as SnapshotSection mappings and records as frozen
+    copies, so display commands can neither insert defaults nor mutate state.
+    """
+
+    def __init__(self, doc, version, overrides, origins):
+        self.doc = doc
+        self.version = version
+        self.overrides = overrides
+        self._origins = origins
+
+    def resolve(self, name, key):
+        """Frozen value of key in a section (name None for top-level names), or MISSING"""
+        published = self.overrides.get(name)
+        if published is not None:
+            value = published.get(key, ALL)
+            if value is not ALL:
+                return value
+        origin = self._origins.get(name, {}).get(key)
+        if origin is not None and self.version <= origin[0]:
+            return origin[1]
+        # Not touched since this snapshot, so the live value is the committed one
+        if name is None:
+            value = dict.get(self.doc, key, MISSING)
+            return MISSING if value is MISSING else freeze(plain(value))
+        section = dict.get(self.doc, name)
+        if not isinstance(section, TrackedSection):
+            return MISSING
+        section._fault(key)
+        value = dict.get(section, key, MISSING)
+        return MISSING if value is MISSING else freeze(value)
+
+    def present(self, name, key):
+        """Whether key exists in a section as of this snapshot; nothing is frozen"""
+        if name is None and key in SECTIONS:
+            return True
+        published = self.overrides.get(name)
+        if published is not None:
+            value = published.get(key, ALL)
+            if value is not ALL:
+                return value is not MISSING
+        origin = self._origins.get(name, {}).get(key)
+        if origin is not None and self.version <= origin[0]:
+            return origin[1] is not MISSING
+        if name is None:
+            return dict.__contains__(self.doc, key)
+        section = dict.get(self.doc, name)
+        if not isinstance(section, TrackedSection):
+            return False
+        section._fault(key)
+        return dict.__contains__(section, key)
+
+    def _live(self, name, complete=True):
+        live = self.doc if name is None else dict.get(self.doc, name)
+        if complete and isinstance(live, TrackedSection):
+            live.load_all()
+        return live if isinstance(live, dict) else {}
+
+    def _overlay(self, name):
+        """{key: present} for keys whose snapshot value may differ from the live one"""
+        overlay = {}
+        for key, (touched, value) in self._origins.get(name, {}).items():
+            if self.version <= touched:
+                overlay[key] = value is not MISSING
+        published = self.overrides.get(name)
+        if published is not None:
+            for bucket in published._buckets:
+                for key, value in bucket.items():
+                    overlay[key] = value is not MISSING
+        return overlay
+
+    def keys(self, name=None):
+        """Keys present in a section (or top-level names) as of this snapshot
+
+        Live keys nobody touched since the snapshot are present as they are,
+        so only touched keys are looked at, and no record is frozen.
+        """
+        live = self._live(name)
+        overlay = self._overlay(name)
+        keys = [key for key in dict.keys(live) if overlay.get(key, True)]
+        keys.extend(key for key, present in overlay.items() if present and not dict.__contains__(live, key))
+        return keys
+
+    def count(self, name=None):
+        """Number of keys in a section as of this snapshot"""
+        live = self._live(name)
+        return len(live) + sum(present - dict.__contains__(live, key) for key, present in self._overlay(name).items())
+
+    def has_keys(self, name=None):
+        """Whether a section has any key; the rest of a partial section loads only if none is resident"""
+        published = self.overrides.get(name)
+        if published is not None and any(value is not MISSING for bucket in published._buckets for value in bucket.values()):
+            return True
+        for complete in (False, True):
+            if any(self.present(name, key) for key in list(dict.keys(self._live(name, complete)))):
+                return True
+        return any(self.present(name, key) for key in self._origins.get(name, {}))
+
+    def __getitem__(self, name):
+        if name in SECTIONS:
+            return SnapshotSection(self, name)
+        value = self.resolve(None, name)
+        if value is MISSING:
+            raise KeyError(name)
+        return value
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return self.present(None, name)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        return self.has_keys()
+
+
+class SnapshotSection(Mapping):
+    """Read-only section of a ReadSnapshot"""
+
+    def __init__(self, snapshot, name):
+        self._snapshot = snapshot
+        self._name = name
+
+    def __getitem__(self, key):
+        value = self._snapshot.resolve(self._name, key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._snapshot.present(self._name, key)
+
+    def __iter__(self):
+        return iter(self._snapshot.keys(self._name))
+
+    def __len__(self):
+        return self._snapshot.count(self._name)
+
+    def __bool__(self):
+        return self._snapshot.has_keys(self._name)
+
+
+class CommitConflict(RuntimeError):
+    """An optimistic commit kept losing to concurrent changes of the entries it read"""
+
+
+def sync_in_place(target, value):
+    """Make target equal to value, keeping target's nested containers alive
+
+    Handlers may still hold references into a live record, so an optimistic
+    commit updates it in place instead of swapping in the working copy.
+    """
+    for key in [key for key in target if key not in value]:
+        del target[key]
+    for key, item in value.items():
+        current = target.get(key, MISSING)
+        if isinstance(current, dict) and isinstance(item, dict):
+            if current != item:
+                sync_in_place(current, item)
+        elif isinstance(current, list) and isinstance(item, list):
+            if current != item:
+                current[:] = item
+        elif current is MISSING or current != item:
+            target[key] = item
+    return target
+
+
+class OptimisticSection(dict):
+    """Working copy of the records of one section that an optimistic commit uses"""
+
+    def __init__(self, doc, name):
+        super().__init__()
+        self._doc = doc
+        self._name = name
+        # key -> copy of the live record when first read (MISSING if it did not exist)
+        self.originals = {}
+        self.whole = False
+
+    def _live(self):
+        live = dict.get(self._doc.live, self._name)
+        return live if isinstance(live, dict) else {}
+
+    def _load(self, key):
+        if key in self.originals:
+            return
+        live = self._live()
+        if isinstance(live, TrackedSection):
+            live._fault(key)
+        self._doc.read(self._name, key)
+        value = dict.get(live, key, MISSING)
+        self.originals[key] = MISSING if value is MISSING else clone(value)
+        if value is not MISSING:
+            dict.__setitem__(self, key, clone(value))
+
+    def _load_all(self):
+        if self.whole:
+            return
+        live = self._live()
+        if isinstance(live, TrackedSection):
+            live.load_all()
+        self._doc.read(self._name, ALL)
+        for key in list(dict.keys(live)):
+            self._load(key)
+        self.whole = True
+
+    def __getitem__(self, key):
+        self._load(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._load(key)
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        self._load(key)
+        return dict.__contains__(self, key)
+
+    def setdefault(self, key, default=None):
+        self._load(key)
+        return dict.setdefault(self, key, default)
+
+    def __setitem__(self, key, value):
+        self._load(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._load(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        self._load(key)
+        return dict.pop(self, key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def popitem(self):
+        self._load_all()
+        return dict.popitem(self)
+
+    def clear(self):
+        self._load_all()
+        dict.clear(self)
+
+    def __iter__(self):
+        self._load_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._load_all()
+        return dict.keys(self)
+
+    def items(self):
+        self._load_all()
+        return dict.items(self)
+
+    def values(self):
+        self._load_all()
+        return dict.values(self)
+
+    def copy(self):
+        self._load_all()
+        return dict(dict.items(self))
+
+    def apply(self, target):
+        """Write the records this copy changed into the live section"""
+        for key, original in self.originals.items():
+            if not dict.__contains__(self, key):
+                if original is not MISSING:
+                    target.pop(key, None)
+                continue
+            value = dict.__getitem__(self, key)
+            if value == original:
+                continue
+            current = target.get(key) if original is not MISSING else None
+            if isinstance(current, dict) and isinstance(value, dict):
+                sync_in_place(current, value)
+            else:
+                target[key] = value
+
+
+class OptimisticDocument(dict):
+    """Private working copy of the parts of the document one optimistic commit reads
+
+    Entries are copied from the resident document on first access, together
+    with their version stamps; mutations only change the copies. validate()
+    checks the stamps and apply() writes the changed entries back.
+    """
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.live = store.load()
+        # (name, key or ALL) -> version stamp when read; name None holds top-level entries
+        self.stamps = {}
+        self._originals = {}
+
+    def read(self, name, key):
+        if (name, key) not in self.stamps:
+            self.stamps[(name, key)] = self.store.version_of(name, key)
+
+    def _load(self, name):
+        if dict.__contains__(self, name) or name in self._originals:
+            return
+        value = dict.get(self.live, name, MISSING)
+        if name in SECTIONS and (value is MISSING or isinstance(value, dict)):
+            dict.__setitem__(self, name, OptimisticSection(self, name))
+            return
+        self.read(None, name)
+        self._originals[name] = MISSING if value is MISSING else clone(plain(value))
+        if value is not MISSING:
+            dict.__setitem__(self, name, clone(plain(value)))
+
+    def _load_names(self):
+        for name in list(dict.keys(self.live)):
+            self._load(name)
+
+    def __getitem__(self, name):
+        self._load(name)
+        return dict.__getitem__(self, name)
+
+    def get(self, name, default=None):
+        self._load(name)
+        return dict.get(self, name, default)
+
+    def __contains__(self, name):
+        self._load(name)
+        return dict.__contains__(self, name)
+
+    def setdefault(self, name, default=None):
+        self._load(name)
+        return dict.setdefault(self, name, default)
+
+    def __setitem__(self, name, value):
+        self._load(name)
+        current = dict.get(self, name)
+        if isinstance(current, OptimisticSection) and isinstance(value, dict):
+            # Replacing a section replaces each of its records
+            current.clear()
+            current.update(value)
+            return
+        dict.__setitem__(self, name, value)
+
+    def __delitem__(self, name):
+        self._load(name)
+        dict.__delitem__(self, name)
+
+    def pop(self, name, *default):
+        self._load(name)
+        return dict.pop(self, name, *default)
+
+    def __iter__(self):
+        self._load_names()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load_names()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._load_names()
+        return dict.keys(self)
+
+    def items(self):
+        self._load_names()
+        return dict.items(self)
+
+    def values(self):
+        self._load_names()
+        return dict.values(self)
+
+    def validate(self):
+        """Whether every entry read still carries the version stamp it was read with"""
+        return all(self.store.version_of(name, key) == stamp for (name, key), stamp in self.stamps.items())
+
+    def apply(self):
+        """Write the changed entries into the resident document"""
+        live = self.live
+        for name, value in dict.items(self):
+            if isinstance(value, OptimisticSection):
+                value.apply(live.setdefault(name, {}))
+                continue
+            original = self._originals.get(name, MISSING)
+            if value == original:
+                continue
+            current = dict.get(live, name)
+            if isinstance(current, dict) and isinstance(value, dict):
+                sync_in_place(live[name], value)
+            else:
+                live[name] = value
+        for name, original in self._originals.items():
+            if original is not MISSING and not dict.__contains__(self, name):
+                live.pop(name, None)
+
+
+class Serializer:
+    """Turns one top-level value of the document into bytes and back"""
+
+    name = "base"
+
+    def dumps(self, value):
+        raise NotImplementedError
+
+    def loads(self, blob):
+        raise NotImplementedError
+
+    def is_mapping(self, blob):
+        """Whether the payload encodes a dict, without decoding it"""
+        raise NotImplementedError
+
+
+class JsonSerializer(Serializer):
+    """Compact stdlib json; always available"""
+
+    name = "json"
+
+    def dumps(self, value):
+        return encode_record(value).encode("utf-8")
+
+    def loads(self, blob):
+        return json.loads(blob)
+
+    def is_mapping(self, blob):
+        return blob.lstrip()[:1] == b"{"
+
+
+class MsgpackSerializer(Serializer):
+    """MessagePack via the optional msgpack package"""
+
+    name = "msgpack"
+
+    def dumps(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, blob):
+        return msgpack.unpackb(blob, raw=False, strict_map_key=False)
+
+    def is_mapping(self, blob):
+        # fixmap, map16 and map32 type bytes
+        return bool(blob) and (0x80 <= blob[0] <= 0x8f or blob[0] in (0xde, 0xdf))
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+
+def available_serializers():
+    """Names of the serializers usable in this environment, fastest first"""
+    return [name for name in ("msgpack", "json") if name != "msgpack" or msgpack is not None]
+
+
+def get_serializer(name=None):
+    """Serializer selected by name or BUSINESS_SERIALIZER, falling back to json"""
+    name = (name or SERIALIZER or available_serializers()[0]).lower()
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown business serializer '{name}' (choose from {', '.join(SERIALIZERS)})")
+    if name not in available_serializers():
+        logger.warning("Business serializer '%s' is not installed, using json", name)
+        name = "json"
+    return SERIALIZERS[name]()
+
+
+class StorageBackend:
+    """Interface for the on-disk representation of the economy document"""
+
+    name = "base"
+
+    def load(self):
+        raise NotImplementedError
+
+    def write(self, changeset):
+        """Persist a ChangeSet; runs on the writer thread"""
+        raise NotImplementedError
+
+    def paths(self):
+        """Files holding the stored document"""
+        return []
+
+    def size(self):
+        """Bytes the stored document occupies on disk"""
+        return sum(os.path.getsize(path) for path in self.paths() if os.path.exists(path))
+
+    # Called with the exception when background work of the backend fails
+    on_error = None
+
+    def _report(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def reclaim(self):
+        """Give space freed by deleted records back to the file system"""
+
+    def pull(self):
+        """Changes other processes or modules made to the stored document
+
+        Returns [(name, key, base, theirs)] in the order they happened, where
+        key is ALL for a whole top-level value and base is the value this
+        backend last knew (MISSING if absent), or None when nothing changed.
+        Only backends whose files other code also writes implement this.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+def merge3(base, ours, theirs, field=None):
+    """Combine two independent edits of base
+
+    Dicts are merged key by key (MISSING stands for an absent key). Where
+    both sides changed a COUNTER_FIELDS value both deltas are added, so
+    concurrent balance and XP changes are all kept; any other value both
+    sides changed keeps ours, the write that lands last.
+    """
+    if theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+        merged = {}
+        for key in list(ours) + [key for key in theirs if key not in ours]:
+            value = merge3(base.get(key, MISSING), ours.get(key, MISSING), theirs.get(key, MISSING), key)
+            if value is not MISSING:
+                merged[key] = value
+        return merged
+    numbers = (base, ours, theirs)
+    if field in COUNTER_FIELDS and all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                                       for value in numbers):
+        return ours + theirs - base
+    return ours
+
+
+class JsonFileBackend(StorageBackend):
+    """The original single contributions.json document
+
+    The file keeps the json.dump(..., indent=2) layout, but it is assembled from
+    cached per-record encodings so only changed records are re-encoded.
+
+    Other bot modules read and rewrite the same file, so the file's stat is
+    remembered after every read and write. When it changed behind our back,
+    write() merges the other writer's records into the change set instead of
+    overwriting them, and pull() hands the changes to the store so the
+    resident document picks them up too.
+    """
+
+    name = "json"
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+        self._records = {}
+        self._texts = {}
+        # (mtime, size, inode) of the file as we last read or wrote it
+        self._stamp = None
+        # Foreign changes merged by write() that pull() has not returned yet
+        self._foreign = []
+        self._lock = threading.Lock()
+
+    def paths(self):
+        return [self.path]
+
+    def _file_stamp(self, stat=None):
+        if stat is None:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self):
+        with self._lock:
+            # Stat first: a write landing during the read then shows up as a change
+            stamp = self._file_stamp()
+            data = self._read()
+            # Seed the caches so later writes only encode what changed
+            self._records, self._texts = {}, {}
+            for name, value in data.items():
+                self._texts[name] = self._encode_value(name, value)
+            self._stamp = stamp
+            self._foreign = []
+        return data
+
+    def pull(self):
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                try:
+                    disk = self._read()
+                except ValueError:
+                    # Caught another writer mid-write; try again on the next pull
+                    disk = None
+                if disk is not None:
+                    self._foreign.extend(self._absorb(disk))
+                    self._stamp = stamp
+            changes, self._foreign = self._foreign, []
+        return changes or None
+
+    def _absorb(self, disk):
+        """Re-seed the caches from the file; returns the entries that differed"""
+        changes = []
+        for name in [name for name in self._texts if name not in disk]:
+            changes.append((name, ALL, json.loads(self._texts.pop(name)), MISSING))
+            self._records.pop(name, None)
+        for name, value in disk.items():
+            cache = self._records.get(name)
+            if cache is None or not isinstance(value, dict):
+                text = self._encode_value(name, value)
+                old = self._texts.get(name)
+                if old != text:
+                    changes.append((name, ALL, MISSING if old is None else json.loads(old), value))
+                self._texts[name] = text
+                continue
+            for key in [key for key in cache if key not in value]:
+                changes.append((name, key, json.loads(cache.pop(key)), MISSING))
+            for key, record in value.items():
+                text = self._encode_record(record)
+                old = cache.get(key)
+                if old != text:
+                    changes.append((name, key, MISSING if old is None else json.loads(old), record))
+                    cache[key] = text
+            self._texts[name] = self._join(cache, value.keys())
+        return changes
+
+    def _rebase(self, changeset, foreign):
+        """Merge foreign changes into a change set captured before they happened"""
+        names = changeset.names
+        for name, key, base, theirs in foreign:
+            if key is ALL:
+                if name in changeset.records:
+                    # Rebuild our whole value from the base and the records we changed
+                    order, records = changeset.records.pop(name)
+                    known = base if isinstance(base, dict) else {}
+                    changeset.values[name] = {
+                        k: records.get(k, known.get(k)) for k in order
+                        if records.get(k, known.get(k, MISSING)) is not MISSING
+                    }
+                if name in changeset.values:
+                    ours = changeset.values[name]
+                else:
+                    # Untouched by us since the base, unless we deleted it
+                    ours = base if name in names else MISSING
+                merged = merge3(base, ours, theirs)
+                if merged is MISSING:
+                    changeset.values.pop(name, None)
+                    if name in names:
+                        names.remove(name)
+                    continue
+                if name not in names:
+                    names.append(name)
+                if merged is not theirs or name in changeset.values:
+                    changeset.values[name] = merged
+                continue
+
+            if name not in names:
+                # We dropped the whole section; the deletion stands
+                continue
+            if name in changeset.values:
+                whole = changeset.values[name]
+                merged = merge3(base, whole.get(key, MISSING), theirs)
+                if merged is MISSING:
+                    whole.pop(key, None)
+                else:
+                    whole[key] = merged
+                continue
+            if name not in changeset.records:
+                # Section untouched by us: the re-seeded cache already holds their text
+                continue
+            order, records = changeset.records[name]
+            merged = merge3(base, records.get(key, base), theirs)
+            records[key] = merged
+            if merged is MISSING:
+                if key in order:
+                    order.remove(key)
+            elif key not in order:
+                order.append(key)
+
+    def write(self, changeset):
+        with self._lock:
+            if self._file_stamp() != self._stamp:
+                # Another writer replaced the file since we last read or wrote it.
+                # A half-written file raises here and the writer retries the batch.
+                foreign = self._absorb(self._read())
+                self._rebase(changeset, foreign)
+                # The store merges the same changes into the resident document
+                self._foreign.extend(foreign)
+            self._stamp = self._file_stamp(write_atomic(self.path, self.encode(changeset)))
+
+    def encode(self, changeset):
+        """Encode the document, reusing cached text for untouched sections and records"""
+        current = set(changeset.names)
+        for name in [name for name in self._texts if name not in current]:
+            del self._texts[name]
+            self._records.pop(name, None)
+
+        parts = []
+        for name in changeset.names:
+            if name in changeset.values:
+                self._texts[name] = self._encode_value(name, changeset.values[name])
+            elif name in changeset.records:
+                self._texts[name] = self._encode_records(name, *changeset.records[name])
+            parts.append(f"{json.dumps(name)}: {self._texts[name]}")
+        if not parts:
+            return "{}"
+        return "{\n  " + ",\n  ".join(parts) + "\n}"
+
+    def _encode_value(self, name, value):
+        if not isinstance(value, dict):
+            self._records.pop(name, None)
+            return json.dumps(value, indent=2).replace("\n", "\n  ")
+        cache = self._records[name] = {}
+        for key, record in value.items():
+            cache[key] = self._encode_record(record)
+        return self._join(cache, value.keys())
+
+    def _encode_records(self, name, order, records):
+        cache = self._records.setdefault(name, {})
+        for key, record in records.items():
+            if record is MISSING:
+                cache.pop(key, None)
+            else:
+                cache[key] = self._encode_record(record)
+        return self._join(cache, order)
+
+    @staticmethod
+    def _encode_record(record):
+        return json.dumps(record, indent=2).replace("\n", "\n    ")
+
+    @staticmethod
+    def _join(cache, order):
+        entries = ",\n    ".join(f"{json.dumps(key)}: {cache[key]}" for key in order)
+        return "{\n    " + entries + "\n  }" if entries else "{}"
+
+
+class RecordDiffer:
+    """Remembers the last persisted encoding of every record to find the changed ones"""
+
+    def __init__(self):
+        self.known = {section: {} for section in SECTIONS}
+        # Top-level keys outside the economy sections, keyed under None
+        self.known[None] = {}
+
+    def seed(self, data):
+        """Treat every record of data as already persisted"""
+        self.known = {section: {} for section in SECTIONS}
+        self.known[None] = {}
+        for name, value in dict.items(data):
+            if name in SECTIONS and isinstance(value, dict):
+                self.known[name] = {key: encode_record(record) for key, record in dict.items(value)}
+            else:
+                self.known[None][name] = encode_record(plain(value))
+
+    def diff(self, changeset):
+        """Return [(op, section, key, encoded)] for records whose encoding changed"""
+        changes = []
+        current = set(changeset.names)
+        for section in SECTIONS:
+            if section in changeset.values:
+                value = changeset.values[section]
+                self._replace(section, value if isinstance(value, dict) else {}, changes)
+            elif section in changeset.records:
+                self._apply(section, changeset.records[section][1], changes)
+            elif section not in current and self.known[section]:
+                self._replace(section, {}, changes)
+
+        extras = {name: value for name, value in changeset.values.items()
+                  if not (name in SECTIONS and isinstance(value, dict))}
+        self._apply(None, extras, changes)
+        stale = {name: MISSING for name in self.known[None]
+                 if name not in current or (name in SECTIONS and isinstance(changeset.values.get(name), dict))}
+        self._apply(None, stale, changes)
+        return changes
+
+    def _apply(self, section, records, changes):
+        known = self.known[section]
+        for key, record in records.items():
+            if record is MISSING:
+                if key in known:
+                    del known[key]
+                    changes.append(("del", section, key, None))
+                continue
+            encoded = encode_record(record)
+            if known.get(key) != encoded:
+                known[key] = encoded
+                changes.append(("put", section, key, encoded))
+
+    def _replace(self, section, records, changes):
+        self._apply(section, records, changes)
+        self._apply(section, {key: MISSING for key in self.known[section] if key not in records}, changes)
+
+
+class SqliteRecordSource(RecordSource):
+    """Reads single rows of one section table as they are first used"""
+
+    def __init__(self, backend, section):
+        self.backend = backend
+        self.section = section
+        self.fetched = set()
+        self.complete = False
+
+    def fetch(self, key):
+        if key in self.fetched:
+            return {}
+        self.fetched.add(key)
+        row = self.backend.read_row(self.section, key)
+        return {} if row is None else {key: row}
+
+    def fetch_all(self):
+        records = {}
+        for key, record in self.backend.read_rows(self.section):
+            if key not in self.fetched:
+                records[key] = record
+        self.fetched = set()
+        self.complete = True
+        return records
+
+
+class SqliteBackend(StorageBackend):
+    """One keyed table per economy section; only changed rows are written
+
+    Section rows are read lazily through a second connection, so a command
+    that looks at one gang or one user reads just those rows.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for section in SECTIONS:
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {section} (id TEXT PRIMARY KEY, record TEXT NOT NULL) WITHOUT ROWID")
+            # Anything outside the economy sections (players, settings, ...) is stored whole
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extras (id TEXT PRIMARY KEY, record TEXT NOT NULL) WITHOUT ROWID")
+        # WAL lets the event loop read rows while the writer thread commits
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._differ = RecordDiffer()
+        self._sources = {}
+
+    @staticmethod
+    def _table(section):
+        return "extras" if section is None else section
+
+    def read_row(self, section, key):
+        """Decode one stored record and remember its encoding for later diffs"""
+        row = self._reader.execute(f"SELECT record FROM {section} WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._differ.known[section][key] = row[0]
+        return json.loads(row[0])
+
+    def read_rows(self, section):
+        known = self._differ.known[section]
+        for row_id, record in self._reader.execute(f"SELECT id, record FROM {section}"):
+            known.setdefault(row_id, record)
+            yield row_id, json.loads(record)
+
+    def _complete_known(self, section):
+        """Learn every stored row of a section before it is replaced wholesale"""
+        source = self._sources.get(section)
+        if source is not None and source.complete:
+            return
+        known = self._differ.known[section]
+        for row_id, record in self._conn.execute(f"SELECT id, record FROM {section}"):
+            known.setdefault(row_id, record)
+        if source is not None:
+            source.complete = True
+
+    def paths(self):
+        return [self.path, f"{self.path}-wal"]
+
+    def reclaim(self):
+        # Deleted rows only leave free pages behind until the file is rebuilt
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.execute("VACUUM")
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def load(self):
+        data = {}
+        for section in SECTIONS:
+            self._differ.known[section] = {}
+            data[section] = self._sources[section] = SqliteRecordSource(self, section)
+        known = self._differ.known[None] = {}
+        for name, value in self._conn.execute("SELECT id, record FROM extras"):
+            known[name] = value
+            data[name] = json.loads(value)
+        return data
+
+    def write(self, changeset):
+        for section in SECTIONS:
+            if section in changeset.values or section not in changeset.names:
+                self._complete_known(section)
+        changes = self._differ.diff(changeset)
+        if not changes:
+            return
+        with self._conn:
+            for op, section, key, encoded in changes:
+                table = self._table(section)
+                if op == "put":
+                    self._conn.execute(f"INSERT OR REPLACE INTO {table} (id, record) VALUES (?, ?)", (key, encoded))
+                else:
+                    self._conn.execute(f"DELETE FROM {table} WHERE id = ?", (key,))
+
+    def close(self):
+        self._reader.close()
+        self._conn.close()
+
+
+class JournalBackend(StorageBackend):
+    """JSON snapshot plus an append-only journal of changed records
+
+    Each write appends one line per changed record instead of rewriting the
+    snapshot. A background compactor periodically folds the journal into a
+    fresh snapshot; startup replays the snapshot and then the journal tail.
+    Unlike the json backend it does not merge changes other modules write
+    to the snapshot file, so only use it where this store is its one writer.
+    """
+
+    name = "journal"
+
+    def __init__(self, path=DATA_FILE, journal_path=None,
+                 compact_interval=COMPACT_INTERVAL, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.journal_path = journal_path or JOURNAL_FILE or f"{path}.journal"
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+        self._differ = RecordDiffer()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._compactor = None
+
+    def paths(self):
+        return [self.path, self.journal_path]
+
+    def load(self):
+        data = JsonFileBackend(self.path).load()
+        good_offset = self._replay(data)
+        # Drop a torn record left behind by a crash mid-append
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > good_offset:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_offset)
+        self._differ.seed(data)
+        self._start_compactor()
+        return data
+
+    def _replay(self, data, limit=None):
+        """Apply journal records to data; returns the offset after the last good record"""
+        offset = 0
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            for line in f:
+                if limit is not None and offset + len(line) > limit:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                apply_journal_entry(data, entry)
+                offset += len(line)
+        return offset
+
+    def write(self, changeset):
+        changes = self._differ.diff(changeset)
+        if not changes:
+            return
+        lines = []
+        for op, section, key, encoded in changes:
+            if op == "put":
+                lines.append(f'{{"op":"put","s":{json.dumps(section)},"k":{json.dumps(key)},"v":{encoded}}}\n')
+            else:
+                lines.append(f'{{"op":"del","s":{json.dumps(section)},"k":{json.dumps(key)}}}\n')
+        payload = "".join(lines).encode("utf-8")
+
+        with self._lock:
+            with open(self.journal_path, "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        if size >= self.compact_bytes:
+            self._wake.set()
+
+    def _start_compactor(self):
+        if self._compactor is not None:
+            return
+        self._compactor = threading.Thread(target=self._compact_loop, name="business-journal-compactor", daemon=True)
+        self._compactor.start()
+
+    def _compact_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.compact_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                logger.exception("Business journal compaction failed")
+                self._report(e)
+
+    def compact(self):
+        """Fold the current journal into a new snapshot and keep only the tail"""
+        with self._lock:
+            try:
+                cutoff = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                return False
+        if cutoff == 0:
+            return False
+
+        # The fold only reads files, so appends can continue while it runs
+        data = JsonFileBackend(self.path).load()
+        folded = self._replay(data, limit=cutoff)
+        text = json.dumps(data, indent=2)
+
+        with self._lock:
+            write_atomic(self.path, text)
+            # Records appended after the cutoff carry over to the new journal
+            with open(self.journal_path, "rb") as f:
+                f.seek(folded)
+                tail = f.read()
+            write_atomic(self.journal_path, tail, mode="wb")
+        return True
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+            self._compactor = None
+        self.compact()
+
+
+def apply_journal_entry(data, entry):
+    """Replay a single journal record onto a document"""
+    section, key = entry["s"], entry["k"]
+    if section is None:
+        target = data
+    else:
+        target = data.get(section)
+        if not isinstance(target, dict):
+            target = data[section] = {}
+    if entry["op"] == "put":
+        target[key] = entry["v"]
+    else:
+        target.pop(key, None)
+
+
+class ShardSource(RecordSource):
+    """Faults one section of a ShardedBackend in bucket by bucket"""
+
+    def __init__(self, backend, section):
+        self.backend = backend
+        self.section = section
+        self.loaded = set()
+
+    def fetch(self, key):
+        bucket = self.backend.bucket_of(key)
+        if bucket in self.loaded:
+            return {}
+        self.loaded.add(bucket)
+        return self.backend.read_bucket(self.section, bucket)[1]
+
+    def fetch_all(self):
+        records = {}
+        for bucket in self.backend.bucket_ids(self.section):
+            if bucket not in self.loaded:
+                self.loaded.add(bucket)
+                records.update(self.backend.read_bucket(self.section, bucket)[1])
+        return records
+
+
+class ShardedBackend(StorageBackend):
+    """Economy sections split into hashed bucket files under one directory
+
+    manifest.json holds the bucket count, the top-level order and every value
+    outside the sections; <section>/<bucket>.json holds the records whose key
+    hashes to that bucket. load() only reads the manifest and the sections
+    fault buckets in on first use, so a handler that touches one gang and a
+    few members reads and rewrites only their buckets.
+    """
+
+    name = "sharded"
+
+    def __init__(self, path=SHARD_DIR, buckets=SHARD_BUCKETS):
+        self.path = path
+        self.buckets = buckets
+        self._extras = {}
+        self._manifest = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, "manifest.json")
+
+    def bucket_of(self, key):
+        return zlib.crc32(str(key).encode()) % self.buckets
+
+    def _bucket_path(self, section, bucket):
+        return os.path.join(self.path, section, f"{bucket:04x}.json")
+
+    def bucket_ids(self, section):
+        try:
+            names = os.listdir(os.path.join(self.path, section))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5], 16) for name in names if name.endswith(".json"))
+
+    def read_bucket(self, section, bucket):
+        """Return (file text, records) of one bucket; missing buckets are empty"""
+        try:
+            with open(self._bucket_path(section, bucket), "r") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None, {}
+        return text, json.loads(text)
+
+    def paths(self):
+        paths = []
+        for root, _, files in os.walk(self.path):
+            paths.extend(os.path.join(root, name) for name in files)
+        return paths
+
+    def load(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                self._manifest = f.read()
+            manifest = json.loads(self._manifest)
+        except FileNotFoundError:
+            self._manifest, manifest = None, {}
+        self.buckets = manifest.get("buckets", self.buckets)
+        self._extras = manifest.get("extras", {})
+
+        data = {}
+        for name in manifest.get("names", SECTIONS):
+            if name in self._extras:
+                data[name] = self._extras[name]
+            elif name in SECTIONS:
+                data[name] = ShardSource(self, name)
+        return data
+
+    def write(self, changeset):
+        current = set(changeset.names)
+        for name, value in changeset.values.items():
+            if name in SECTIONS and isinstance(value, dict):
+                self._extras.pop(name, None)
+                self._replace_section(name, value)
+            else:
+                self._extras[name] = value
+                if name in SECTIONS:
+                    self._replace_section(name, {})
+        for name in [name for name in self._extras if name not in current]:
+            del self._extras[name]
+        for section in SECTIONS:
+            if section not in current:
+                self._replace_section(section, {})
+
+        for section, (_, records) in changeset.records.items():
+            grouped = {}
+            for key, record in records.items():
+                grouped.setdefault(self.bucket_of(key), {})[key] = record
+            for bucket, changes in grouped.items():
+                text, stored = self.read_bucket(section, bucket)
+                for key, record in changes.items():
+                    if record is MISSING:
+                        stored.pop(key, None)
+                    else:
+                        stored[key] = record
+                self._write_bucket(section, bucket, stored, text)
+
+        manifest = json.dumps({"format": 1, "buckets": self.buckets,
+                               "names": changeset.names, "extras": self._extras}, indent=2)
+        if manifest != self._manifest:
+            os.makedirs(self.path, exist_ok=True)
+            write_atomic(self.manifest_path, manifest)
+            self._manifest = manifest
+
+    def _replace_section(self, section, records):
+        grouped = {}
+        for key, record in records.items():
+            grouped.setdefault(self.bucket_of(key), {})[key] = record
+        for bucket in set(grouped) | set(self.bucket_ids(section)):
+            text, _ = self.read_bucket(section, bucket)
+            self._write_bucket(section, bucket, grouped.get(bucket, {}), text)
+
+    def _write_bucket(self, section, bucket, records, old_text):
+        """Rewrite a bucket file unless its encoding is unchanged"""
+        path = self._bucket_path(section, bucket)
+        if not records:
+            if old_text is not None:
+                os.remove(path)
+            return
+        text = encode_record(records)
+        if text != old_text:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, text)
+
+
+class SnapshotBackend(StorageBackend):
+    """Binary snapshot: length-prefixed top-level values in one file
+
+    Layout: SNAPSHOT_MAGIC, the serializer name, then for every top-level
+    name a name length, the name, a payload length and the payload encoded by
+    the serializer. Only values whose section changed are re-serialized; the
+    others reuse the payload bytes from the previous write.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path=SNAPSHOT_FILE, serializer=None):
+        self.path = path
+        self.serializer = serializer if isinstance(serializer, Serializer) else get_serializer(serializer)
+        # name -> payload bytes, and the decoded copy the writer patches sections in
+        self._blobs = {}
+        self._mirrors = {}
+
+    def paths(self):
+        return [self.path]
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            self._blobs, self._mirrors = {}, {}
+            return {}
+        codec, self._blobs = read_snapshot(blob)
+        if codec != self.serializer.name:
+            # Keep the file's format; converting is what the convert command is for
+            self.serializer = get_serializer(codec)
+            if self.serializer.name != codec:
+                raise RuntimeError(f"{self.path} was written with '{codec}', which is not installed")
+        self._mirrors = {}
+        data = {}
+        for name, payload in self._blobs.items():
+            if name in SECTIONS and self.serializer.is_mapping(payload):
+                # Sections are decoded the first time a command touches them
+                data[name] = PayloadSource(self.serializer, payload)
+            else:
+                data[name] = self.serializer.loads(payload)
+        return data
+
+    def write(self, changeset):
+        for name, value in changeset.values.items():
+            self._blobs[name] = self.serializer.dumps(value)
+            self._mirrors.pop(name, None)
+        for section, (order, records) in changeset.records.items():
+            mirror = self._mirrors.get(section)
+            if mirror is None:
+                payload = self._blobs.get(section)
+                mirror = self.serializer.loads(payload) if payload is not None else {}
+            for key, record in records.items():
+                if record is MISSING:
+                    mirror.pop(key, None)
+                else:
+                    mirror[key] = record
+            mirror = self._mirrors[section] = {key: mirror[key] for key in order if key in mirror}
+            self._blobs[section] = self.serializer.dumps(mirror)
+        for name in [name for name in self._blobs if name not in set(changeset.names)]:
+            del self._blobs[name]
+            self._mirrors.pop(name, None)
+        write_atomic(self.path, pack_snapshot(self.serializer.name, changeset.names, self._blobs), mode="wb")
+
+
+class PayloadSource(RecordSource):
+    """Decodes a whole section payload on its first access"""
+
+    def __init__(self, serializer, payload):
+        self.serializer = serializer
+        self.payload = payload
+
+    def fetch(self, key):
+        return self.fetch_all()
+
+    def fetch_all(self):
+        payload, self.payload = self.payload, None
+        return self.serializer.loads(payload) if payload is not None else {}
+
+
+SNAPSHOT_MAGIC = b"ECONSNAP\x01"
+
+
+def pack_snapshot(codec, names, blobs):
+    """Assemble snapshot bytes from per-name payloads"""
+    parts = [SNAPSHOT_MAGIC, struct.pack(">B", len(codec)), codec.encode("ascii")]
+    for name in names:
+        if name not in blobs:
+            continue
+        encoded = name.encode("utf-8")
+        parts.append(struct.pack(">I", len(encoded)))
+        parts.append(encoded)
+        parts.append(struct.pack(">Q", len(blobs[name])))
+        parts.append(blobs[name])
+    return b"".join(parts)
+
+
+def read_snapshot(blob):
+    """Split snapshot bytes into (serializer name, {name: payload})"""
+    if not blob.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("Not a business snapshot file")
+    view = memoryview(blob)
+    offset = len(SNAPSHOT_MAGIC)
+    (codec_len,) = struct.unpack_from(">B", view, offset)
+    offset += 1
+    codec = bytes(view[offset:offset + codec_len]).decode("ascii")
+    offset += codec_len
+    blobs = {}
+    while offset < len(view):
+        (name_len,) = struct.unpack_from(">I", view, offset)
+        offset += 4
+        name = bytes(view[offset:offset + name_len]).decode("utf-8")
+        offset += name_len
+        (size,) = struct.unpack_from(">Q", view, offset)
+        offset += 8
+        if offset + size > len(view):
+            raise ValueError("Truncated business snapshot file")
+        blobs[name] = bytes(view[offset:offset + size])
+        offset += size
+    return codec, blobs
+
+
+def is_snapshot_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def convert_file(src, dst, serializer=None):
+    """Convert contributions.json to a binary snapshot, or a snapshot back to JSON
+
+    The direction follows the source file. Returns the byte sizes of both files.
+    """
+    if is_snapshot_file(src):
+        data = {name: value.fetch_all() if isinstance(value, RecordSource) else value
+                for name, value in SnapshotBackend(src).load().items()}
+        write_atomic(dst, json.dumps(data, indent=2))
+    else:
+        data = JsonFileBackend(src).load()
+        SnapshotBackend(dst, serializer).write(ChangeSet.capture(data))
+    return os.path.getsize(src), os.path.getsize(dst)
+
+
+def synthetic_document(users):
+    """Economy document shaped like production data, for benchmarks"""
+    rng = random.Random(users)
+    gangs = max(1, users // 50)
+    data = {"business": {}, "gangs": {}, "wars": {}, "gambling": {}, "equipment": {}}
+    for index in range(users):
+        uid = str(100000000000000000 + index)
+        gang_id = f"gang_{index % gangs}" if index % 3 else None
+        data["business"][uid] = {
+            "businesses": {f"biz_{n}": {"level": rng.randint(1, 10), "last_collected": 1700000000.0 + n}
+                           for n in range(index % 4)},
+            "total_income": rng.randint(0, 10 ** 7),
+            "gang_id": gang_id,
+            "gang_role": "member" if gang_id else None,
+            "current_location": "amsterdam",
+            "visited_locations": ["amsterdam"],
+            "achievements": [],
+            "research_projects": {},
+        }
+        data["gambling"][uid] = {"dollars": rng.randint(0, 10 ** 6), "username": f"user{index}"}
+        if index % 5 == 0:
+            data["equipment"][uid] = {"weapons": ["fists"], "clothing": ["street_clothes"],
+                                      "current_weapon": "fists", "current_clothing": "street_clothes",
+                                      "inventory": {}}
+    for index in range(gangs):
+        data["gangs"][f"gang_{index}"] = {"name": f"Gang {index}", "leader": str(100000000000000000 + index),
+                                          "members": [], "gang_xp": rng.randint(0, 10 ** 5),
+                                          "territories": [], "created_at": 1700000000.0}
+    return data
+
+
+def benchmark_formats(user_counts=(10_000, 100_000, 1_000_000), directory=None):
+    """Time full saves and loads of each storage format at several sizes
+
+    Yields one dict per (users, format) with save/load seconds and file size.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for users in user_counts:
+            data = synthetic_document(users)
+            formats = [("json (indent=2)", JsonFileBackend(os.path.join(tmp, "bench.json")))]
+            for name in available_serializers():
+                formats.append((f"snapshot/{name}", SnapshotBackend(os.path.join(tmp, f"bench.{name}.snap"), name)))
+            for label, backend in formats:
+                started = time.perf_counter()
+                backend.write(ChangeSet.capture(data))
+                saved = time.perf_counter()
+                backend.load()
+                loaded = time.perf_counter()
+                yield {"users": users, "format": label, "save_s": saved - started,
+                       "load_s": loaded - saved, "bytes": os.path.getsize(backend.path)}
+            del data
+
+
+BACKENDS = {
+    JsonFileBackend.name: JsonFileBackend,
+    SqliteBackend.name: SqliteBackend,
+    JournalBackend.name: JournalBackend,
+    ShardedBackend.name: ShardedBackend,
+    SnapshotBackend.name: SnapshotBackend,
+}
+
+
+def create_backend(name=None):
+    """Build the storage backend selected at startup (BUSINESS_STORAGE)"""
+    name = (name or STORAGE_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown business storage backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def import_json(backend, json_path=DATA_FILE):
+    """One-shot import of an existing contributions.json into another backend"""
+    data = JsonFileBackend(json_path).load()
+    try:
+        backend.load()
+        backend.write(ChangeSet.capture(data))
+    finally:
+        backend.close()
+    return {section: len(data.get(section, {})) for section in SECTIONS}
+
+
+def import_json_to_sqlite(json_path=DATA_FILE, db_path=SQLITE_FILE):
+    """One-shot import of an existing contributions.json into the SQLite backend"""
+    return import_json(SqliteBackend(db_path), json_path)
+
+
+def import_json_to_shards(json_path=DATA_FILE, shard_dir=SHARD_DIR):
+    """One-shot import of an existing contributions.json into the sharded layout"""
+    return import_json(ShardedBackend(shard_dir), json_path)
+
+
+def compact_defaults(backend=None):
+    """Offline compaction: delete stored records that equal their section's defaults
+
+    Those records read back identically as virtual defaults. Run it while the
+    bot is stopped. Returns ({section: records removed}, bytes before, bytes after).
+    """
+    backend = backend or create_backend()
+    before = backend.size()
+    removed = {}
+    try:
+        # Sections the file lacked are created as changes too; the backend needs them all
+        doc = TrackedDocument(backend.load())
+        for name in DEFAULT_RECORDS:
+            section = dict.get(doc, name)
+            if not isinstance(section, TrackedSection):
+                continue
+            section.load_all()
+            stale = [key for key, record in dict.items(section) if is_default_record(name, record)]
+            for key in stale:
+                del section[key]
+            removed[name] = len(stale)
+        changes = doc.take_changes()
+        if changes:
+            backend.write(ChangeSet.capture(doc, changes))
+            backend.reclaim()
+    finally:
+        backend.close()
+    return removed, before, backend.size()
+
+
+class WarArchive:
+    """Append-only, compressed store of finished wars with an index by gang id
+
+    The archive file is a sequence of frames: a 4-byte length and a
+    zlib-compressed JSON {"id", "war"}. The index file next to it holds one
+    JSON line per frame with its offset and both gang ids, and is loaded
+    into memory on first use. A frame is written and synced before its index
+    line, so after a crash frames missing from the index are re-indexed and
+    a torn tail is cut off.
+    """
+
+    FRAME = struct.Struct(">I")
+
+    def __init__(self, path=WAR_ARCHIVE_FILE):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self._lock = threading.Lock()
+        self._entries = None
+        self._by_gang = {}
+
+    def _add(self, entry):
+        # A later frame for the same war supersedes the earlier one
+        old = self._entries.get(entry["id"])
+        if old is not None:
+            for gang_id in old["gangs"]:
+                self._by_gang[gang_id].remove(old)
+        self._entries[entry["id"]] = entry
+        for gang_id in entry["gangs"]:
+            self._by_gang.setdefault(gang_id, []).append(entry)
+
+    @staticmethod
+    def _entry(war_id, war, offset, length):
+        return {
+            "id": war_id,
+            "gangs": [gang_id for gang_id in (war.get("attacker"), war.get("defender")) if gang_id],
+            "offset": offset,
+            "length": length,
+            "winner": war.get("winner"),
+            "started_at": war.get("started_at"),
+        }
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self._by_gang = {}
+        indexed_end = 0
+        good = 0
+        try:
+            with open(self.index_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self._add(entry)
+                    indexed_end = max(indexed_end, entry["offset"] + entry["length"])
+                    good += len(line)
+            # Drop a torn index line
+            if os.path.getsize(self.index_path) > good:
+                with open(self.index_path, "r+b") as f:
+                    f.truncate(good)
+        except FileNotFoundError:
+            pass
+        self._recover(indexed_end)
+
+    def _recover(self, offset):
+        """Index frames written after the last index line; cut off a torn frame"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while offset < size:
+                header = f.read(self.FRAME.size)
+                if len(header) < self.FRAME.size:
+                    break
+                (length,) = self.FRAME.unpack(header)
+                payload = f.read(length)
+                try:
+                    record = json.loads(zlib.decompress(payload))
+                except (zlib.error, ValueError):
+                    break
+                entry = self._entry(record["id"], record["war"], offset + self.FRAME.size, length)
+                self._write_index(entry)
+                self._add(entry)
+                offset += self.FRAME.size + length
+        if offset < size:
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def _write_index(self, entry):
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(encode_record(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __contains__(self, war_id):
+        with self._lock:
+            self._load()
+            return war_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._entries)
+
+    def append(self, war_id, war):
+        """Archive one war; returns False if it is archived with the same contents already
+
+        A war archived before with other contents is appended again, and the
+        new frame replaces the old one.
+        """
+        payload = zlib.compress(encode_record({"id": war_id, "war": war}).encode("utf-8"), 9)
+        with self._lock:
+            self._load()
+            if war_id in self._entries:
+                with open(self.path, "rb") as f:
+                    if self._read(f, self._entries[war_id]) == war:
+                        return False
+            with open(self.path, "ab") as f:
+                offset = f.tell() + self.FRAME.size
+                f.write(self.FRAME.pack(len(payload)) + payload)
+                f.flush()
+                os.fsync(f.fileno())
+            entry = self._entry(war_id, war, offset, len(payload))
+            self._write_index(entry)
+            self._add(entry)
+            return True
+
+    def _read(self, f, entry):
+        f.seek(entry["offset"])
+        return json.loads(zlib.decompress(f.read(entry["length"])))["war"]
+
+    def get(self, war_id):
+        """The archived war record, or None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(war_id)
+        if entry is None:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read(f, entry)
+
+    def history(self, gang_id, limit=None):
+        """Archived wars of a gang as (war_id, war) pairs, most recently archived first"""
+        with self._lock:
+            self._load()
+            entries = list(reversed(self._by_gang.get(gang_id, ())))
+        if limit is not None:
+            entries = entries[:limit]
+        if not entries:
+            return []
+        with open(self.path, "rb") as f:
+            return [(entry["id"], self._read(f, entry)) for entry in entries]
+
+    def summary(self, gang_id):
+        """Index entries of a gang's archived wars without decompressing them"""
+        with self._lock:
+            self._load()
+            return [dict(entry) for entry in self._by_gang.get(gang_id, ())]
+
+
+class CommitStats:
+    """Latency and batching counters for the writer's group commits"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.commits = 0
+            self.failures = 0
+            self.saves = 0
+            self.max_batch = 0
+            self.last_latency = 0.0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+            self.last_wait = 0.0
+            self.total_wait = 0.0
+
+    def record(self, batch, wait, latency, ok=True):
+        """Record one commit: saves merged into it, time queued, time writing"""
+        with self._lock:
+            if not ok:
+                self.failures += 1
+                return
+            self.commits += 1
+            self.saves += batch
+            self.max_batch = max(self.max_batch, batch)
+            self.last_latency = latency
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.last_wait = wait
+            self.total_wait += wait
+
+    def snapshot(self):
+        """Plain dict of the counters; latencies are in milliseconds"""
+        with self._lock:
+            commits = self.commits or 1
+            return {
+                "commits": self.commits,
+                "failures": self.failures,
+                "saves": self.saves,
+                "avg_batch": round(self.saves / commits, 2),
+                "max_batch": self.max_batch,
+                "last_latency_ms": round(self.last_latency * 1000, 3),
+                "avg_latency_ms": round(self.total_latency / commits * 1000, 3),
+                "max_latency_ms": round(self.max_latency * 1000, 3),
+                "last_wait_ms": round(self.last_wait * 1000, 3),
+                "avg_wait_ms": round(self.total_wait / commits * 1000, 3),
+            }
+
+
+class BackgroundWriter:
+    """Dedicated thread that encodes and writes change sets for a backend
+
+    Writes are group commits: once a change set is queued the writer waits
+    for the commit window, merging every change set submitted meanwhile, and
+    then persists the batch with a single write and fsync.
+    """
+
+    def __init__(self, backend, commit_window=COMMIT_WINDOW, on_error=None):
+        self.backend = backend
+        self.commit_window = commit_window
+        # Called with the exception of every failed write
+        self.on_error = on_error
+        self.stats = CommitStats()
+        self._cond = threading.Condition()
+        self._queued = None
+        self._carry = None
+        self._last = None
+        self._hurry = False
+        self._stopping = False
+        self._thread = None
+
+    def submit(self, changeset, hurry=False):
+        """Queue a change set; the returned future resolves once it is on disk
+
+        With hurry the queued batch is written without waiting out the
+        commit window, for callers that block until it is durable.
+        """
+        with self._cond:
+            self._hurry = self._hurry or hurry
+            if self._carry is not None:
+                # Retry a write that failed earlier together with the new changes
+                self._carry.merge(changeset)
+                changeset, self._carry = self._carry, None
+            if self._queued is None:
+                # [change set, future, saves merged, time first queued]
+                self._queued = [changeset, concurrent.futures.Future(), 1, time.monotonic()]
+            else:
+                self._queued[0].merge(changeset)
+                self._queued[2] += 1
+            future = self._last = self._queued[1]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="business-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def last_future(self):
+        """Future of the most recently submitted write (already done when idle)"""
+        with self._cond:
+            if self._last is None:
+                future = concurrent.futures.Future()
+                future.set_result(True)
+                return future
+            return self._last
+
+    @property
+    def idle(self):
+        """True when nothing is queued, being written or waiting for a retry"""
+        with self._cond:
+            return (self._queued is None and self._carry is None
+                    and (self._last is None or self._last.done()))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._queued is None and not self._stopping:
+                    self._cond.wait()
+                if self._queued is None:
+                    return
+                # Hold the batch open for the commit window unless shutting down
+                deadline = self._queued[3] + self.commit_window
+                while not self._stopping and not self._hurry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                changeset, future, batch, queued_at = self._queued
+                self._queued = None
+                self._hurry = False
+
+            started = time.monotonic()
+            try:
+                self.backend.write(changeset)
+            except Exception as e:
+                logger.exception("Business data write failed; retrying with the next write")
+                self.stats.record(batch, started - queued_at, time.monotonic() - started, ok=False)
+                if self.on_error is not None:
+                    self.on_error(e)
+                with self._cond:
+                    if self._queued is not None:
+                        changeset.merge(self._queued[0])
+                        self._queued[0] = changeset
+                        self._queued[2] += batch
+                    else:
+                        self._carry = changeset
+                future.set_exception(e)
+            else:
+                self.stats.record(batch, started - queued_at, time.monotonic() - started)
+                future.set_result(True)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class Transaction:
+    """Pre-images of the entries touched inside one StateStore.transaction()
+
+    The store publishes earlier mutations when the transaction starts, so
+    every entry the transaction touches reports its first touch here. Both
+    the live object and a copy of its contents are kept: rollback puts the
+    same objects back, so references handlers hold stay valid.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.depth = 0
+        # (name, key or ALL) -> (live object or MISSING, copy of its contents)
+        self.before = {}
+
+    @staticmethod
+    def _keep(value):
+        if value is MISSING:
+            return MISSING, MISSING
+        return value, clone(plain(value))
+
+    def remember(self, name, key):
+        if (name, key) in self.before or (name, ALL) in self.before:
+            return
+        doc = self.doc
+        if name not in SECTIONS or not isinstance(dict.get(doc, name), TrackedSection):
+            self.before[(name, ALL)] = self._keep(dict.get(doc, name, MISSING))
+            return
+        section = dict.get(doc, name)
+        if key is ALL:
+            section.load_all()
+            records = {key: self._keep(record) for key, record in dict.items(section)}
+            self.before[(name, ALL)] = section, records
+        else:
+            self.before[(name, key)] = self._keep(dict.get(section, key, MISSING))
+
+    @staticmethod
+    def _restore(container, key, original, contents):
+        if original is MISSING:
+            dict.pop(container, key, None)
+            return
+        if isinstance(original, dict):
+            sync_in_place(original, contents)
+        elif isinstance(original, list):
+            original[:] = contents
+        dict.__setitem__(container, key, original)
+
+    def rollback(self):
+        """Put every entry touched by the transaction back to its pre-image"""
+        doc = self.doc
+        # Newest first, so an entry ends at its earliest pre-image
+        for (name, key), (original, contents) in reversed(self.before.items()):
+            if key is not ALL:
+                section = dict.get(doc, name)
+                if isinstance(section, TrackedSection):
+                    self._restore(section, key, original, contents)
+            elif isinstance(original, TrackedSection):
+                # contents holds (record, copy) pairs of the whole section
+                dict.clear(original)
+                for record_key, (record, copy) in contents.items():
+                    self._restore(original, record_key, record, copy)
+                dict.__setitem__(doc, name, original)
+            else:
+                self._restore(doc, name, original, contents)
+
+
+class GangNameTaken(ValueError):
+    """Another gang already uses this name (compared by normalize_gang_name)"""
+
+
+def normalize_gang_name(name):
+    """Form gang names are compared in: case-insensitive, surrounding spaces ignored"""
+    return (name or "").strip().casefold()
+
+
+# Substring matches ranked per gang name search, as a multiple of the result limit
+SEARCH_SCAN_FACTOR = 8
+
+
+def name_trigrams(key):
+    """Distinct three-character substrings of a normalized name"""
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class GangNameIndex:
+    """Normalized gang name -> gang_id over the resident document's gangs section
+
+    Built from the section on first use and kept current by claim(),
+    release() and reset(). A hit is checked against the gang it points to,
+    so an entry left behind by a rolled back create is treated as free
+    instead of resolving to the wrong gang. For search() the names are also
+    kept sorted (prefix matches) and in trigram postings (substring matches).
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._ids = None
+        self._sorted = []
+        # trigram -> normalized names containing it
+        self._trigrams = {}
+
+    def _gangs(self):
+        gangs = dict.get(self.doc, "gangs")
+        return gangs if isinstance(gangs, dict) else {}
+
+    def _build(self):
+        if self._ids is not None:
+            return
+        gangs = self._gangs()
+        if isinstance(gangs, TrackedSection):
+            gangs.load_all()
+        self._ids = {}
+        for gang_id, gang in dict.items(gangs):
+            if isinstance(gang, dict) and gang.get("name"):
+                self._ids.setdefault(normalize_gang_name(gang["name"]), gang_id)
+        self._sorted = sorted(self._ids)
+        self._trigrams = {}
+        for key in self._ids:
+            for trigram in name_trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+
+    def _add(self, key, gang_id):
+        if key not in self._ids:
+            bisect.insort(self._sorted, key)
+            for trigram in name_trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+        self._ids[key] = gang_id
+
+    def _drop(self, key):
+        if self._ids.pop(key, None) is None:
+            return
+        del self._sorted[bisect.bisect_left(self._sorted, key)]
+        for trigram in name_trigrams(key):
+            postings = self._trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._trigrams[trigram]
+
+    def _gang(self, gang_id):
+        gangs = self._gangs()
+        # Reads through the raw dict so a lookup never marks the gang as modified
+        return dict.get(gangs, gang_id) if gang_id in gangs else None
+
+    def _current(self, key):
+        gang_id = self._ids.get(key)
+        if gang_id is None:
+            return None
+        gang = self._gang(gang_id)
+        if not isinstance(gang, dict) or normalize_gang_name(gang.get("name")) != key:
+            self._drop(key)
+            return None
+        return gang_id
+
+    def lookup(self, name):
+        """gang_id of the gang called name, or None"""
+        self._build()
+        return self._current(normalize_gang_name(name))
+
+    def claim(self, name, gang_id):
+        """Register name for gang_id; raises GangNameTaken if another gang holds it"""
+        self._build()
+        key = normalize_gang_name(name)
+        holder = self._current(key)
+        if holder is not None and holder != gang_id:
+            raise GangNameTaken(name)
+        self._add(key, gang_id)
+
+    def release(self, name, gang_id=None):
+        """Forget name (only if it still points to gang_id, when given)"""
+        if self._ids is None:
+            return
+        key = normalize_gang_name(name)
+        if gang_id is None or self._ids.get(key) == gang_id:
+            self._drop(key)
+
+    def reset(self):
+        """Rebuild from the gangs section on next use (after wholesale changes)"""
+        self._ids = None
+        self._sorted = []
+        self._trigrams = {}
+
+    def names(self):
+        """Normalized names of all indexed gangs"""
+        self._build()
+        return list(self._ids)
+
+    def _prefixed(self, query):
+        position = bisect.bisect_left(self._sorted, query)
+        while position < len(self._sorted) and self._sorted[position].startswith(query):
+            yield self._sorted[position]
+            position += 1
+
+    def search(self, text, limit=25):
+        """[(gang_id, name)] of up to limit gangs whose names match text
+
+        Names starting with text come first in alphabetical order, then names
+        containing it (three characters or more), earliest and shortest match
+        first. Only the first limit * SEARCH_SCAN_FACTOR substring matches are
+        ranked, so a very common fragment costs the same as a rare one.
+        An empty text lists the first names alphabetically.
+        """
+        self._build()
+        query = normalize_gang_name(text)
+        keys = []
+        for key in self._prefixed(query):
+            if len(keys) >= limit:
+                break
+            keys.append(key)
+
+        if len(keys) < limit and len(query) >= 3:
+            postings = sorted((self._trigrams.get(trigram, ()) for trigram in name_trigrams(query)), key=len)
+            if postings and postings[0]:
+                seen = set(keys)
+                candidates = (key for key in postings[0]
+                              if key not in seen and query in key and all(key in other for other in postings[1:]))
+                candidates = itertools.islice(candidates, limit * SEARCH_SCAN_FACTOR)
+                keys += heapq.nsmallest(limit - len(keys), candidates,
+                                        key=lambda key: (key.index(query), len(key), key))
+
+        matches = []
+        for key in keys:
+            gang_id = self._current(key)
+            if gang_id is not None:
+                matches.append((gang_id, self._gang(gang_id)["name"]))
+        return matches
+
+
+def peek(container, key):
+    """container[key] or None, looked up without marking it modified (works on snapshots too)"""
+    if container is None:
+        return None
+    if isinstance(container, dict):
+        return dict.get(container, key) if key in container else None
+    return container.get(key)
+
+
+class MembershipIndex:
+    """Gang membership in both directions, with the gangs' member lists as the truth
+
+    gangs[gid]["members"] answers "members of gang"; a user -> gang map built
+    from those lists on first use answers "gang of user". Answers are checked
+    against the member list of the document asked about, so a stale map
+    entry never resolves to the wrong gang. Every change here (join,
+    set_role, leave, disband, reset) also writes the gang_id/gang_role copies
+    in the affected users' business records, so reading a record never has
+    to; repair() fixes copies left out of line by older versions.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._gang_of = None
+
+    def _build(self):
+        if self._gang_of is not None:
+            return
+        gangs = dict.get(self.doc, "gangs")
+        if isinstance(gangs, TrackedSection):
+            gangs.load_all()
+        self._gang_of = {}
+        for gang_id, gang in dict.items(gangs if isinstance(gangs, dict) else {}):
+            for uid in (gang.get("members") or {}) if isinstance(gang, dict) else ():
+                self._gang_of.setdefault(uid, gang_id)
+
+    def _role_in(self, data, gang_id, uid):
+        gang = peek(data.get("gangs"), gang_id)
+        members = gang.get("members") if gang is not None else None
+        return members.get(uid) if members else None
+
+    def lookup(self, uid, data=None):
+        """(gang_id, role) of a user in data (the resident document by default), or (None, None)"""
+        data = self.doc if data is None else data
+        self._build()
+        gang_id = self._gang_of.get(uid)
+        if gang_id is not None:
+            role = self._role_in(data, gang_id, uid)
+            if role:
+                return gang_id, role
+        # The business record names a gang too; it counts only if that gang lists the user
+        record = peek(data.get("business"), uid)
+        hint = record.get("gang_id") if record is not None else None
+        if hint is not None and hint != gang_id:
+            role = self._role_in(data, hint, uid)
+            if role:
+                self._gang_of[uid] = hint
+                return hint, role
+        return None, None
+
+    def members(self, gang_id, data=None):
+        """{uid: role} of a gang (empty if it does not exist)"""
+        gang = peek((self.doc if data is None else data).get("gangs"), gang_id)
+        return (gang.get("members") if gang is not None else None) or {}
+
+    def join(self, data, gang_id, uid, role="member"):
+        """Add a user to a gang in data (the gang must exist)"""
+        data["gangs"][gang_id].setdefault("members", {})[uid] = role
+        record = record_or_default(data, "business", uid)
+        record["gang_id"] = gang_id
+        record["gang_role"] = role
+        self._build()
+        self._gang_of[uid] = gang_id
+
+    def set_role(self, data, uid, role):
+        """Change a member's role; returns the gang_id, or None if the user is in no gang"""
+        gang_id, _ = self.lookup(uid, data)
+        if gang_id is None:
+            return None
+        data["gangs"][gang_id]["members"][uid] = role
+        record_or_default(data, "business", uid)["gang_role"] = role
+        return gang_id
+
+    def leave(self, data, uid):
+        """Remove a user from their gang; returns the gang_id they left, or None"""
+        gang_id, _ = self.lookup(uid, data)
+        if gang_id is not None:
+            data["gangs"][gang_id].get("members", {}).pop(uid, None)
+        self.reconcile(uid, record_or_default(data, "business", uid), data)
+        self._gang_of.pop(uid, None)
+        return gang_id
+
+    def disband(self, data, gang_id):
+        """Delete a gang and release its members"""
+        gang = data["gangs"].pop(gang_id, None)
+        if isinstance(gang, dict):
+            self._release(data, gang.get("members") or {})
+        return gang
+
+    def reset(self, data):
+        """Delete every gang at once and release all their members"""
+        gangs = data["gangs"]
+        members = [uid for gang in gangs.values() if isinstance(gang, dict) for uid in gang.get("members") or {}]
+        data["gangs"] = {}
+        self._gang_of = {}
+        self._release(data, members)
+
+    def _release(self, data, uids):
+        self._build()
+        for uid in uids:
+            self._gang_of.pop(uid, None)
+            if uid in data.get("business", {}):
+                self.reconcile(uid, data["business"][uid], data)
+
+    def repair(self, data):
+        """Reconcile every stored business record; returns the number changed"""
+        business = data.get("business")
+        if isinstance(business, TrackedSection):
+            business.load_all()
+        changed = 0
+        for uid, record in list(dict.items(business if isinstance(business, dict) else {})):
+            gang_id, role = self.lookup(uid, data)
+            if record.get("gang_id") != gang_id or record.get("gang_role") != role:
+                # Fetched again through the section so the change is recorded
+                self.reconcile(uid, business[uid], data)
+                changed += 1
+        return changed
+
+    def reconcile(self, uid, record, data=None):
+        """Bring the gang_id/gang_role copy in a business record in line with the member lists"""
+        gang_id, role = self.lookup(uid, data)
+        if record.get("gang_id") != gang_id or record.get("gang_role") != role:
+            record["gang_id"] = gang_id
+            record["gang_role"] = role
+        return record
+
+    def view(self, uid, record, snapshot):
+        """Read-only record with its gang fields as the snapshot's member lists say"""
+        gang_id, role = self.lookup(uid, snapshot)
+        if record.get("gang_id") == gang_id and record.get("gang_role") == role:
+            return record
+        return MappingProxyType({**record, "gang_id": gang_id, "gang_role": role})
+
+
+class WarIndex:
+    """Active wars of each gang, and the members each side has left to fight
+
+    Derived from committed state only: built from the latest snapshot on
+    first use and then kept current from the keys each published commit
+    changed, so nothing is stored in the gang or war records and a rolled
+    back or retried command cannot leave it wrong. Answers are checked
+    against the document asked about, which may hold changes not committed
+    yet; a war that ended there, or a member who left or used up their
+    battles, is left out.
+    """
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        # gang_id -> {enemy_id: war_id}, and (war_id, side) -> {uid: None} of members with battles left
+        self._fronts = None
+        self._rosters = {}
+
+    def _build(self):
+        if self._fronts is not None:
+            return
+        self._fronts = {}
+        self._rosters = {}
+        for war_id, war in (self.publisher.current.get("wars") or {}).items():
+            self._track(war_id, war)
+
+    def _track(self, war_id, war):
+        attacker, defender = war.get("attacker"), war.get("defender")
+        if war.get("status") == "active":
+            self._fronts.setdefault(attacker, {})[defender] = war_id
+            self._fronts.setdefault(defender, {})[attacker] = war_id
+            return
+        for gang_id, enemy_id in ((attacker, defender), (defender, attacker)):
+            fronts = self._fronts.get(gang_id)
+            if fronts is not None and fronts.get(enemy_id) == war_id:
+                del fronts[enemy_id]
+        self._rosters.pop((war_id, "attacker"), None)
+        self._rosters.pop((war_id, "defender"), None)
+
+    @staticmethod
+    def _fighting(war, side, uid):
+        battles = war.get(f"{side}_members") or {}
+        return battles.get(uid, war.get("max_battles_per_user", 2)) > 0
+
+    def update(self, changes, snapshot):
+        """Follow the wars and gangs a commit changed (publisher listener)"""
+        if self._fronts is None:
+            return
+        if changes.get("wars", ()) is ALL or changes.get("gangs", ()) is ALL:
+            self._fronts = None
+            return
+        wars = snapshot.get("wars") or {}
+        for war_id in changes.get("wars", ()):
+            war = wars.get(war_id)
+            if war is None:
+                continue
+            self._track(war_id, war)
+            for side in ("attacker", "defender"):
+                roster = self._rosters.get((war_id, side))
+                if roster is not None:
+                    self._rosters[(war_id, side)] = {uid: None for uid in roster if self._fighting(war, side, uid)}
+        for gang_id in changes.get("gangs", ()):
+            # Members may have joined; the gang's rosters are rebuilt when next asked for
+            for war_id in self._fronts.get(gang_id, {}).values():
+                self._rosters.pop((war_id, "attacker"), None)
+                self._rosters.pop((war_id, "defender"), None)
+
+    def active(self, gang_id, data):
+        """{enemy_gang_id: war_id} of a gang's active wars in data"""
+        self._build()
+        wars = data.get("wars")
+        active = {}
+        for enemy_id, war_id in self._fronts.get(gang_id, {}).items():
+            war = peek(wars, war_id)
+            if war is not None and war.get("status") == "active":
+                active[enemy_id] = war_id
+        return active
+
+    def _candidates(self, war_id, war, side):
+        key = (war_id, side)
+        roster = self._rosters.get(key)
+        if roster is None:
+            current = self.publisher.current
+            committed = peek(current.get("wars"), war_id)
+            # A war not committed yet is read as the caller has it, and not kept
+            source = committed if committed is not None else war
+            gang = peek(current.get("gangs"), source[side])
+            members = (gang.get("members") if gang is not None else None) or {}
+            roster = {uid: None for uid in members if self._fighting(source, side, uid)}
+            if committed is not None:
+                self._rosters[key] = roster
+        return roster
+
+    def _remaining(self, war_id, war, side, data):
+        gang = peek(data.get("gangs"), war[side])
+        members = (gang.get("members") if gang is not None else None) or {}
+        for uid in self._candidates(war_id, war, side):
+            if uid in members and self._fighting(war, side, uid):
+                yield uid
+
+    def roster(self, war_id, war, side, data):
+        """Members of one side (attacker/defender) still in its gang with battles left, as data has them"""
+        self._build()
+        return list(self._remaining(war_id, war, side, data))
+
+    def has_fighters(self, war_id, war, side, data):
+        """Whether a side still has a member with battles left; stops at the first one"""
+        self._build()
+        return next(self._remaining(war_id, war, side, data), None) is not None
+
+
+class RankedIndex:
+    """Keys of one section kept in descending order of a score
+
+    Built from a snapshot the first time a page is asked for, then kept
+    current from the keys each published commit changed, so a page costs a
+    bisect plus the page itself rather than a sort of the whole section.
+    Ties are ordered by key.
+    """
+
+    def __init__(self, section, score):
+        self.section = section
+        self.score = score
+        # Sorted (-score, key) entries, and each key's current entry
+        self._order = None
+        self._entries = {}
+
+    def reset(self):
+        self._order = None
+        self._entries = {}
+
+    def _build(self, snapshot):
+        records = snapshot.get(self.section) or {}
+        self._entries = {key: (-self.score(record), key) for key, record in records.items()}
+        self._order = sorted(self._entries.values())
+
+    def update(self, changes, snapshot):
+        """Re-rank the keys a commit changed (publisher listener)"""
+        if self._order is None or self.section not in changes:
+            return
+        keys = changes[self.section]
+        if keys is ALL:
+            self._build(snapshot)
+            return
+        records = snapshot.get(self.section) or {}
+        for key in keys:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                del self._order[bisect.bisect_left(self._order, old)]
+            record = records.get(key)
+            if record is not None:
+                entry = (-self.score(record), key)
+                self._entries[key] = entry
+                bisect.insort(self._order, entry)
+
+    def page(self, snapshot, number, size):
+        """([(rank, key, score)], total) for page number (0-based) of the ranking"""
+        if self._order is None:
+            self._build(snapshot)
+        start = number * size
+        rows = [(start + offset + 1, key, -score)
+                for offset, (score, key) in enumerate(self._order[start:start + size])]
+        return rows, len(self._order)
+
+
+class KeyLocks:
+    """Async locks keyed by entity, e.g. ("gang", gang_id), created on demand
+
+    hold() sorts its keys before acquiring them, so two handlers that lock
+    the same gangs and users in a different order cannot deadlock, and
+    handlers touching unrelated gangs never share a lock. A lock nobody holds
+    or waits for is dropped again. Wait times are kept per key so hot gangs
+    show up in stats().
+    """
+
+    def __init__(self):
+        # key -> [asyncio.Lock, holders and waiters]
+        self._locks = {}
+        # key -> [acquisitions, contended acquisitions, total wait, max wait]
+        self._waits = {}
+        self._held = contextvars.ContextVar("business_held_keys", default=frozenset())
+
+    @staticmethod
+    def keys(gangs=(), users=(), wars=()):
+        """Lock keys for the given gang ids, user ids and war ids"""
+        keys = set()
+        for kind, idents in (("gang", gangs), ("user", users), ("war", wars)):
+            keys.update((kind, str(ident)) for ident in idents if ident)
+        return keys
+
+    @contextlib.asynccontextmanager
+    async def hold(self, keys):
+        """Hold the locks of all keys for the duration of the block
+
+        Keys the current task already holds are skipped. Taking further keys
+        inside a hold() block is only allowed if they sort after every key
+        already held; otherwise pass all keys to a single hold() call.
+        """
+        held = self._held.get()
+        wanted = sorted(set(keys) - held)
+        if held and wanted and wanted[0] < max(held):
+            raise RuntimeError(f"Lock {wanted[0]} requested out of order while holding {max(held)}")
+        acquired = []
+        token = None
+        try:
+            for key in wanted:
+                entry = self._locks.get(key)
+                if entry is None:
+                    entry = self._locks[key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                contended = entry[0].locked()
+                started = time.perf_counter()
+                try:
+                    await entry[0].acquire()
+                except BaseException:
+                    self._drop(key, entry)
+                    raise
+                self._record(key, time.perf_counter() - started, contended)
+                acquired.append(key)
+            token = self._held.set(held | frozenset(acquired))
+            yield
+        finally:
+            if token is not None:
+                self._held.reset(token)
+            for key in reversed(acquired):
+                entry = self._locks[key]
+                entry[0].release()
+                self._drop(key, entry)
+
+    def _drop(self, key, entry):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def _record(self, key, wait, contended):
+        counters = self._waits.get(key)
+        if counters is None:
+            counters = self._waits[key] = [0, 0, 0.0, 0.0]
+        counters[0] += 1
+        counters[1] += contended
+        counters[2] += wait
+        counters[3] = max(counters[3], wait)
+
+    def stats(self, top=None):
+        """Per-key wait counters, longest total wait first; times are in milliseconds"""
+        ranked = sorted(self._waits.items(), key=lambda item: item[1][2], reverse=True)
+        if top is not None:
+            ranked = ranked[:top]
+        return {
+            f"{kind}:{ident}": {
+                "acquired": acquired,
+                "contended": contended,
+                "total_wait_ms": round(total * 1000, 3),
+                "avg_wait_ms": round(total / acquired * 1000, 3),
+                "max_wait_ms": round(longest * 1000, 3),
+            }
+            for (kind, ident), (acquired, contended, total, longest) in ranked
+        }
+
+    def reset(self):
+        self._waits.clear()
+
+
+class StateStore:
+    """Process-resident economy document with write-behind persistence"""
+
+    def __init__(self, backend=None, flush_interval=FLUSH_INTERVAL, flush_every=FLUSH_EVERY, archive=None,
+                 write_through=WRITE_THROUGH):
+        self._backend = backend
+        self._archive = archive
+        self._writer = None
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        # Every save() waits until its changes are on disk
+        self.write_through = write_through
+        self._data = None
+        self._publisher = None
+        self._gang_names = None
+        self._membership = None
+        self._wars = None
+        self._rankings = {}
+        # Changes committed by save() but not yet handed to the writer
+        self._unflushed = {}
+        self._full_write = False
+        self._pending = 0
+        self._timer = None
+        self._lock = threading.RLock()
+        self.last_flush = time.monotonic()
+        # Bumped on every committed mutation so holders can tell their view is stale
+        self.version = 0
+        self.conflicts = 0
+        self._transaction = None
+        self.rollbacks = 0
+        # Failed background writes and backend maintenance, and the latest such error
+        self.failures = 0
+        self.last_error = None
+        self._error_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend()
+        if self._backend.on_error is None:
+            self._backend.on_error = self._record_error
+        return self._backend
+
+    def _record_error(self, error):
+        # Runs on the writer thread while callers may hold _lock waiting for that write
+        with self._error_lock:
+            self.failures += 1
+            self.last_error = error
+
+    @property
+    def archive(self):
+        if self._archive is None:
+            self._archive = WarArchive()
+        return self._archive
+
+    @property
+    def writer(self):
+        if self._writer is None:
+            self._writer = BackgroundWriter(self.backend, on_error=self._record_error)
+        return self._writer
+
+    def load(self):
+        """Return the shared resident document, reading it from storage only once
+
+        Business, gang, war, gambling and equipment code paths all receive this
+        same object, so one interaction never parses the file and all commits
+        go through one writer.
+        """
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._adopt(TrackedDocument(self.backend.load()))
+                    self._full_write = False
+        elif self._transaction is None:
+            self._pull_external()
+        return self._data
+
+    def _pull_external(self):
+        """Merge changes other modules saved to the file into the resident document
+
+        Records we have not changed simply take the stored value; records
+        changed on both sides are merged with merge3() and flushed again.
+        While a write is queued the pull waits: that write merges the foreign
+        changes against the state it was captured from and reports them then.
+        """
+        with self._lock:
+            if self._transaction is not None:
+                return
+            if self._writer is not None and not self._writer.idle:
+                return
+            changes = self.backend.pull()
+            if not changes:
+                return
+            data = self._data
+            diverged = gangs_changed = False
+            for name, key, base, theirs in changes:
+                if key is ALL:
+                    ours = dict.get(data, name, MISSING)
+                    merged = merge3(base, ours, theirs)
+                    if merged == ours:
+                        continue
+                    if merged is MISSING:
+                        del data[name]
+                    else:
+                        data[name] = merged
+                elif isinstance(dict.get(data, name), TrackedSection):
+                    section = dict.get(data, name)
+                    ours = dict.get(section, key, MISSING)
+                    merged = merge3(base, ours, theirs)
+                    if merged == ours:
+                        continue
+                    if merged is MISSING:
+                        section.pop(key, None)
+                    elif isinstance(ours, dict) and isinstance(merged, dict):
+                        sync_in_place(section.get(key), merged)
+                    else:
+                        section[key] = merged
+                else:
+                    # Our copy dropped or replaced the whole entry; that change stands
+                    continue
+                diverged = diverged or merged != theirs
+                gangs_changed = gangs_changed or name == "gangs"
+            if gangs_changed:
+                self._gang_names.reset()
+                self._membership = MembershipIndex(data)
+            self._publish_pending()
+        if diverged:
+            # Both sides changed the same records: persist the merge
+            self.save()
+
+    def _adopt(self, doc):
+        self._data = doc
+        self._unflushed = {}
+        self._publisher = SnapshotPublisher(doc, self.version)
+        self._gang_names = GangNameIndex(doc)
+        self._membership = MembershipIndex(doc)
+        self._wars = WarIndex(self._publisher)
+        for index in self._rankings.values():
+            index.reset()
+        self._publisher.listeners = [self._wars.update, *(index.update for index in self._rankings.values())]
+
+    def _publish_pending(self):
+        """Publish mutations made since the last save() so stamps and snapshots see them"""
+        late = self._data.take_changes()
+        if late:
+            self._publisher.publish(late, self.version)
+            TrackedDocument.merge_changes(self._unflushed, late)
+
+    def version_of(self, name, key=ALL):
+        """Version stamp of one record (or of a whole section) for optimistic commits"""
+        self.load()
+        with self._lock:
+            self._publish_pending()
+            return self._publisher.version_of(name, key)
+
+    async def compare_and_swap(self, mutate, retries=CAS_RETRIES):
+        """Apply mutate(data) optimistically and commit it if nothing it read changed
+
+        mutate receives an OptimisticDocument and may be a coroutine function.
+        It must read everything it relies on from that document, because on a
+        conflict the working copy is thrown away and mutate runs again on fresh
+        data. Returns mutate's result; raises CommitConflict after retries.
+        """
+        for _ in range(retries + 1):
+            data = OptimisticDocument(self)
+            result = mutate(data)
+            if inspect.isawaitable(result):
+                result = await result
+            with self._lock:
+                self._publish_pending()
+                if data.validate():
+                    data.apply()
+                    self.save()
+                    return result
+            self.conflicts += 1
+        raise CommitConflict(f"Optimistic commit still conflicting after {retries} retries")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group every mutation made in the block into one commit
+
+        save() calls inside the block are folded into a single save() when it
+        ends; if the block raises, everything it touched is restored and
+        nothing is committed. Records must be reached through the document
+        inside the block: changes made through references fetched before it
+        are still committed, but a rollback cannot undo them. The block must
+        not await. Nested transactions join the outer one.
+        """
+        data = self.load()
+        with self._lock:
+            if self._transaction is not None:
+                self._transaction.depth += 1
+                try:
+                    yield data
+                finally:
+                    self._transaction.depth -= 1
+                return
+            # Start from an empty change set so every touch in the block is seen first here
+            self._publish_pending()
+            transaction = self._transaction = Transaction(data)
+            publish_hook = data.on_first_touch
+
+            def remember(name, key):
+                transaction.remember(name, key)
+                if publish_hook is not None:
+                    publish_hook(name, key)
+
+            data.on_first_touch = remember
+            try:
+                yield data
+            except BaseException:
+                transaction.rollback()
+                self.rollbacks += 1
+                raise
+            finally:
+                data.on_first_touch = publish_hook
+                self._transaction = None
+            self.save()
+
+    @property
+    def gang_names(self):
+        """Case-insensitive gang name index of the resident document"""
+        self.load()
+        return self._gang_names
+
+    @property
+    def membership(self):
+        """Gang membership index of the resident document"""
+        self.load()
+        return self._membership
+
+    @property
+    def wars(self):
+        """Active war and war roster index of the resident document"""
+        self.load()
+        return self._wars
+
+    def ranking(self, name, section, score):
+        """Register (or return) the RankedIndex called name over a section"""
+        with self._lock:
+            index = self._rankings.get(name)
+            if index is None:
+                index = self._rankings[name] = RankedIndex(section, score)
+                if self._publisher is not None:
+                    self._publisher.listeners.append(index.update)
+            return index
+
+    def ranking_page(self, name, number, size):
+        """One page of a registered ranking, as of the latest save()"""
+        self.load()
+        with self._lock:
+            return self._rankings[name].page(self._publisher.current, number, size)
+
+    def archive_wars(self, war_ids=None):
+        """Move completed wars (all of them, or the given ids) into the war archive
+
+        A war is appended and synced to the archive before it leaves the
+        document, so a crash in between leaves it in both places and the next
+        run only drops it from the document. Both gangs' "wars" lists lose the
+        war id with it; war_history() serves archived wars. Returns the number
+        of wars moved.
+        """
+        data = self.load()
+        moved = 0
+        with self._lock:
+            wars = data.get("wars")
+            if not isinstance(wars, dict):
+                return 0
+            for war_id in (list(wars.keys()) if war_ids is None else war_ids):
+                war = wars.get(war_id)
+                if not isinstance(war, dict) or war.get("status") != "completed":
+                    continue
+                self.archive.append(war_id, clone(war))
+                del wars[war_id]
+                self._forget_war(data, war_id, war)
+                moved += 1
+            if moved:
+                self.save()
+        return moved
+
+    async def archive_wars_async(self, war_ids=None):
+        """archive_wars() with the synced archive appends run off the event loop
+
+        Copies of the completed wars are taken on the loop, appended in a
+        worker thread, and a war then leaves the document only if it was not
+        changed in the meantime.
+        """
+        data = self.load()
+        with self._lock:
+            wars = data.get("wars")
+            if not isinstance(wars, dict):
+                return 0
+            completed = []
+            for war_id in (list(wars.keys()) if war_ids is None else war_ids):
+                war = wars.get(war_id)
+                if isinstance(war, dict) and war.get("status") == "completed":
+                    completed.append((war_id, clone(war)))
+        if not completed:
+            return 0
+
+        def append_all():
+            for war_id, war in completed:
+                self.archive.append(war_id, war)
+
+        await asyncio.to_thread(append_all)
+        moved = 0
+        with self._lock:
+            wars = data.get("wars")
+            for war_id, war in completed:
+                if isinstance(wars, dict) and wars.get(war_id) == war:
+                    del wars[war_id]
+                    self._forget_war(data, war_id, war)
+                    moved += 1
+            if moved:
+                self.save()
+        return moved
+
+    @staticmethod
+    def _forget_war(data, war_id, war):
+        """Drop an archived war from its gangs' {enemy_id: war_id} lists"""
+        gangs = data.get("gangs", {})
+        for gang_id, enemy_id in ((war.get("attacker"), war.get("defender")),
+                                  (war.get("defender"), war.get("attacker"))):
+            gang = gangs.get(gang_id)
+            refs = gang.get("wars") if isinstance(gang, dict) else None
+            if isinstance(refs, dict) and refs.get(enemy_id) == war_id:
+                del refs[enemy_id]
+
+    def war_history(self, gang_id, limit=None):
+        """Read-only (war_id, war) pairs of a gang: wars still in the document, then archived ones"""
+        current = [(war_id, war) for war_id, war in self.snapshot().get("wars", {}).items()
+                   if gang_id in (war.get("attacker"), war.get("defender"))]
+        current.sort(key=lambda item: item[1].get("started_at") or "", reverse=True)
+        archived = [(war_id, freeze(war)) for war_id, war in self.archive.history(gang_id, limit)]
+        history = current + archived
+        return history if limit is None else history[:limit]
+
+    def snapshot(self):
+        """Immutable snapshot of the document as of the latest save()
+
+        Reading it never marks records dirty or inserts defaults, and it keeps
+        showing the same state while later commands modify the document.
+        """
+        self.load()
+        return self._publisher.current
+
+    def save(self, data=None):
+        """Record a mutation; the document is flushed later by count or interval
+
+        In write-through mode it is flushed right away and save() returns
+        once it is on disk.
+        """
+        due = self._commit(data)
+        if due is None:
+            return
+        if self.write_through:
+            self.flush(hurry=True)
+        elif due:
+            self.flush(wait=False)
+        else:
+            self._arm_timer()
+
+    def _commit(self, data):
+        """Publish a mutation; returns whether a flush is due, or None inside a transaction"""
+        with self._lock:
+            if self._transaction is not None and (data is None or data is self._data):
+                # Committed once when the transaction ends
+                return None
+            if data is not None and data is not self._data:
+                # Callers that built their own document replace the resident one
+                self._adopt(TrackedDocument(data))
+                self._full_write = True
+            self._pending += 1
+            self.version += 1
+            if self._data is not None:
+                # Picks up records changed through references held since an earlier save
+                self._data.rescan()
+                changes = self._data.take_changes()
+                TrackedDocument.merge_changes(self._unflushed, changes)
+                self._publisher.publish(changes, self.version)
+            return self._pending >= self.flush_every
+
+    async def save_async(self, data=None):
+        """Record a mutation and wait until it is durable on disk"""
+        if self._commit(data) is None:
+            return
+        await self.flush_async()
+
+    def _arm_timer(self):
+        """Schedule an interval flush on the owning event loop when possible"""
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._timer_flush)
+        except RuntimeError:
+            # No running loop (scripts, tests) - fall back to a daemon timer thread
+            timer = threading.Timer(self.flush_interval, self._timer_flush)
+            timer.daemon = True
+            self._timer = timer
+            timer.start()
+
+    def _timer_flush(self):
+        self._timer = None
+        self.flush(wait=False)
+
+    def flush(self, wait=True, hurry=None):
+        """Hand unsaved mutations to the writer thread
+
+        Only copying the changed records happens on the calling thread; the
+        encoding and file I/O run on the writer. Returns the write's future,
+        after waiting for it unless wait is False. A waited-for flush skips
+        the writer's commit window unless hurry is False.
+        """
+        if hurry is None:
+            hurry = wait
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            changeset = None
+            if self._data is not None and (self._pending or self._full_write):
+                self._pending = 0
+                # Mutations made since the last save() are persisted, so publish them too
+                self._publish_pending()
+                changes, self._unflushed = self._unflushed, {}
+                if self._full_write:
+                    changes, self._full_write = None, False
+                if changes is None or changes:
+                    changeset = ChangeSet.capture(self._data, changes)
+            if changeset is not None:
+                future = self.writer.submit(changeset, hurry)
+                self.last_flush = time.monotonic()
+            else:
+                future = self.writer.last_future()
+
+        if wait:
+            future.result()
+        return future
+
+    async def flush_async(self):
+        """Flush without blocking the event loop and wait for durability"""
+        await asyncio.wrap_future(self.flush(wait=False, hurry=self.write_through))
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def commit_stats(self):
+        """Group-commit counters of the writer (empty until the first flush)"""
+        if self._writer is None:
+            return CommitStats().snapshot()
+        return self._writer.stats.snapshot()
+
+    def close(self):
+        """Forced flush used at shutdown"""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Business data flush on shutdown failed; unsaved changes are lost")
+        if self._writer is not None:
+            self._writer.stop()
+        if self._backend is not None:
+            self._backend.close()
+
+
+state_store = StateStore()
+atexit.register(state_store.close)
+key_locks = KeyLocks()
+
+
+def load_data():
+    """Return the resident economy document"""
+    return state_store.load()
+
+
+def read_data():
+    """Immutable snapshot of the economy document for display commands"""
+    return state_store.snapshot()
+
+
+async def compare_and_swap(mutate, retries=CAS_RETRIES):
+    """Optimistically apply mutate(data) to the economy document (see StateStore)"""
+    return await state_store.compare_and_swap(mutate, retries)
+
+
+def transaction():
+    """Context manager committing all mutations of one interaction at once (see StateStore)"""
+    return state_store.transaction()
+
+
+def archive_wars(war_ids=None):
+    """Move completed wars out of the economy document into the war archive"""
+    return state_store.archive_wars(war_ids)
+
+
+async def archive_wars_async(war_ids=None):
+    """archive_wars() for handlers: the archive's fsyncs happen off the event loop"""
+    return await state_store.archive_wars_async(war_ids)
+
+
+def war_history(gang_id, limit=None):
+    """Wars a gang fought, including archived ones, newest first"""
+    return state_store.war_history(gang_id, limit)
+
+
+def memberships():
+    """The gang membership index (see MembershipIndex)"""
+    return state_store.membership
+
+
+def war_index():
+    """The active war and war roster index (see WarIndex)"""
+    return state_store.wars
+
+
+def repair_memberships():
+    """Bring every business record's gang_id/gang_role in line with the member lists"""
+    with state_store._lock:
+        changed = state_store.membership.repair(load_data())
+    if changed:
+        save_data()
+    return changed
+
+
+def ranking(name, section, score):
+    """Keep the records of a section ranked by score(record), highest first"""
+    return state_store.ranking(name, section, score)
+
+
+def ranking_page(name, number, size):
+    """([(rank, key, score)], total) for one page of a ranking"""
+    return state_store.ranking_page(name, number, size)
+
+
+def gang_id_by_name(name):
+    """gang_id of the gang with this name (case-insensitive), or None"""
+    return state_store.gang_names.lookup(name)
+
+
+def claim_gang_name(name, gang_id):
+    """Reserve a gang name for gang_id; raises GangNameTaken if it is in use"""
+    with state_store._lock:
+        state_store.gang_names.claim(name, gang_id)
+
+
+def release_gang_name(name, gang_id=None):
+    """Free the name of a disbanded gang"""
+    state_store.gang_names.release(name, gang_id)
+
+
+def search_gang_names(text, limit=25):
+    """[(gang_id, name)] of gangs whose names start with or contain text, best first"""
+    return state_store.gang_names.search(text, limit)
+
+
+def reset_gang_names():
+    """Re-index gang names after the gangs section was replaced"""
+    state_store.gang_names.reset()
+
+
+def lock_entities(gangs=(), users=(), wars=()):
+    """Async context manager holding the locks of the given gangs, users and wars"""
+    return key_locks.hold(KeyLocks.keys(gangs, users, wars))
+
+
+def lock_stats(top=None):
+    """Wait time per lock key, hottest first"""
+    return key_locks.stats(top)
+
+
+def save_data(data=None):
+    """Mark the resident economy document as modified"""
+    state_store.save(data)
+
+
+async def save_data_async(data=None):
+    """Mark the resident economy document as modified and wait until it is on disk"""
+    await state_store.save_async(data)
+
+
+def flush_data():
+    """Force pending economy changes to disk"""
+    state_store.flush()
+
+
+def commit_stats():
+    """Commit latency and batching metrics of the economy writer"""
+    return state_store.commit_stats()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Business economy storage tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = commands.add_parser("import-sqlite", help="Import contributions.json into the SQLite backend")
+    import_cmd.add_argument("json_path", nargs="?", default=DATA_FILE)
+    import_cmd.add_argument("db_path", nargs="?", default=SQLITE_FILE)
+
+    shard_cmd = commands.add_parser("import-shards", help="Import contributions.json into the sharded layout")
+    shard_cmd.add_argument("json_path", nargs="?", default=DATA_FILE)
+    shard_cmd.add_argument("shard_dir", nargs="?", default=SHARD_DIR)
+
+    convert_cmd = commands.add_parser("convert", help="Convert between contributions.json and a binary snapshot")
+    convert_cmd.add_argument("src", nargs="?", default=DATA_FILE)
+    convert_cmd.add_argument("dst", nargs="?", default=SNAPSHOT_FILE)
+    convert_cmd.add_argument("--serializer", choices=sorted(SERIALIZERS))
+
+    archive_cmd = commands.add_parser("archive-wars", help="Move completed wars into the war archive")
+    archive_cmd.add_argument("--storage", choices=sorted(BACKENDS), default=STORAGE_BACKEND)
+    archive_cmd.add_argument("--archive", default=WAR_ARCHIVE_FILE)
+
+    compact_cmd = commands.add_parser("compact", help="Delete stored records that only hold default values")
+    compact_cmd.add_argument("--storage", choices=sorted(BACKENDS), default=STORAGE_BACKEND)
+
+    repair_cmd = commands.add_parser("repair-gangs", help="Fix gang_id/gang_role copies that disagree with member lists")
+    repair_cmd.add_argument("--storage", choices=sorted(BACKENDS), default=STORAGE_BACKEND)
+
+    bench_cmd = commands.add_parser("benchmark", help="Compare load/save times of the storage formats")
+    bench_cmd.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    args = parser.parse_args()
+    if args.command == "import-sqlite":
+        counts = import_json_to_sqlite(args.json_path, args.db_path)
+        summary = ", ".join(f"{section}: {count}" for section, count in counts.items())
+        print(f"Imported {args.json_path} into {args.db_path} ({summary})")
+    elif args.command == "import-shards":
+        counts = import_json_to_shards(args.json_path, args.shard_dir)
+        summary = ", ".join(f"{section}: {count}" for section, count in counts.items())
+        print(f"Imported {args.json_path} into {args.shard_dir} ({summary})")
+    elif args.command == "convert":
+        src_size, dst_size = convert_file(args.src, args.dst, args.serializer)
+        print(f"Converted {args.src} ({src_size:,} bytes) to {args.dst} ({dst_size:,} bytes)")
+    elif args.command == "archive-wars":
+        store = StateStore(create_backend(args.storage), archive=WarArchive(args.archive))
+        moved = store.archive_wars()
+        store.close()
+        print(f"Archived {moved} completed wars into {args.archive}")
+    elif args.command == "compact":
+        removed, before, after = compact_defaults(create_backend(args.storage))
+        summary = ", ".join(f"{section}: {count}" for section, count in removed.items())
+        print(f"Removed default records ({summary}); {before:,} -> {after:,} bytes, saved {before - after:,} bytes")
+    elif args.command == "repair-gangs":
+        store = StateStore(create_backend(args.storage))
+        changed = store.membership.repair(store.load())
+        store.save()
+        store.close()
+        print(f"Repaired the gang fields of {changed} business records")
+    elif args.command == "benchmark":
+        print(f"{'users':>10}  {'format':<18} {'save':>9} {'load':>9} {'size':>14}")
+        for row in benchmark_formats(args.users):
+            print(f"{row['users']:>10,}  {row['format']:<18} {row['save_s']:>8.3f}s {row['load_s']:>8.3f}s "
+                  f"{row['bytes']:>14,}")
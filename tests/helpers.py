@@ -0,0 +1,27 @@
+import copy
+import os
+
+import business_store as bs
+
+
+def make_backend(name, directory):
+    directory = str(directory)
+    if name == "json":
+        return bs.JsonFileBackend(os.path.join(directory, "contributions.json"))
+    if name == "sqlite":
+        return bs.SqliteBackend(os.path.join(directory, "economy.db"))
+    if name == "journal":
+        return bs.JournalBackend(os.path.join(directory, "journal.json"), compact_interval=0.05)
+    if name == "sharded":
+        return bs.ShardedBackend(os.path.join(directory, "shards"), buckets=7)
+    if name == "snapshot":
+        return bs.SnapshotBackend(os.path.join(directory, "contributions.snap"))
+    raise ValueError(name)
+
+
+def stored(backend):
+    """Everything a backend loads, as plain values, without the empty default sections"""
+    doc = bs.TrackedDocument(backend.load())
+    data = {name: copy.deepcopy(bs.plain(value)) for name, value in dict.items(doc)}
+    backend.close()
+    return {name: value for name, value in data.items() if not (name in bs.SECTIONS and value == {})}
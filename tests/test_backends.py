@@ -0,0 +1,77 @@
+import copy
+import random
+
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+def sample_document():
+    return {
+        "business": {str(i): {"businesses": {}, "gang_id": None, "v": [1, 2, {"a": "é"}]} for i in range(20)},
+        "gangs": {"g": {"name": "Alpha", "members": {"0": "leader"}}},
+        "gambling": {str(i): {"dollars": i} for i in range(20)},
+        "players": {"p": {"x": 1}},
+        "lst": [1, 2],
+        "n": None,
+    }
+
+
+@pytest.mark.parametrize("name", sorted(bs.BACKENDS))
+def test_backend_round_trip(tmp_path, name):
+    doc = sample_document()
+    store = bs.StateStore(make_backend(name, tmp_path), flush_interval=60)
+    data = store.load()
+    for key, value in copy.deepcopy(doc).items():
+        data[key] = value
+    store.save()
+    store.close()
+
+    assert stored(make_backend(name, tmp_path)) == doc
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("name", sorted(bs.BACKENDS))
+def test_random_mutations_survive_reload(tmp_path, name, seed):
+    rng = random.Random(seed)
+    store = bs.StateStore(make_backend(name, tmp_path), flush_every=3, flush_interval=0.05)
+    data = store.load()
+    for key, value in copy.deepcopy(sample_document()).items():
+        data[key] = value
+    store.save()
+    expected = copy.deepcopy(sample_document())
+    for step in range(200):
+        roll = rng.random()
+        uid = str(rng.randrange(30))
+        if roll < 0.3:
+            data["gambling"].setdefault(uid, {"dollars": 0})["dollars"] += 1
+            expected["gambling"].setdefault(uid, {"dollars": 0})["dollars"] += 1
+        elif roll < 0.4:
+            data["gambling"].pop(uid, None)
+            expected["gambling"].pop(uid, None)
+        elif roll < 0.5:
+            data["gangs"][uid] = {"members": {uid: "leader"}}
+            expected["gangs"][uid] = {"members": {uid: "leader"}}
+        elif roll < 0.55:
+            data["lst"].append(step)
+            expected["lst"].append(step)
+        elif roll < 0.6:
+            data["players"]["q"] = step
+            expected["players"]["q"] = step
+        elif roll < 0.62:
+            data["wars"] = {}
+            expected["wars"] = {}
+        elif roll < 0.65:
+            for record in data["business"].values():
+                record["gang_id"] = step
+            for record in expected["business"].values():
+                record["gang_id"] = step
+        elif roll < 0.7:
+            store.flush(wait=rng.random() < 0.5)
+        store.save()
+    store.close()
+
+    expected = {name: value for name, value in expected.items() if not (name in bs.SECTIONS and value == {})}
+    assert stored(make_backend(name, tmp_path)) == expected
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("shared_utils")
+
+import business_store as bs
+import business_features as bf
+
+from helpers import make_backend
+
+
+def business_section(users, per_user=5, seed=0):
+    rng = random.Random(seed)
+    efficiency_projects = [project_id for project_id, info in bf.RESEARCH_PROJECTS.items()
+                           if "business_efficiency" in info["benefits"]]
+    section = {"idle": bs.default_record("business")}
+    for index in range(users):
+        section[str(index)] = {
+            "businesses": {f"biz_{n}": {"type": rng.choice(list(bf.BUSINESS_TYPES)), "level": rng.randint(1, 10)}
+                           for n in range(rng.randint(0, per_user))},
+            "current_location": rng.choice(list(bf.WORLD_LOCATIONS)),
+            "research_projects": {project_id: {"completed": rng.random() < 0.5} for project_id in efficiency_projects},
+        }
+    return section
+
+
+def test_vectorized_income_equals_the_per_user_path():
+    pytest.importorskip("numpy")
+    section = business_section(2000)
+
+    vectorized = bf.calculate_all_business_income(section, vectorized=True)
+    per_user = bf.calculate_all_business_income(section, vectorized=False)
+
+    assert vectorized == per_user
+    assert vectorized["idle"] == 0
+    for uid, business_data in section.items():
+        assert vectorized[uid] == bf.calculate_business_income(business_data, bf.location_multiplier_of(business_data))
+
+
+def test_collection_pays_whole_hours_once(tmp_path, monkeypatch):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    monkeypatch.setattr(bs, "state_store", store)
+    data = store.load()
+    data["business"].update(business_section(20))
+    store.save()
+    expected = bf.calculate_all_business_income(business_section(20))
+
+    assert bf.collect_business_income(now=1000) == {}
+    assert bf.collect_business_income(now=1000 + 3599) == {}
+    paid = bf.collect_business_income(now=1000 + 2 * 3600 + 10)
+
+    assert paid == {uid: 2 * income for uid, income in expected.items() if income > 0}
+    for uid, amount in paid.items():
+        assert data["gambling"][uid]["dollars"] == 100 + amount
+        assert data["business"][uid]["total_income"] == amount
+    assert data["business_payout_at"] == 1000 + 2 * 3600
+    assert bf.collect_business_income(now=1000 + 2 * 3600 + 20) == {}
+    store.close()
@@ -0,0 +1,77 @@
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+@pytest.mark.parametrize("name", ["json", "sqlite", "journal"])
+def test_record_changed_through_a_held_reference_after_save_is_persisted(tmp_path, name):
+    store = bs.StateStore(make_backend(name, tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+    data["equipment"]["a"] = {"weapons": ["fists"], "inventory": {}}
+    store.save()
+
+    # A View keeps these and changes them in a later interaction
+    record = data["gambling"]["a"]
+    inventory = data["equipment"]["a"]["inventory"]
+    store.save()
+    record["dollars"] = 5
+    inventory["medkit"] = 2
+    store.save()
+    store.close()
+
+    loaded = stored(make_backend(name, tmp_path))
+    assert loaded["gambling"]["a"] == {"dollars": 5}
+    assert loaded["equipment"]["a"]["inventory"] == {"medkit": 2}
+
+
+def test_record_from_an_iterated_section_is_watched(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gangs"]["g"] = {"members": {}}
+    store.save()
+    gangs = {gang_id: gang for gang_id, gang in data["gangs"].items()}
+    store.save()
+
+    gangs["g"]["members"]["u"] = "leader"
+    store.save()
+    store.close()
+
+    assert stored(make_backend("json", tmp_path))["gangs"]["g"] == {"members": {"u": "leader"}}
+
+
+def test_rescan_only_touches_changed_records():
+    doc = bs.TrackedDocument({"gambling": {"a": {"dollars": 1}, "b": {"dollars": 2}}, "lst": [1]})
+    a, b, lst = doc["gambling"]["a"], doc["gambling"]["b"], doc["lst"]
+    doc.rescan()
+    doc.take_changes()
+
+    doc.rescan()
+    assert doc.take_changes() == {}
+
+    a["dollars"] = 3
+    lst.append(2)
+    doc.rescan()
+    assert doc.take_changes() == {"gambling": {"a"}, "lst": bs.ALL}
+    assert b == {"dollars": 2}
+
+
+def test_unchanged_held_records_do_not_bump_versions(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+    data["gambling"]["b"] = {"dollars": 1}
+    store.save()
+    record = data["gambling"]["a"]
+    data["gambling"]["b"]
+    store.save()
+    before = store.version_of("gambling", "a"), store.version_of("gambling", "b")
+
+    record["dollars"] = 2
+    store.save()
+
+    assert store.version_of("gambling", "a") == before[0] + 1
+    assert store.version_of("gambling", "b") == before[1]
+    store.close()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("shared_utils")
+
+import business_features as bf
+
+
+class User:
+    def __init__(self, uid, name):
+        self.id = int(uid)
+        self.display_name = name
+
+
+class Client:
+    def __init__(self, cached=(), remote=()):
+        self.cached = {int(uid): User(uid, name) for uid, name in dict(cached).items()}
+        self.remote = {int(uid): User(uid, name) for uid, name in dict(remote).items()}
+        self.fetches = []
+        self.listeners = {}
+
+    def get_user(self, uid):
+        return self.cached.get(uid)
+
+    async def fetch_user(self, uid):
+        self.fetches.append(uid)
+        if uid not in self.remote:
+            raise LookupError(uid)
+        return self.remote[uid]
+
+    def add_listener(self, listener, name):
+        self.listeners[name] = listener
+
+
+class Guild:
+    def __init__(self, members):
+        self.members = {int(uid): User(uid, name) for uid, name in members.items()}
+        self.queries = []
+
+    async def query_members(self, user_ids, limit):
+        self.queries.append(list(user_ids))
+        return [self.members[uid] for uid in user_ids if uid in self.members]
+
+
+def test_names_come_from_the_cheapest_source_first():
+    resolver = bf.DisplayNameResolver()
+    client = Client(cached={1: "cached"}, remote={3: "fetched"})
+    data = {"gambling": {"2": {"username": "stored"}}}
+
+    names = asyncio.run(resolver.resolve(client, [1, 2, 3, 4], data))
+
+    assert names == {"1": "cached", "2": "stored", "3": "fetched", "4": None}
+    assert client.fetches == [3, 4]
+    # Everything is cached now, the failed lookup only for a short while
+    assert asyncio.run(resolver.resolve(client, [1, 2, 3, 4], data)) == names
+    assert client.fetches == [3, 4]
+    assert resolver.stats()["hits"] == 4
+
+
+def test_guild_members_are_queried_in_one_batch_before_user_fetches():
+    resolver = bf.DisplayNameResolver()
+    client = Client(remote={7: "fetched"})
+    guild = Guild({5: "five", 6: "six"})
+
+    names = asyncio.run(resolver.resolve(client, [5, 6, 7], guild=guild))
+
+    assert names == {"5": "five", "6": "six", "7": "fetched"}
+    assert guild.queries == [[5, 6, 7]]
+    assert client.fetches == [7]
+
+
+def test_cache_evicts_the_least_recently_used_and_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(bf.time, "monotonic", lambda: clock[0])
+    resolver = bf.DisplayNameResolver(capacity=2, ttl=10)
+    client = Client()
+
+    resolver.remember(1, "one")
+    resolver.remember(2, "two")
+    assert resolver.lookup(client, 1) == "one"
+    resolver.remember(3, "three")
+    assert resolver.lookup(client, 2) is None
+    assert resolver.lookup(client, 1) == "one"
+
+    clock[0] += 11
+    assert resolver.lookup(client, 1) is None
+
+
+def test_gateway_events_keep_the_cache_current():
+    resolver = bf.DisplayNameResolver()
+    client = Client()
+    asyncio.run(resolver.resolve(client, []))
+
+    asyncio.run(client.listeners["on_member_update"](None, User(8, "renamed")))
+    assert resolver.lookup(client, 8) == "renamed"
+    assert client.fetches == []
+
+
+def test_slow_fetches_give_up_within_the_timeout(monkeypatch):
+    monkeypatch.setattr(bf, "NAME_FETCH_TIMEOUT", 0.05)
+    resolver = bf.DisplayNameResolver()
+
+    class SlowClient(Client):
+        async def fetch_user(self, uid):
+            await asyncio.sleep(5)
+
+    assert asyncio.run(resolver.resolve(SlowClient(), [9])) == {"9": None}
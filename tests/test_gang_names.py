@@ -0,0 +1,113 @@
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend
+
+
+def index_of(gangs):
+    return bs.GangNameIndex(bs.TrackedDocument({"gangs": gangs}))
+
+
+def test_lookup_ignores_case_and_surrounding_spaces():
+    index = index_of({"g1": {"name": "Night Owls"}, "g2": {"name": "Crew"}})
+
+    assert index.lookup("  night OWLS ") == "g1"
+    assert index.lookup("crew") == "g2"
+    assert index.lookup("night") is None
+
+
+def test_claim_rejects_a_name_another_gang_holds():
+    doc = bs.TrackedDocument({"gangs": {"g1": {"name": "Crew"}}})
+    index = bs.GangNameIndex(doc)
+
+    with pytest.raises(bs.GangNameTaken):
+        index.claim("CREW", "g2")
+    index.claim("crew", "g1")
+    index.claim("Other", "g2")
+    doc["gangs"]["g2"] = {"name": "Other"}
+    with pytest.raises(bs.GangNameTaken):
+        index.claim("other ", "g3")
+
+
+def test_released_and_renamed_names_become_free():
+    doc = bs.TrackedDocument({"gangs": {"g1": {"name": "Crew"}, "g2": {"name": "Owls"}}})
+    index = bs.GangNameIndex(doc)
+    assert index.lookup("owls") == "g2"
+
+    index.release("Crew", "g2")
+    assert index.lookup("crew") == "g1"
+    index.release("Crew", "g1")
+    index.claim("crew", "g3")
+
+    # An entry whose gang no longer carries the name does not block it
+    doc["gangs"]["g2"]["name"] = "Hawks"
+    assert index.lookup("owls") is None
+    index.claim("Owls", "g4")
+
+
+def test_name_claimed_by_a_rolled_back_create_is_free(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    store.load()
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as doc:
+            store.gang_names.claim("Crew", "g1")
+            doc["gangs"]["g1"] = {"name": "Crew"}
+            raise RuntimeError("declined")
+
+    assert store.gang_names.lookup("crew") is None
+    store.gang_names.claim("Crew", "g2")
+    store.close()
+
+
+def test_reset_rebuilds_from_the_gangs_section():
+    doc = bs.TrackedDocument({"gangs": {"g1": {"name": "Crew"}}})
+    index = bs.GangNameIndex(doc)
+    assert index.names() == ["crew"]
+
+    doc["gangs"] = {"g2": {"name": "Owls"}}
+    index.reset()
+    assert index.names() == ["owls"]
+    assert index.lookup("crew") is None
+
+
+def test_search_lists_prefix_matches_before_substring_matches():
+    index = index_of({
+        "g1": {"name": "Red Dragons"},
+        "g2": {"name": "Redline"},
+        "g3": {"name": "The Red Hand"},
+        "g4": {"name": "Shredders"},
+        "g5": {"name": "Blue"},
+    })
+
+    assert index.search("red") == [("g1", "Red Dragons"), ("g2", "Redline"),
+                                   ("g4", "Shredders"), ("g3", "The Red Hand")]
+    assert index.search("RED", limit=2) == [("g1", "Red Dragons"), ("g2", "Redline")]
+    assert index.search("re") == [("g1", "Red Dragons"), ("g2", "Redline")]
+    assert index.search("green") == []
+    assert index.search("", limit=2) == [("g5", "Blue"), ("g1", "Red Dragons")]
+
+
+def test_search_follows_claims_releases_and_renames():
+    doc = bs.TrackedDocument({"gangs": {"g1": {"name": "Redline"}}})
+    index = bs.GangNameIndex(doc)
+    assert index.search("line") == [("g1", "Redline")]
+
+    index.claim("Skyline", "g2")
+    doc["gangs"]["g2"] = {"name": "Skyline"}
+    assert index.search("line") == [("g1", "Redline"), ("g2", "Skyline")]
+
+    doc["gangs"]["g1"]["name"] = "Blue"
+    assert index.search("line") == [("g2", "Skyline")]
+    index.release("Skyline", "g2")
+    assert index.search("line") == []
+
+
+def test_search_ranks_only_a_bounded_number_of_substring_matches():
+    gangs = {f"g{i}": {"name": f"{i:05d} crew"} for i in range(1000)}
+    index = index_of(gangs)
+
+    matches = index.search("crew", limit=5)
+    assert len(matches) == 5
+    assert all("crew" in name for _, name in matches)
@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+
+import business_store as bs
+
+from helpers import stored
+
+
+def write_journal(path, lines):
+    with open(path, "wb") as f:
+        f.write(b"".join(lines))
+
+
+def put(section, key, value):
+    return (json.dumps({"op": "put", "s": section, "k": key, "v": value}) + "\n").encode()
+
+
+def test_journal_replay_drops_torn_tail(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    journal_path = path + ".journal"
+    with open(path, "w") as f:
+        json.dump({"gambling": {"a": {"dollars": 1}}}, f)
+    good = [put("gambling", "a", {"dollars": 2}), put("gambling", "b", {"dollars": 3})]
+    write_journal(journal_path, good + [b'{"op":"put","s":"gambling","k":"c","v":{"doll'])
+
+    backend = bs.JournalBackend(path, compact_interval=3600)
+    data = backend.load()
+
+    assert data["gambling"] == {"a": {"dollars": 2}, "b": {"dollars": 3}}
+    assert os.path.getsize(journal_path) == sum(len(line) for line in good)
+    backend.close()
+
+
+def test_journal_replay_stops_at_corrupt_line(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    write_journal(path + ".journal", [put("gambling", "a", {"dollars": 2}), b"not json\n",
+                                      put("gambling", "a", {"dollars": 9})])
+
+    backend = bs.JournalBackend(path, compact_interval=3600)
+    assert backend.load()["gambling"] == {"a": {"dollars": 2}}
+    backend.close()
+
+
+def test_journal_compaction_keeps_concurrent_appends(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    backend = bs.JournalBackend(path, compact_interval=3600)
+    store = bs.StateStore(backend, flush_interval=60)
+    data = store.load()
+    done = threading.Event()
+
+    def append():
+        try:
+            for i in range(200):
+                data["gambling"][str(i % 17)] = {"dollars": i}
+                store.save()
+                store.flush()
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    compactions = 0
+    while not done.is_set():
+        compactions += backend.compact()
+    writer.join()
+    store.close()
+
+    expected = {str(i % 17): {"dollars": i} for i in range(200)}
+    assert compactions > 0
+    assert stored(bs.JournalBackend(path, compact_interval=3600))["gambling"] == expected
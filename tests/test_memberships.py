@@ -0,0 +1,100 @@
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+def gang_fields(data, uid):
+    record = data["business"][uid]
+    return record["gang_id"], record["gang_role"]
+
+
+def setup_gangs():
+    data = bs.TrackedDocument({"gangs": {"g1": {"name": "Crew"}, "g2": {"name": "Owls"}}})
+    index = bs.MembershipIndex(data)
+    index.join(data, "g1", "a", "leader")
+    index.join(data, "g1", "b")
+    index.join(data, "g2", "c", "leader")
+    return data, index
+
+
+def test_join_and_leave_update_both_directions_and_the_records():
+    data, index = setup_gangs()
+
+    assert index.lookup("b") == ("g1", "member")
+    assert index.members("g1") == {"a": "leader", "b": "member"}
+    assert gang_fields(data, "b") == ("g1", "member")
+
+    assert index.set_role(data, "b", "officer") == "g1"
+    assert gang_fields(data, "b") == ("g1", "officer")
+
+    assert index.leave(data, "b") == "g1"
+    assert index.lookup("b") == (None, None)
+    assert index.members("g1") == {"a": "leader"}
+    assert gang_fields(data, "b") == (None, None)
+    assert index.leave(data, "nobody") is None
+
+
+def test_disband_releases_every_member_record():
+    data, index = setup_gangs()
+
+    assert index.disband(data, "g1")["name"] == "Crew"
+    assert gang_fields(data, "a") == (None, None)
+    assert gang_fields(data, "b") == (None, None)
+    assert gang_fields(data, "c") == ("g2", "leader")
+    assert index.lookup("a") == (None, None)
+
+
+def test_reset_releases_every_member_record():
+    data, index = setup_gangs()
+
+    index.reset(data)
+    assert data["gangs"] == {}
+    assert all(gang_fields(data, uid) == (None, None) for uid in "abc")
+    assert index.lookup("c") == (None, None)
+
+
+def test_reading_a_record_writes_nothing(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gangs"]["g1"] = {"members": {}}
+    # A record left pointing at a gang that does not list the user
+    data["business"]["a"] = dict(bs.DEFAULT_RECORDS["business"], gang_id="g1", gang_role="member")
+    store.save()
+    version = store.version_of("business", "a")
+
+    assert store.membership.lookup("a") == (None, None)
+    assert bs.record_or_default(data, "business", "a")["gang_id"] == "g1"
+    store.save()
+    assert store.version_of("business", "a") == version
+    store.close()
+
+
+def test_repair_fixes_only_records_out_of_line(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gangs"]["g1"] = {"members": {"a": "leader"}}
+    data["business"]["a"] = dict(bs.DEFAULT_RECORDS["business"], gang_id="g1", gang_role="member")
+    data["business"]["b"] = dict(bs.DEFAULT_RECORDS["business"], gang_id="gone", gang_role="leader")
+    data["business"]["c"] = dict(bs.DEFAULT_RECORDS["business"], total_income=5)
+    store.save()
+    version = store.version_of("business", "c")
+
+    assert store.membership.repair(data) == 2
+    store.save()
+    assert store.version_of("business", "c") == version
+    assert store.membership.repair(data) == 0
+    store.close()
+
+    business = stored(make_backend("json", tmp_path))["business"]
+    assert (business["a"]["gang_id"], business["a"]["gang_role"]) == ("g1", "leader")
+    assert (business["b"]["gang_id"], business["b"]["gang_role"]) == (None, None)
+
+
+def test_view_reports_member_lists_without_changing_the_record():
+    data, index = setup_gangs()
+    record = data["business"]["a"]
+    snapshot = {"gangs": {}, "business": {"a": record}}
+
+    view = index.view("a", record, snapshot)
+    assert (view["gang_id"], view["gang_role"]) == (None, None)
+    assert gang_fields(data, "a") == ("g1", "leader")
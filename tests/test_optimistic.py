@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+def test_compare_and_swap_retries_after_conflict(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    live = store.load()
+    live["gambling"]["a"] = {"dollars": 0}
+    store.save()
+    calls = []
+
+    async def credit(data):
+        dollars = data["gambling"]["a"]["dollars"]
+        if not calls:
+            # Another handler commits to the same record while this one awaits
+            live["gambling"]["a"]["dollars"] += 100
+            store.save()
+        calls.append(dollars)
+        await asyncio.sleep(0)
+        data["gambling"]["a"]["dollars"] = dollars + 1
+        return dollars + 1
+
+    assert asyncio.run(store.compare_and_swap(credit, retries=1)) == 101
+    assert calls == [0, 100]
+    assert store.conflicts == 1
+    assert live["gambling"]["a"] == {"dollars": 101}
+    store.close()
+
+
+def test_compare_and_swap_gives_up_after_retries(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    live = store.load()
+    live["gambling"]["a"] = {"dollars": 0}
+    store.save()
+
+    async def credit(data):
+        dollars = data["gambling"]["a"]["dollars"]
+        live["gambling"]["a"]["dollars"] += 100
+        store.save()
+        data["gambling"]["a"]["dollars"] = dollars + 1
+
+    with pytest.raises(bs.CommitConflict):
+        asyncio.run(store.compare_and_swap(credit, retries=2))
+    assert store.conflicts == 3
+    assert live["gambling"]["a"] == {"dollars": 300}
+    store.close()
+
+
+def test_concurrent_compare_and_swap_loses_no_increments(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    live = store.load()
+    live["gambling"]["a"] = {"dollars": 0}
+    store.save()
+
+    async def credit(data, delay):
+        record = data["gambling"]["a"]
+        dollars = record["dollars"]
+        await asyncio.sleep(delay)
+        record["dollars"] = dollars + 1
+
+    async def run():
+        await asyncio.gather(*[
+            store.compare_and_swap(lambda data, n=n: credit(data, 0.001 * (n % 3)), retries=50)
+            for n in range(20)
+        ])
+
+    asyncio.run(run())
+    store.close()
+    assert live["gambling"]["a"]["dollars"] == 20
+    assert stored(make_backend("json", tmp_path))["gambling"]["a"] == {"dollars": 20}
+
+
+def test_version_stamps_follow_commits_of_each_record(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 0}
+    data["gambling"]["b"] = {"dollars": 0}
+    store.save()
+    a, b = store.version_of("gambling", "a"), store.version_of("gambling", "b")
+    section = store.version_of("gambling")
+
+    data["gambling"]["a"]["dollars"] = 1
+    store.save()
+
+    assert store.version_of("gambling", "a") == a + 1
+    assert store.version_of("gambling", "b") == b
+    assert store.version_of("gambling") == section + 1
+    store.close()
@@ -0,0 +1,64 @@
+import business_store as bs
+
+from helpers import make_backend
+
+
+def xp(gang):
+    return gang.get("gang_xp", 0)
+
+
+def store_with_gangs(tmp_path, gangs):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    for gang_id, gang_xp in gangs.items():
+        data["gangs"][gang_id] = {"gang_xp": gang_xp}
+    store.save()
+    store.ranking("gangs_xp", "gangs", xp)
+    return store, data
+
+
+def test_pages_rank_by_score_then_key(tmp_path):
+    store, _ = store_with_gangs(tmp_path, {"a": 5, "b": 9, "c": 5, "d": 1, "e": 7})
+
+    assert store.ranking_page("gangs_xp", 0, 2) == ([(1, "b", 9), (2, "e", 7)], 5)
+    assert store.ranking_page("gangs_xp", 1, 2) == ([(3, "a", 5), (4, "c", 5)], 5)
+    assert store.ranking_page("gangs_xp", 2, 2) == ([(5, "d", 1)], 5)
+    assert store.ranking_page("gangs_xp", 3, 2) == ([], 5)
+    store.close()
+
+
+def test_commits_re_rank_only_what_changed(tmp_path):
+    store, data = store_with_gangs(tmp_path, {"a": 5, "b": 9})
+    store.ranking_page("gangs_xp", 0, 10)
+
+    data["gangs"]["a"]["gang_xp"] = 20
+    data["gangs"]["c"] = {"gang_xp": 7}
+    del data["gangs"]["b"]
+    # Uncommitted changes are not ranked yet
+    assert store.ranking_page("gangs_xp", 0, 10) == ([(1, "b", 9), (2, "a", 5)], 2)
+
+    store.save()
+    assert store.ranking_page("gangs_xp", 0, 10) == ([(1, "a", 20), (2, "c", 7)], 2)
+    store.close()
+
+
+def test_replacing_the_section_rebuilds_the_ranking(tmp_path):
+    store, data = store_with_gangs(tmp_path, {"a": 5})
+    store.ranking_page("gangs_xp", 0, 10)
+
+    data["gangs"] = {"x": {"gang_xp": 3}, "y": {}}
+    store.save()
+    assert store.ranking_page("gangs_xp", 0, 10) == ([(1, "x", 3), (2, "y", 0)], 2)
+    store.close()
+
+
+def test_ranking_registered_before_load_follows_commits(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    assert store.ranking("gangs_xp", "gangs", xp) is store.ranking("gangs_xp", "gangs", xp)
+    data = store.load()
+    assert store.ranking_page("gangs_xp", 0, 10) == ([], 0)
+
+    data["gangs"]["a"] = {"gang_xp": 1}
+    store.save()
+    assert store.ranking_page("gangs_xp", 0, 10) == ([(1, "a", 1)], 1)
+    store.close()
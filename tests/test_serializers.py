@@ -0,0 +1,72 @@
+import json
+import logging
+
+import pytest
+
+import business_store as bs
+
+
+class CountingJson(bs.JsonSerializer):
+    def __init__(self):
+        self.dumped = []
+
+    def dumps(self, value):
+        self.dumped.append(value)
+        return super().dumps(value)
+
+
+def test_missing_msgpack_falls_back_to_json_with_a_warning(monkeypatch, caplog):
+    monkeypatch.setattr(bs, "msgpack", None)
+    assert bs.available_serializers() == ["json"]
+
+    with caplog.at_level(logging.WARNING, logger="business_store"):
+        serializer = bs.get_serializer("msgpack")
+
+    assert serializer.name == "json"
+    assert "'msgpack' is not installed" in caplog.text
+
+
+def test_unknown_serializer_is_rejected():
+    with pytest.raises(ValueError, match="Unknown business serializer"):
+        bs.get_serializer("pickle")
+
+
+def test_snapshot_written_with_a_missing_serializer_is_not_misread(tmp_path, monkeypatch):
+    monkeypatch.setattr(bs, "msgpack", None)
+    path = tmp_path / "contributions.snap"
+    path.write_bytes(bs.pack_snapshot("msgpack", ["gambling"], {"gambling": b"\x80"}))
+
+    with pytest.raises(RuntimeError, match="not installed"):
+        bs.SnapshotBackend(str(path), "json").load()
+
+
+def test_snapshot_reserializes_only_changed_sections(tmp_path):
+    serializer = CountingJson()
+    store = bs.StateStore(bs.SnapshotBackend(str(tmp_path / "contributions.snap"), serializer),
+                          flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+    data["gangs"]["g"] = {"name": "Crew"}
+    store.save()
+    serializer.dumped.clear()
+
+    data["gambling"]["a"]["dollars"] = 2
+    store.save()
+    store.close()
+
+    assert serializer.dumped == [{"a": {"dollars": 2}}]
+
+
+def test_convert_round_trips_between_json_and_snapshot(tmp_path):
+    source = tmp_path / "contributions.json"
+    document = {"gambling": {"a": {"dollars": 1}}, "gangs": {}, "misc": [1, 2]}
+    source.write_text(json.dumps(document))
+    snapshot = str(tmp_path / "contributions.snap")
+    back = str(tmp_path / "back.json")
+
+    bs.convert_file(str(source), snapshot, "json")
+    assert bs.is_snapshot_file(snapshot)
+    bs.convert_file(snapshot, back)
+
+    with open(back) as f:
+        assert json.load(f) == document
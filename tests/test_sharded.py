@@ -0,0 +1,78 @@
+import json
+import os
+
+import business_store as bs
+
+
+class CountingShards(bs.ShardedBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = []
+
+    def read_bucket(self, section, bucket):
+        self.reads.append((section, bucket))
+        return super().read_bucket(section, bucket)
+
+
+def populate(path, users=50):
+    store = bs.StateStore(bs.ShardedBackend(path, buckets=8), flush_interval=60)
+    data = store.load()
+    for i in range(users):
+        data["gambling"][str(i)] = {"dollars": i}
+    data["gangs"]["g"] = {"name": "Crew"}
+    data["misc"] = {"motd": "hi"}
+    store.save()
+    store.close()
+
+
+def test_manifest_holds_order_bucket_count_and_values_outside_sections(tmp_path):
+    path = str(tmp_path / "shards")
+    populate(path)
+
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["buckets"] == 8
+    assert manifest["names"][-1] == "misc"
+    assert manifest["extras"] == {"misc": {"motd": "hi"}}
+    assert 1 < len(os.listdir(os.path.join(path, "gambling"))) <= 8
+
+    # The bucket count on disk wins over the one the backend was created with
+    backend = bs.ShardedBackend(path, buckets=64)
+    data = bs.TrackedDocument(backend.load())
+    assert backend.buckets == 8
+    assert data["gambling"]["7"] == {"dollars": 7}
+    assert data["misc"] == {"motd": "hi"}
+
+
+def test_load_reads_only_the_buckets_records_are_fetched_from(tmp_path):
+    path = str(tmp_path / "shards")
+    populate(path)
+
+    backend = CountingShards(path)
+    data = bs.TrackedDocument(backend.load())
+    assert backend.reads == []
+
+    assert data["gambling"]["7"] == {"dollars": 7}
+    assert data["gangs"]["g"]["name"] == "Crew"
+    assert sorted(backend.reads) == sorted([("gambling", backend.bucket_of("7")),
+                                            ("gangs", backend.bucket_of("g"))])
+
+
+def test_save_rewrites_only_the_changed_buckets(tmp_path):
+    path = str(tmp_path / "shards")
+    populate(path)
+
+    backend = CountingShards(path)
+    store = bs.StateStore(backend, flush_interval=60)
+    data = store.load()
+    directory = os.path.join(path, "gambling")
+    before = {name: os.stat(os.path.join(directory, name)).st_ino for name in os.listdir(directory)}
+
+    data["gambling"]["7"]["dollars"] += 1
+    store.save()
+    store.close()
+
+    changed = f"{backend.bucket_of('7'):04x}.json"
+    after = {name: os.stat(os.path.join(directory, name)).st_ino for name in os.listdir(directory)}
+    assert {name for name in before if before[name] != after[name]} == {changed}
+    assert set(backend.reads) == {("gambling", backend.bucket_of("7"))}
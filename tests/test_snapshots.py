@@ -0,0 +1,99 @@
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1, "history": [1]}
+    data["gambling"]["b"] = {"dollars": 2}
+    data["gangs"]["g"] = {"name": "Alpha", "members": {"a": "leader"}}
+    store.save()
+    yield store
+    store.close()
+
+
+def test_snapshot_keeps_showing_its_commit(store):
+    before = store.snapshot()
+    data = store.load()
+    data["gambling"]["a"]["dollars"] = 10
+    data["gambling"]["a"]["history"].append(2)
+    del data["gambling"]["b"]
+    data["gambling"]["c"] = {"dollars": 3}
+    store.save()
+    after = store.snapshot()
+
+    assert before["gambling"]["a"] == {"dollars": 1, "history": (1,)}
+    assert sorted(before["gambling"]) == ["a", "b"]
+    assert after["gambling"]["a"] == {"dollars": 10, "history": (1, 2)}
+    assert sorted(after["gambling"]) == ["a", "c"]
+    assert len(before["gambling"]) == 2 and len(after["gambling"]) == 2
+    assert "b" in before["gambling"] and "b" not in after["gambling"]
+
+
+def test_uncommitted_changes_stay_out_of_the_snapshot(store):
+    data = store.load()
+    data["gambling"]["a"]["dollars"] = 99
+    assert store.snapshot()["gambling"]["a"]["dollars"] == 1
+    store.save()
+    assert store.snapshot()["gambling"]["a"]["dollars"] == 99
+
+
+def test_snapshot_records_are_read_only(store):
+    snapshot = store.snapshot()
+    with pytest.raises(TypeError):
+        snapshot["gambling"]["a"]["dollars"] = 5
+    with pytest.raises(AttributeError):
+        snapshot["gambling"]["a"]["history"].append(2)
+    with pytest.raises(TypeError):
+        snapshot["gambling"]["z"] = {}
+
+
+def test_reading_a_snapshot_marks_nothing_modified(store):
+    snapshot = store.snapshot()
+    assert not store.load().has_changes
+    for gang in snapshot["gangs"].values():
+        gang["members"]
+    snapshot["gambling"].get("missing")
+    assert len(snapshot["business"]) == 0
+    assert not store.load().has_changes
+    assert "missing" not in dict.keys(store.load()["gambling"])
+
+
+def test_changes_through_a_held_record_reach_the_next_snapshot(store):
+    gang = store.load()["gangs"]["g"]
+    store.save()
+    assert store.snapshot()["gangs"]["g"]["members"] == {"a": "leader"}
+
+    gang["members"]["b"] = "member"
+    store.save()
+
+    assert store.snapshot()["gangs"]["g"]["members"] == {"a": "leader", "b": "member"}
+
+
+def test_snapshot_answers_len_and_bool_of_partial_sections(tmp_path):
+    backend = make_backend("sqlite", tmp_path)
+    store = bs.StateStore(backend, flush_interval=60)
+    data = store.load()
+    for i in range(50):
+        data["gambling"][str(i)] = {"dollars": i}
+    store.save()
+    store.close()
+
+    store = bs.StateStore(make_backend("sqlite", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["0"]["dollars"] = 100
+    del data["gambling"]["1"]
+    store.save()
+    snapshot = store.snapshot()
+
+    assert len(snapshot["gambling"]) == 49
+    assert bool(snapshot["gambling"])
+    assert not snapshot["wars"]
+    assert "1" not in snapshot["gambling"] and "2" in snapshot["gambling"]
+    assert snapshot["gambling"]["0"]["dollars"] == 100
+    store.close()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import business_store as bs
+
+
+def write_file(path, data):
+    # How shared_utils saves: read, modify and json.dump the whole file in place
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def read_file(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_merge3_adds_counter_deltas_and_keeps_ours_for_set_values():
+    base = {"dollars": 10, "xp": 1, "level": 1, "last_collect": 100.0, "gone": 1}
+    ours = {"dollars": 15, "xp": 1, "level": 2, "last_collect": 200.0, "gone": 1}
+    theirs = {"dollars": 12, "xp": 3, "level": 3, "last_collect": 201.0, "new": 2}
+
+    assert bs.merge3(base, ours, theirs) == {
+        "dollars": 17, "xp": 3, "level": 2, "last_collect": 200.0, "new": 2,
+    }
+
+
+def test_merge3_counts_equal_counter_changes_twice():
+    assert bs.merge3({"dollars": 1}, {"dollars": 3}, {"dollars": 3}) == {"dollars": 5}
+    assert bs.merge3({"level": 1}, {"level": 3}, {"level": 3}) == {"level": 3}
+
+
+def test_write_keeps_changes_another_module_saved(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    write_file(path, {"gambling": {"a": {"dollars": 100, "xp": 1}}, "players": {"a": {"xp": 5}}})
+    store = bs.StateStore(bs.JsonFileBackend(path), flush_interval=60, write_through=False)
+    data = store.load()
+    data["gambling"]["a"]["dollars"] += 50
+    store.save()
+
+    other = read_file(path)
+    other["gambling"]["a"]["dollars"] += 7
+    other["players"]["a"]["xp"] = 50
+    other["misc"] = [1]
+    write_file(path, other)
+    store.flush()
+
+    on_disk = read_file(path)
+    assert on_disk["gambling"]["a"] == {"dollars": 157, "xp": 1}
+    assert on_disk["players"]["a"] == {"xp": 50}
+    assert on_disk["misc"] == [1]
+    # The resident document picks the merged records up on its next load
+    data = store.load()
+    assert data["gambling"]["a"]["dollars"] == 157
+    assert dict.get(data, "players")["a"] == {"xp": 50}
+    store.close()
+
+
+def test_load_pulls_changes_another_module_saved(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    write_file(path, {"gambling": {"a": {"dollars": 100}, "b": {"dollars": 5}}, "misc": 3})
+    store = bs.StateStore(bs.JsonFileBackend(path), flush_interval=60, write_through=False)
+    data = store.load()
+    data["gambling"]["a"]["dollars"] += 10
+    store.save()
+
+    other = read_file(path)
+    other["gambling"]["a"]["dollars"] -= 1
+    del other["gambling"]["b"]
+    del other["misc"]
+    write_file(path, other)
+
+    data = store.load()
+    assert data["gambling"]["a"]["dollars"] == 109
+    assert "b" not in data["gambling"]
+    assert "misc" not in data
+    assert store.snapshot()["gambling"]["a"]["dollars"] == 109
+    store.flush()
+    assert read_file(path) == {"gambling": {"a": {"dollars": 109}},
+                               "business": {}, "gangs": {}, "wars": {}, "equipment": {}}
+    store.close()
+
+
+def test_write_through_save_is_on_disk_when_it_returns(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    backend = bs.JsonFileBackend(path)
+    store = bs.StateStore(backend, flush_interval=60, write_through=True)
+    # A long commit window must not delay a save the caller waits for
+    store._writer = bs.BackgroundWriter(backend, commit_window=30)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+    started = time.monotonic()
+    store.save()
+
+    assert time.monotonic() - started < 5
+    assert read_file(path)["gambling"] == {"a": {"dollars": 1}}
+    assert store.pending == 0
+    store.close()
+
+
+def test_write_behind_waits_for_flush_every(tmp_path):
+    path = str(tmp_path / "contributions.json")
+    store = bs.StateStore(bs.JsonFileBackend(path), flush_interval=60, flush_every=3, write_through=False)
+    data = store.load()
+    for i in range(2):
+        data["gambling"][str(i)] = {"dollars": i}
+        store.save()
+    assert store.pending == 2
+    store.flush()
+    assert read_file(path)["gambling"] == {"0": {"dollars": 0}, "1": {"dollars": 1}}
+    store.close()
+
+
+class FailingBackend(bs.JsonFileBackend):
+    fail = True
+
+    def write(self, changeset):
+        if self.fail:
+            raise OSError("disk full")
+        super().write(changeset)
+
+
+def test_failed_write_is_recorded_and_raised_to_waiters(tmp_path, caplog):
+    path = str(tmp_path / "contributions.json")
+    backend = FailingBackend(path)
+    store = bs.StateStore(backend, flush_interval=60, write_through=False)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+
+    with pytest.raises(OSError):
+        asyncio.run(store.save_async())
+    assert store.failures == 1
+    assert isinstance(store.last_error, OSError)
+    assert "Business data write failed" in caplog.text
+
+    # The failed batch is retried with the next write
+    backend.fail = False
+    data["gambling"]["b"] = {"dollars": 2}
+    asyncio.run(store.save_async())
+    assert read_file(path)["gambling"] == {"a": {"dollars": 1}, "b": {"dollars": 2}}
+    store.close()
+
+
+def test_write_through_save_raises_when_the_write_fails(tmp_path):
+    store = bs.StateStore(FailingBackend(str(tmp_path / "contributions.json")), flush_interval=60,
+                          write_through=True)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 1}
+    with pytest.raises(OSError):
+        store.save()
+    assert store.failures == 1
+    store._backend.fail = False
+    store.close()
@@ -0,0 +1,57 @@
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+def test_transaction_rollback_restores_the_same_objects(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 10, "history": [1]}
+    data["gangs"]["g"] = {"members": {"a": "leader"}}
+    store.save()
+    store.flush()
+    record = data["gambling"]["a"]
+    history = record["history"]
+    gang = data["gangs"]["g"]
+    version = store.version
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as doc:
+            doc["gambling"]["a"]["dollars"] -= 5
+            doc["gambling"]["a"]["history"].append(2)
+            doc["gambling"]["b"] = {"dollars": 5}
+            del doc["gangs"]["g"]
+            raise RuntimeError("declined")
+
+    assert data["gambling"]["a"] is record
+    assert record == {"dollars": 10, "history": [1]}
+    assert record["history"] is history
+    assert "b" not in data["gambling"]
+    assert data["gangs"]["g"] is gang
+    assert store.version == version
+    assert store.rollbacks == 1
+    assert store.snapshot()["gambling"]["a"]["dollars"] == 10
+    store.close()
+
+
+def test_transaction_commits_once_when_the_block_ends(tmp_path):
+    backend = make_backend("json", tmp_path)
+    store = bs.StateStore(backend, flush_interval=60)
+    data = store.load()
+    data["gambling"]["a"] = {"dollars": 10}
+    store.save()
+    version = store.version
+
+    with store.transaction() as doc:
+        doc["gambling"]["a"]["dollars"] -= 5
+        store.save()
+        with store.transaction() as inner:
+            inner["gambling"]["b"] = {"dollars": 5}
+        assert store.version == version
+
+    assert store.version == version + 1
+    store.flush()
+    assert stored(make_backend("json", tmp_path))["gambling"] == {"a": {"dollars": 5}, "b": {"dollars": 5}}
+    store.close()
@@ -0,0 +1,68 @@
+import copy
+import json
+
+import business_store as bs
+
+from helpers import make_backend, stored
+
+
+def test_reading_a_default_record_stores_nothing(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+
+    record = bs.record_or_default(data, "business", "u")
+    assert record == bs.DEFAULT_RECORDS["business"]
+    assert record["visited_locations"] == ["amsterdam"]
+    assert bs.record_or_default(data, "business", "u") is record
+    assert "u" not in data["business"]
+    assert not record.is_stored
+    store.close()
+
+
+def test_nested_change_stores_the_record_the_handler_holds(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+
+    record = bs.record_or_default(data, "business", "u")
+    record["visited_locations"].append("berlin")
+    assert record.is_stored
+    assert data["business"]["u"] is record
+    record["total_income"] = 5
+    store.save()
+    store.close()
+
+    user = stored(make_backend("json", tmp_path))["business"]["u"]
+    assert user["visited_locations"] == ["amsterdam", "berlin"]
+    assert user["total_income"] == 5
+    assert bs.DEFAULT_RECORDS["business"]["visited_locations"] == ["amsterdam"]
+
+
+def test_copies_of_a_default_record_are_plain_and_detached():
+    data = bs.TrackedDocument({})
+    record = bs.record_or_default(data, "equipment", "u")
+
+    copied = copy.deepcopy(record)
+    copied["weapons"].append("bat")
+    assert type(copied) is dict and type(copied["weapons"]) is list
+    assert not record.is_stored
+    assert json.loads(json.dumps(record)) == bs.DEFAULT_RECORDS["equipment"]
+
+
+def test_compact_defaults_removes_only_records_equal_to_the_defaults(tmp_path):
+    path = tmp_path / "contributions.json"
+    document = {
+        "business": {"idle": copy.deepcopy(bs.DEFAULT_RECORDS["business"]),
+                     "rich": dict(bs.DEFAULT_RECORDS["business"], total_income=10)},
+        "equipment": {"idle": copy.deepcopy(bs.DEFAULT_RECORDS["equipment"])},
+        "gambling": {"idle": {"dollars": 0}},
+    }
+    path.write_text(json.dumps(document))
+
+    removed, before, after = bs.compact_defaults(make_backend("json", tmp_path))
+
+    assert removed == {"business": 1, "equipment": 1}
+    assert after < before
+    data = stored(make_backend("json", tmp_path))
+    assert list(data["business"]) == ["rich"]
+    assert data["gambling"] == {"idle": {"dollars": 0}}
+    assert bs.record_or_default(bs.TrackedDocument({}), "business", "idle") == document["business"]["idle"]
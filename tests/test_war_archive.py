@@ -0,0 +1,107 @@
+import asyncio
+
+import business_store as bs
+
+from helpers import make_backend
+
+
+def war(attacker, defender, status="completed", started_at="2024-01-01"):
+    return {"attacker": attacker, "defender": defender, "status": status,
+            "winner": attacker, "started_at": started_at, "battles": {"b": [1, 2]}}
+
+
+def test_archive_round_trips_through_a_new_instance(tmp_path):
+    path = str(tmp_path / "wars.archive")
+    archive = bs.WarArchive(path)
+    assert archive.append("w1", war("a", "b", started_at="2024-01-01"))
+    assert archive.append("w2", war("b", "c", started_at="2024-02-01"))
+    assert not archive.append("w1", war("a", "b", started_at="2024-01-01"))
+
+    reopened = bs.WarArchive(path)
+    assert len(reopened) == 2
+    assert reopened.get("w1") == war("a", "b", started_at="2024-01-01")
+    assert reopened.get("missing") is None
+    assert [war_id for war_id, _ in reopened.history("b")] == ["w2", "w1"]
+    assert [war_id for war_id, _ in reopened.history("b", limit=1)] == ["w2"]
+    assert [entry["id"] for entry in reopened.summary("a")] == ["w1"]
+    assert reopened.history("nobody") == []
+
+
+def test_torn_index_line_is_dropped_and_the_frame_reindexed(tmp_path):
+    path = str(tmp_path / "wars.archive")
+    archive = bs.WarArchive(path)
+    archive.append("w1", war("a", "b"))
+    archive.append("w2", war("a", "c"))
+    with open(archive.index_path, "rb") as f:
+        lines = f.readlines()
+    with open(archive.index_path, "wb") as f:
+        f.write(lines[0] + lines[1][:len(lines[1]) // 2])
+
+    reopened = bs.WarArchive(path)
+    assert "w2" in reopened
+    assert reopened.get("w2") == war("a", "c")
+    assert bs.WarArchive(path).summary("a") == reopened.summary("a")
+
+
+def test_torn_frame_is_cut_off(tmp_path):
+    path = str(tmp_path / "wars.archive")
+    archive = bs.WarArchive(path)
+    archive.append("w1", war("a", "b"))
+    with open(path, "ab") as f:
+        f.write(bs.WarArchive.FRAME.pack(1000) + b"\x78\x9c partial")
+    size = len(open(path, "rb").read())
+
+    reopened = bs.WarArchive(path)
+    assert len(reopened) == 1
+    assert len(open(path, "rb").read()) < size
+    assert reopened.append("w2", war("a", "c"))
+    assert bs.WarArchive(path).get("w2") == war("a", "c")
+
+
+def store_with_wars(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60,
+                          archive=bs.WarArchive(str(tmp_path / "wars.archive")))
+    data = store.load()
+    data["gangs"]["a"] = {"wars": {"b": "w1", "c": "w2"}}
+    data["gangs"]["b"] = {"wars": {"a": "w1"}}
+    data["gangs"]["c"] = {"wars": {"a": "w2"}}
+    data["wars"]["w1"] = war("a", "b")
+    data["wars"]["w2"] = war("a", "c", status="active", started_at="2024-03-01")
+    store.save()
+    return store, data
+
+
+def test_archiving_moves_completed_wars_and_their_gang_references(tmp_path):
+    store, data = store_with_wars(tmp_path)
+
+    assert store.archive_wars() == 1
+
+    assert list(data["wars"]) == ["w2"]
+    assert data["gangs"]["a"]["wars"] == {"c": "w2"}
+    assert data["gangs"]["b"]["wars"] == {}
+    assert [war_id for war_id, _ in store.war_history("a")] == ["w2", "w1"]
+    assert store.war_history("b")[0][1]["winner"] == "a"
+    store.close()
+
+
+def test_async_archiving_keeps_a_war_changed_while_it_was_appended(tmp_path):
+    store, data = store_with_wars(tmp_path)
+    appended = store.archive.append
+
+    def append(war_id, record):
+        data["wars"]["w1"]["winner"] = "b"
+        return appended(war_id, record)
+
+    store.archive.append = append
+    assert asyncio.run(store.archive_wars_async()) == 0
+    assert "w1" in data["wars"]
+    assert data["gangs"]["b"]["wars"] == {"a": "w1"}
+
+    # The next run archives the changed war over the copy appended first
+    store.archive.append = appended
+    assert asyncio.run(store.archive_wars_async(["w1"])) == 1
+    assert "w1" not in data["wars"]
+    assert data["gangs"]["b"]["wars"] == {}
+    assert store.archive.get("w1")["winner"] == "b"
+    assert [war_id for war_id, _ in bs.WarArchive(store.archive.path).history("b")] == ["w1"]
+    store.close()
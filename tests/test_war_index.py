@@ -0,0 +1,146 @@
+import pytest
+
+import business_store as bs
+
+from helpers import make_backend
+
+
+def war(attacker, defender, status="active", **fields):
+    return {"attacker": attacker, "defender": defender, "status": status, **fields}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = bs.StateStore(make_backend("json", tmp_path), flush_interval=60)
+    data = store.load()
+    data["gangs"]["a"] = {"members": {"a1": "leader", "a2": "member"}}
+    data["gangs"]["b"] = {"members": {"b1": "leader"}}
+    data["gangs"]["c"] = {"members": {"c1": "leader"}}
+    data["wars"]["old"] = war("a", "b", status="completed")
+    data["wars"]["w1"] = war("a", "b")
+    data["wars"]["w2"] = war("c", "a")
+    store.save()
+    yield store
+    store.close()
+
+
+def test_active_wars_of_each_gang(store):
+    data = store.load()
+
+    assert store.wars.active("a", data) == {"b": "w1", "c": "w2"}
+    assert store.wars.active("b", data) == {"a": "w1"}
+    assert store.wars.active("nobody", data) == {}
+
+
+def test_commits_start_and_end_wars(store):
+    data = store.load()
+    store.wars.active("a", data)
+
+    data["wars"]["w3"] = war("b", "c")
+    data["wars"]["w1"]["status"] = "completed"
+    # A war that ended in the document asked about is left out before it is committed
+    assert store.wars.active("a", data) == {"c": "w2"}
+    assert store.wars.active("b", data) == {}
+
+    store.save()
+    assert store.wars.active("b", data) == {"c": "w3"}
+    assert store.wars.active("a", store.snapshot()) == {"c": "w2"}
+
+
+def test_a_rolled_back_war_is_never_indexed(store):
+    data = store.load()
+    with pytest.raises(RuntimeError):
+        with store.transaction() as doc:
+            doc["wars"]["w3"] = war("b", "c")
+            doc["wars"]["w1"]["status"] = "completed"
+            raise RuntimeError("declined")
+
+    assert store.wars.active("b", data) == {"a": "w1"}
+    assert store.wars.active("c", data) == {"a": "w2"}
+
+
+def test_nothing_is_written_to_the_records(store):
+    data = store.load()
+    store.wars.active("a", data)
+    store.save()
+
+    assert set(store.snapshot()["gangs"]["a"]) == {"members"}
+    assert set(store.snapshot()["wars"]["w1"]) == {"attacker", "defender", "status"}
+
+
+def test_replacing_the_wars_section_rebuilds_the_index(store):
+    data = store.load()
+    store.wars.active("a", data)
+
+    data["wars"] = {"w9": war("a", "d")}
+    store.save()
+    assert store.wars.active("a", data) == {"d": "w9"}
+
+
+def fight(data, war_id, side, uid):
+    battles = data["wars"][war_id].setdefault(f"{side}_members", {})
+    battles[uid] = battles.get(uid, 2) - 1
+
+
+def test_roster_lists_members_with_battles_left(store):
+    data = store.load()
+    data["wars"]["w1"]["attacker_members"] = {"a1": 0}
+    store.save()
+    w1 = data["wars"]["w1"]
+
+    assert store.wars.roster("w1", w1, "attacker", data) == ["a2"]
+    assert store.wars.roster("w1", w1, "defender", data) == ["b1"]
+    assert store.wars.has_fighters("w1", w1, "attacker", data)
+
+
+def test_roster_follows_uncommitted_battles_and_commits(store):
+    data = store.load()
+    w1 = data["wars"]["w1"]
+    assert store.wars.has_fighters("w1", w1, "defender", data)
+
+    fight(data, "w1", "defender", "b1")
+    fight(data, "w1", "defender", "b1")
+    assert not store.wars.has_fighters("w1", w1, "defender", data)
+    store.save()
+    assert store.wars.roster("w1", w1, "defender", data) == []
+    assert store.wars.roster("w1", w1, "defender", store.snapshot()) == []
+
+
+def test_roster_follows_members_joining_and_leaving(store):
+    data = store.load()
+    w1 = data["wars"]["w1"]
+    assert store.wars.roster("w1", w1, "defender", data) == ["b1"]
+
+    store.membership.join(data, "b", "b2")
+    store.save()
+    assert store.wars.roster("w1", w1, "defender", data) == ["b1", "b2"]
+
+    store.membership.leave(data, "b1")
+    # Left members are dropped at once, even before the commit
+    assert store.wars.roster("w1", w1, "defender", data) == ["b2"]
+    store.save()
+    assert store.wars.roster("w1", w1, "defender", data) == ["b2"]
+
+
+def test_battles_rolled_back_keep_the_fighter(store):
+    data = store.load()
+    w1 = data["wars"]["w1"]
+    store.wars.roster("w1", w1, "defender", data)
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as doc:
+            fight(doc, "w1", "defender", "b1")
+            fight(doc, "w1", "defender", "b1")
+            assert not store.wars.has_fighters("w1", doc["wars"]["w1"], "defender", doc)
+            raise RuntimeError("declined")
+
+    assert store.wars.roster("w1", data["wars"]["w1"], "defender", data) == ["b1"]
+
+
+def test_roster_of_a_war_not_committed_yet(store):
+    data = store.load()
+    data["wars"]["w3"] = war("b", "c", max_battles_per_user=1, defender_members={"c1": 1})
+
+    assert store.wars.roster("w3", data["wars"]["w3"], "defender", data) == ["c1"]
+    fight(data, "w3", "defender", "c1")
+    assert store.wars.roster("w3", data["wars"]["w3"], "defender", data) == []